@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from util.asset import Asset
+from util.config import Config
+from util.log import get_logger
+from util.base_class import JSONSerializableData
+from util.pdf_hash_registry import calc_file_sha256
+
+# Files which are not assets (OS metadata, PDFs being received)
+SYSTEM_FILES = [".DS_Store"]
+TEMPORARY_FILE_SUFFIXES = [".part", ".tmp"]
+
+logger = get_logger("AssetCatalog")
+
+
+class IndexStatus:
+    """Status of the document index of an asset."""
+
+    MISSING = "missing"  # No document index
+    STALE = "stale"  # Document index is older than the PDF
+    PARTIAL = "partial"  # Document index has fewer pages than the PDF
+    FRESH = "fresh"
+
+
+@dataclass
+class _FileStat:
+    mtime_ns: int
+    size: int
+
+
+@dataclass
+class AssetCatalogEntry(JSONSerializableData):
+    """Represents an asset in AssetCatalog."""
+
+    asset_id: str
+    pdf_size: int | None
+    pdf_sha256: str | None
+    n_pages: int | None
+    doc_type: str | None
+    index_exists: bool
+    index_status: str
+
+    def to_json_serializable(self):
+        return self.__dict__.copy()
+
+
+@dataclass
+class AssetCatalogSnapshot:
+    """Contents of AssetCatalog at a time, identified by etag."""
+
+    etag: str
+    pdf_files: list[str]
+    index_files: list[str]
+    assets: list[AssetCatalogEntry]
+
+
+def is_asset_file(filename: str):
+    """Returns True if the file is not a system file or a temporary file."""
+    return filename not in SYSTEM_FILES and not any(
+        filename.endswith(suffix) for suffix in TEMPORARY_FILE_SUFFIXES
+    )
+
+
+def scan_dir(dirpath: str) -> dict[str, _FileStat]:
+    """Returns stats of the files in the directory (empty if it does not exist)."""
+    try:
+        with os.scandir(dirpath) as entries:
+            return {
+                entry.name: _FileStat(entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in entries
+                if entry.is_file() and is_asset_file(entry.name)
+            }
+    except FileNotFoundError:
+        return {}
+
+
+class AssetCatalog:
+    """
+    In-memory catalog of PDFs and document indexes.
+
+    Directories are re-scanned at most every min_refresh_interval_sec,
+    and the details of a file (hash, page count, index metadata) are re-read
+    only if its mtime or size has changed since the last scan.
+
+    The hash and the page count of a PDF are read by a background thread, not to block
+    the requests getting snapshots, and they are None in the snapshots until they are read.
+    """
+
+    def __init__(self, min_refresh_interval_sec=1.0):
+        self.__min_refresh_interval_sec = min_refresh_interval_sec
+        self.__lock = threading.Lock()
+        self.__refreshed_at = float("-inf")
+
+        self.__pdf_stats: dict[str, _FileStat] = {}
+        self.__index_stats: dict[str, _FileStat] = {}
+
+        # filename -> (stat when read, details)
+        self.__pdf_details: dict[str, tuple[_FileStat, dict]] = {}
+        self.__index_details: dict[str, tuple[_FileStat, dict]] = {}
+
+        # Files being read in background: (filename, mtime_ns, size)
+        self.__pending_reads: set[tuple[str, int, int]] = set()
+        self.__reader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="AssetCatalogReader"
+        )
+
+        self.__snapshot = AssetCatalogSnapshot("", [], [], [])
+
+    def get_snapshot(self) -> AssetCatalogSnapshot:
+        """Returns the current contents, re-scanning the directories if needed."""
+        with self.__lock:
+            if (
+                time.monotonic() - self.__refreshed_at
+                >= self.__min_refresh_interval_sec
+            ):
+                self.__refresh()
+
+            return self.__snapshot
+
+    def wait_for_details(self):
+        """Waits until the PDFs and indexes being read in background are read, to be in the next snapshot."""
+        # Files are read in order by the single thread.
+        self.__reader.submit(lambda: None).result()
+
+    def __refresh(self):
+        self.__pdf_stats = scan_dir(Asset.get_dirpath_pdf_src())
+        self.__index_stats = scan_dir(Asset.get_dirpath_document_index())
+
+        asset_ids = sorted(
+            {
+                filename.removesuffix(".pdf")
+                for filename in self.__pdf_stats
+                if filename.endswith(".pdf")
+            }
+            | {
+                filename.removesuffix(".index.json")
+                for filename in self.__index_stats
+                if filename.endswith(".index.json")
+            }
+        )
+
+        pdf_files = sorted(self.__pdf_stats)
+        index_files = sorted(self.__index_stats)
+        assets = [self.__get_entry(asset_id) for asset_id in asset_ids]
+
+        # The ETag changes only when the contents change, so polling clients get 304.
+        digest = hashlib.sha1(
+            json.dumps(
+                [pdf_files, index_files, [a.to_json_serializable() for a in assets]]
+            ).encode("utf-8")
+        ).hexdigest()
+
+        self.__snapshot = AssetCatalogSnapshot(
+            f'"{digest}"', pdf_files, index_files, assets
+        )
+        self.__refreshed_at = time.monotonic()
+
+        # Forget the details of removed files
+        for details, stats in (
+            (self.__pdf_details, self.__pdf_stats),
+            (self.__index_details, self.__index_stats),
+        ):
+            for filename in list(details):
+                if filename not in stats:
+                    del details[filename]
+
+    def __get_entry(self, asset_id: str) -> AssetCatalogEntry:
+        pdf_filename = f"{asset_id}.pdf"
+        index_filename = f"{asset_id}.index.json"
+
+        pdf_stat = self.__pdf_stats.get(pdf_filename)
+        index_stat = self.__index_stats.get(index_filename)
+
+        pdf_details = (
+            self.__get_details(
+                self.__pdf_details,
+                lambda: self.__pdf_stats,
+                pdf_filename,
+                pdf_stat,
+                lambda: self.__read_pdf_details(Asset.get_path_pdf_src(asset_id)),
+            )
+            if pdf_stat is not None
+            else {}
+        )
+        index_details = (
+            self.__get_details(
+                self.__index_details,
+                lambda: self.__index_stats,
+                index_filename,
+                index_stat,
+                lambda: self.__read_index_details(
+                    Asset.get_path_document_index(asset_id)
+                ),
+            )
+            if index_stat is not None
+            else {}
+        )
+
+        n_pages_pdf = pdf_details.get("n_pages")
+        n_pages_index = index_details.get("n_pages")
+
+        if index_stat is None:
+            index_status = IndexStatus.MISSING
+        elif pdf_stat is not None and index_stat.mtime_ns < pdf_stat.mtime_ns:
+            index_status = IndexStatus.STALE
+        elif (
+            n_pages_pdf is not None
+            and n_pages_index is not None
+            and n_pages_index < n_pages_pdf
+        ):
+            index_status = IndexStatus.PARTIAL
+        else:
+            index_status = IndexStatus.FRESH
+
+        return AssetCatalogEntry(
+            asset_id=asset_id,
+            pdf_size=pdf_stat.size if pdf_stat is not None else None,
+            pdf_sha256=pdf_details.get("sha256"),
+            n_pages=n_pages_pdf if n_pages_pdf is not None else n_pages_index,
+            doc_type=index_details.get("doc_type"),
+            index_exists=index_stat is not None,
+            index_status=index_status,
+        )
+
+    def __get_details(
+        self,
+        cache: dict[str, tuple[_FileStat, dict]],
+        get_stats,
+        filename: str,
+        stat: _FileStat,
+        read_details,
+    ) -> dict:
+        """Returns the details of the file, or {} while they are read in background."""
+        cached = cache.get(filename)
+
+        if cached is not None and cached[0] == stat:
+            return cached[1]
+
+        # Filenames of PDFs and indexes differ by their suffixes.
+        key = (filename, stat.mtime_ns, stat.size)
+
+        if key not in self.__pending_reads:
+            self.__pending_reads.add(key)
+            self.__reader.submit(
+                self.__read_details_in_background,
+                cache,
+                get_stats,
+                key,
+                stat,
+                read_details,
+            )
+
+        return {}
+
+    def __read_details_in_background(
+        self,
+        cache: dict[str, tuple[_FileStat, dict]],
+        get_stats,
+        key: tuple[str, int, int],
+        stat: _FileStat,
+        read_details,
+    ):
+        details = read_details()
+        filename = key[0]
+
+        with self.__lock:
+            self.__pending_reads.discard(key)
+
+            # The file has been modified or removed while it was read.
+            if get_stats().get(filename) != stat:
+                return
+
+            cache[filename] = (stat, details)
+            # The next snapshot is made with the details.
+            self.__refreshed_at = float("-inf")
+
+    def __read_pdf_details(self, path_pdf: str) -> dict:
+        details = {"sha256": None, "n_pages": None}
+
+        try:
+            details["sha256"] = calc_file_sha256(path_pdf)
+        except OSError as err:
+            logger.warning("Failed to read a PDF", path=path_pdf, error=err)
+            return details
+
+        try:
+            import pdf2image
+
+            details["n_pages"] = pdf2image.pdfinfo_from_path(
+                path_pdf, poppler_path=Config.get_instance().path_poppler_exe
+            )["Pages"]
+        except Exception as err:
+            logger.warning("Failed to get the page count", path=path_pdf, error=err)
+
+        return details
+
+    def __read_index_details(self, path_index: str) -> dict:
+        try:
+            with open(path_index, "r", encoding="utf-8") as fp:
+                metadata = json.load(fp)["metadata"]
+
+            return {"n_pages": metadata["n_pages"], "doc_type": metadata["doc_type"]}
+
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning("Failed to read index metadata", path=path_index, error=err)
+            return {}
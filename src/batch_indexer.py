@@ -0,0 +1,179 @@
+"""
+Generates document indexes of the PDFs in the data directory, without the PDF analyzer (WebSocket).
+
+Usage (in src directory):
+    python batch_indexer.py [ASSET_ID ...] [--n-workers N] [--force]
+
+Without asset ids, all PDFs in the data directory are indexed.
+PDFs whose index is up to date are skipped (unless --force), and the largest PDFs
+are started first, so that a long PDF does not start last and keep a worker busy alone at the end.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable
+
+from asset_catalog import AssetCatalog, AssetCatalogEntry, IndexStatus
+from document_pdf import DocumentPDF
+from util.asset import Asset
+from util.config import Config
+from util.log import setup_logging
+
+
+@dataclass
+class BatchIndexerResult:
+    """Represents the result of indexing an asset."""
+
+    asset_id: str
+    n_pages: int
+    elapsed_sec: float
+    error: str | None = None
+
+
+def select_assets(
+    asset_ids: list[str] | None = None, force=False
+) -> list[AssetCatalogEntry]:
+    """
+    Returns the assets to index, largest PDF first.
+
+    Assets without PDF are skipped, and so are the ones with an up-to-date index unless force is True.
+    """
+    catalog = AssetCatalog(min_refresh_interval_sec=0)
+    # Page counts of the PDFs are needed to find partial indexes.
+    catalog.get_snapshot()
+    catalog.wait_for_details()
+
+    entries = {entry.asset_id: entry for entry in catalog.get_snapshot().assets}
+
+    selected = []
+    for asset_id in asset_ids if asset_ids else list(entries):
+        entry = entries.get(asset_id)
+
+        if entry is None or entry.pdf_size is None:
+            print(f"[BatchIndexer] {asset_id}: PDF does not exist. Skipping...")
+            continue
+
+        if entry.index_status == IndexStatus.FRESH and not force:
+            print(f"[BatchIndexer] {asset_id}: index is up to date. Skipping...")
+            continue
+
+        selected.append(entry)
+
+    return sorted(selected, key=lambda entry: entry.pdf_size, reverse=True)
+
+
+def index_asset(asset_id: str) -> BatchIndexerResult:
+    """Generates the document index of the asset (in a worker process)."""
+    config = Config.get_instance()
+
+    async def progress_handler(progress: float):
+        print(f"[BatchIndexer] {asset_id}: {100 * progress:.0f}%")
+
+    time_start = time.perf_counter()
+    document_index = asyncio.run(
+        DocumentPDF(asset_id, config.path_poppler_exe).generate_document_index_data(
+            None,
+            Asset.get_dirpath_document_index(),
+            config.path_tesseract_ocr_exe,
+            progress_callback_async=progress_handler,
+        )
+    )
+
+    return BatchIndexerResult(
+        asset_id, document_index.metadata.n_pages, time.perf_counter() - time_start
+    )
+
+
+def init_worker():
+    # Tesseract runs its own threads (OpenMP) by default, which only compete
+    # with the other workers when all CPUs are used by the workers.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    # Warnings of the indexing are written along with the progress of BatchIndexer.
+    setup_logging("WARNING")
+
+
+def run_batch(
+    asset_ids: list[str],
+    n_workers: int,
+    index_fn: Callable[[str], BatchIndexerResult] = index_asset,
+) -> list[BatchIndexerResult]:
+    """Indexes the assets in the order given, by at most n_workers processes at a time."""
+    results: list[BatchIndexerResult] = []
+
+    if len(asset_ids) == 0:
+        return results
+
+    with ProcessPoolExecutor(
+        max_workers=min(n_workers, len(asset_ids)), initializer=init_worker
+    ) as executor:
+        futures = {
+            executor.submit(index_fn, asset_id): asset_id for asset_id in asset_ids
+        }
+
+        for future in as_completed(futures):
+            asset_id = futures[future]
+
+            try:
+                result = future.result()
+                print(
+                    f"[BatchIndexer] ({len(results) + 1}/{len(asset_ids)}) {asset_id}: "
+                    f"{result.n_pages} pages in {result.elapsed_sec:.1f} sec "
+                    f"({result.n_pages / max(result.elapsed_sec, 1e-9):.2f} pages/sec)"
+                )
+            except Exception as err:
+                result = BatchIndexerResult(asset_id, 0, 0.0, error=repr(err))
+                print(
+                    f"[BatchIndexer] ({len(results) + 1}/{len(asset_ids)}) {asset_id}: "
+                    f"failed: {result.error}"
+                )
+
+            results.append(result)
+
+    return results
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("asset_ids", nargs="*")
+    parser.add_argument(
+        "--n-workers",
+        type=int,
+        default=Config().batch_indexer_n_workers,
+        help="Processes indexing PDFs in parallel (0: the number of CPUs)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Index PDFs with an up-to-date index too"
+    )
+    args = parser.parse_args(argv)
+
+    assets = select_assets(args.asset_ids, force=args.force)
+    n_workers = args.n_workers if args.n_workers > 0 else os.cpu_count() or 1
+
+    print(f"[BatchIndexer] Indexing {len(assets)} PDFs with {n_workers} workers.")
+
+    time_start = time.perf_counter()
+    results = run_batch([entry.asset_id for entry in assets], n_workers)
+    elapsed_sec = time.perf_counter() - time_start
+
+    n_pages = sum(result.n_pages for result in results)
+    failures = [result for result in results if result.error is not None]
+
+    print(
+        f"[BatchIndexer] Indexed {len(results) - len(failures)} PDFs ({n_pages} pages) "
+        f"in {elapsed_sec:.1f} sec: {n_pages / max(elapsed_sec, 1e-9):.2f} pages/sec"
+    )
+    for result in failures:
+        print(f"[BatchIndexer] Failed: {result.asset_id}: {result.error}")
+
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
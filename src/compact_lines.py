@@ -0,0 +1,199 @@
+import sys
+from array import array
+from collections.abc import Sequence
+
+# Coordinates of a line in CompactLines.coords: left, top, right, bottom, offset_left, offset_top
+N_COORDS = 6
+
+
+class CompactLines:
+    """
+    Struct-of-arrays storage of the lines of a document index.
+
+    Instead of a ShapedLineBox (and a LinePositionWithPageOffset with nested bbox lists) per line,
+    contents are kept in a list of interned strings, and coordinates in one flat array of ints.
+    Lines are numbered in the order of concat_index_data, and page_starts[i] is the first line of page i.
+    """
+
+    __slots__ = ("contents", "coords", "page_starts")
+
+    def __init__(self):
+        self.contents: list[str] = []
+        self.coords = array("i")
+        self.page_starts = array("i")
+
+    def __len__(self):
+        return len(self.contents)
+
+    def get_n_pages(self):
+        return len(self.page_starts) - 1
+
+    @staticmethod
+    def from_json_serializable(index_data: list[list[dict]]):
+        """A factory method to create from index_data of a document index output file."""
+        lines = CompactLines()
+
+        for index_list_of_page in index_data:
+            lines.page_starts.append(len(lines.contents))
+
+            for linebox in index_list_of_page:
+                lines.contents.append(sys.intern(linebox["content"]))
+                for point in linebox["position"]:
+                    lines.coords.extend(point)
+
+        lines.page_starts.append(len(lines.contents))
+        return lines
+
+
+class CompactLinePosition:
+    """View of the position of a line in CompactLines, with the interface of LinePositionWithPageOffset."""
+
+    __slots__ = ("__coords", "__i")
+
+    def __init__(self, coords: array, i_line: int):
+        self.__coords = coords
+        self.__i = i_line * N_COORDS
+
+    @property
+    def bbox(self):
+        c, i = self.__coords, self.__i
+        return ((c[i], c[i + 1]), (c[i + 2], c[i + 3]), (c[i + 4], c[i + 5]))
+
+    def get_left(self):
+        """Get left position of bounding box."""
+        return self.__coords[self.__i]
+
+    def get_top(self):
+        """Get top position of bounding box."""
+        return self.__coords[self.__i + 1]
+
+    def get_right(self):
+        """Get right position of bounding box."""
+        return self.__coords[self.__i + 2]
+
+    def get_bottom(self):
+        """Get bottom position of bounding box."""
+        return self.__coords[self.__i + 3]
+
+    def get_offset_left(self):
+        """Get left offset of bounding box."""
+        return self.__coords[self.__i + 4]
+
+    def get_offset_top(self):
+        """Get top offset of bounding box."""
+        return self.__coords[self.__i + 5]
+
+    def get_width(self):
+        """Get width of bounding box."""
+        return self.get_right() - self.get_left()
+
+    def get_height(self):
+        """Get height of bounding box."""
+        return self.get_bottom() - self.get_top()
+
+    def __eq__(self, other):
+        return hasattr(other, "bbox") and self.bbox == tuple(
+            tuple(point) for point in other.bbox
+        )
+
+    def __hash__(self):
+        return hash(self.bbox)
+
+    def __repr__(self):
+        return f"CompactLinePosition(bbox={self.bbox})"
+
+
+class CompactLineBox:
+    """View of a line in CompactLines, with the interface of ShapedLineBox."""
+
+    __slots__ = ("__lines", "__i_line")
+
+    def __init__(self, lines: CompactLines, i_line: int):
+        self.__lines = lines
+        self.__i_line = i_line
+
+    @property
+    def content(self) -> str:
+        return self.__lines.contents[self.__i_line]
+
+    @property
+    def position(self):
+        return CompactLinePosition(self.__lines.coords, self.__i_line)
+
+    def to_json_serializable(self):
+        return {"content": self.content, "position": self.position.bbox}
+
+    def __eq__(self, other):
+        return (
+            hasattr(other, "content")
+            and hasattr(other, "position")
+            and self.content == other.content
+            and self.position == other.position
+        )
+
+    def __hash__(self):
+        return hash((self.content, self.position))
+
+    def __repr__(self):
+        return f"CompactLineBox(content={self.content!r}, position={self.position!r})"
+
+
+class CompactLineSequence(Sequence):
+    """Lines [i_start, i_end) of CompactLines as a sequence of CompactLineBox."""
+
+    __slots__ = ("__lines", "__i_start", "__i_end")
+
+    def __init__(self, lines: CompactLines, i_start=0, i_end: int | None = None):
+        self.__lines = lines
+        self.__i_start = i_start
+        self.__i_end = len(lines) if i_end is None else i_end
+
+    def __len__(self):
+        return self.__i_end - self.__i_start
+
+    def __getitem__(self, i: int) -> CompactLineBox:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        return CompactLineBox(self.__lines, self.__i_start + i)
+
+    def get_contents(self) -> list[str]:
+        """Returns the contents of the lines, without creating views."""
+        return self.__lines.contents[self.__i_start : self.__i_end]
+
+
+class CompactPageSequence(Sequence):
+    """Pages of CompactLines as a sequence of CompactLineSequence (= index_data of DocumentIndex)."""
+
+    __slots__ = ("__lines",)
+
+    def __init__(self, lines: CompactLines):
+        self.__lines = lines
+
+    def __len__(self):
+        return self.__lines.get_n_pages()
+
+    def __getitem__(self, i_page: int) -> CompactLineSequence:
+        if isinstance(i_page, slice):
+            return [self[j] for j in range(*i_page.indices(len(self)))]
+
+        if i_page < 0:
+            i_page += len(self)
+
+        if not 0 <= i_page < len(self):
+            raise IndexError(i_page)
+
+        return CompactLineSequence(
+            self.__lines,
+            self.__lines.page_starts[i_page],
+            self.__lines.page_starts[i_page + 1],
+        )
+
+    def get_lines(self) -> CompactLines:
+        return self.__lines
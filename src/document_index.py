@@ -1,11 +1,23 @@
 import json
+import threading
 from enum import Enum
+from typing import TYPE_CHECKING
 from collections.abc import Iterable
 from dataclasses import dataclass, field
 
 from ocr import ShapedLineBox, OCRResult, LinePositionWithPageOffset
+from compact_lines import CompactLines, CompactLineSequence, CompactPageSequence
+from line_alignment import DiagonalRunAligner, LineAlignment
 from util import text
+from util.deadline import Deadline
 from util.base_class import JSONSerializableData
+from util.log import get_logger
+
+# page_signature (numpy) is imported when candidate pages of a slide are searched first.
+if TYPE_CHECKING:
+    from page_signature import PageSignatureIndex
+
+logger = get_logger("DocumentIndex")
 
 
 class DocumentType(Enum):
@@ -59,22 +71,81 @@ class DocumentMetadata(JSONSerializableData):
 
 
 @dataclass
-class FoundRelatedPage:
+class FoundRelatedPage(JSONSerializableData):
     i_page: int
     match_src_from_index: ShapedLineBox
     match_src_from_video_frame: ShapedLineBox
     ngram_score: float
     sq_match_score: float
+    partial: bool = False  # Found by a search stopped by its deadline
+
+    def to_json_serializable(self):
+        return {
+            "i_page": self.i_page,
+            "match_src_from_index": self.match_src_from_index.to_json_serializable(),
+            "match_src_from_video_frame": self.match_src_from_video_frame.to_json_serializable(),
+            "ngram_score": self.ngram_score,
+            "sq_match_score": self.sq_match_score,
+            "partial": self.partial,
+        }
+
+    @staticmethod
+    def from_json_serializable(data: dict):
+        """A factory method to create from the output of to_json_serializable()."""
+        return FoundRelatedPage(
+            i_page=data["i_page"],
+            match_src_from_index=ShapedLineBox.from_json_serializable(
+                data["match_src_from_index"]
+            ),
+            match_src_from_video_frame=ShapedLineBox.from_json_serializable(
+                data["match_src_from_video_frame"]
+            ),
+            ngram_score=data["ngram_score"],
+            sq_match_score=data["sq_match_score"],
+            partial=data.get("partial", False),
+        )
 
 
 @dataclass
-class FoundRelatedLine:
+class FoundRelatedLine(JSONSerializableData):
     i_line_video_frame: int
     i_line_index_data: int
     match_src_from_index: ShapedLineBox
     match_src_from_video_frame: ShapedLineBox
     ngram_score: float
     sq_match_score: float
+    partial: bool = False  # Found by a search stopped by its deadline
+    n_series: int = 1  # Number of consecutive matched lines
+
+    def to_json_serializable(self):
+        return {
+            "i_line_video_frame": self.i_line_video_frame,
+            "i_line_index_data": self.i_line_index_data,
+            "n_series": self.n_series,
+            "match_src_from_index": self.match_src_from_index.to_json_serializable(),
+            "match_src_from_video_frame": self.match_src_from_video_frame.to_json_serializable(),
+            "ngram_score": self.ngram_score,
+            "sq_match_score": self.sq_match_score,
+            "partial": self.partial,
+        }
+
+    @staticmethod
+    def from_json_serializable(data: dict):
+        """A factory method to create from the output of to_json_serializable()."""
+        return FoundRelatedLine(
+            i_line_video_frame=data["i_line_video_frame"],
+            i_line_index_data=data["i_line_index_data"],
+            n_series=data.get("n_series", 1),
+            match_src_from_index=ShapedLineBox.from_json_serializable(
+                data["match_src_from_index"]
+            ),
+            match_src_from_video_frame=ShapedLineBox.from_json_serializable(
+                data["match_src_from_video_frame"]
+            ),
+            ngram_score=data["ngram_score"],
+            sq_match_score=data["sq_match_score"],
+            partial=data.get("partial", False),
+        )
 
 
 @dataclass
@@ -93,16 +164,44 @@ class DocumentIndexOutput:
 class DocumentIndex(JSONSerializableData):
     metadata: DocumentMetadata
 
-    index_data: list[
-        list[ShapedLineBox]
-    ]  # A list consists of list of all OCRResult.data in each page.
+    index_data: (
+        list[list[ShapedLineBox]] | CompactPageSequence
+    )  # A list consists of list of all OCRResult.data in each page.
 
-    concat_index_data: list[ShapedLineBox] = field(
+    concat_index_data: list[ShapedLineBox] | CompactLineSequence = field(
         init=False
     )  # A list consists of all OCRResult.data in index_data, without separating by pages.
 
     def __post_init__(self):
-        self.concat_index_data = self.__get_concat_linebox_data()
+        if isinstance(self.index_data, CompactPageSequence):
+            # Lines are not duplicated, but viewed in the order of concatenation.
+            self.concat_index_data = CompactLineSequence(self.index_data.get_lines())
+        else:
+            self.concat_index_data = self.__get_concat_linebox_data()
+
+        self.__line_aligners: dict[tuple, DiagonalRunAligner] = {}
+
+        # MinHash signatures of pages to find candidate pages of slides, built on first use.
+        self.__page_signature_index: "PageSignatureIndex | None" = None
+        self.__page_signature_index_lock = threading.Lock()
+
+    def get_page_signature_index(self) -> "PageSignatureIndex | None":
+        """Returns the page signatures of the slides, or None if the document is not slides."""
+        if self.metadata.doc_type != DocumentType.SLIDE:
+            return None
+
+        with self.__page_signature_index_lock:
+            if self.__page_signature_index is None:
+                from page_signature import PageSignatureIndex
+
+                self.__page_signature_index = PageSignatureIndex(
+                    [
+                        "\n".join(linebox.content for linebox in lineboxes_of_page)
+                        for lineboxes_of_page in self.index_data
+                    ]
+                )
+
+            return self.__page_signature_index
 
     def get_the_page_index_data(self, i_page):
         return self.index_data[i_page]
@@ -123,8 +222,11 @@ class DocumentIndex(JSONSerializableData):
         }
 
     @staticmethod
-    def from_output_file(path_index_output: str):
-        """Loads the index data from output json file."""
+    def from_output_file(path_index_output: str, compact=True):
+        """
+        Loads the index data from output json file.
+        If compact is True, lines are kept in CompactLines instead of ShapedLineBox objects.
+        """
 
         with open(path_index_output, "r") as fp:
             index_output_raw: DocumentIndexOutput = json.load(fp)
@@ -143,17 +245,24 @@ class DocumentIndex(JSONSerializableData):
                 and len(index_data_output[0][0]["position"]) == 3
             )  # If index_data is empty, then it's invalid data.
 
-            index_data_converted: list[list[ShapedLineBox]] = []
-
-            for index_list_of_page in index_data_output:
-                index_data_converted.append([])
-                for linebox in index_list_of_page:
-                    index_data_converted[-1].append(
-                        ShapedLineBox(
-                            content=linebox["content"],
-                            position=LinePositionWithPageOffset(linebox["position"]),
+            if compact:
+                index_data_converted = CompactPageSequence(
+                    CompactLines.from_json_serializable(index_data_output)
+                )
+            else:
+                index_data_converted: list[list[ShapedLineBox]] = []
+
+                for index_list_of_page in index_data_output:
+                    index_data_converted.append([])
+                    for linebox in index_list_of_page:
+                        index_data_converted[-1].append(
+                            ShapedLineBox(
+                                content=linebox["content"],
+                                position=LinePositionWithPageOffset(
+                                    linebox["position"]
+                                ),
+                            )
                         )
-                    )
 
             # Type check for metadata
             # assert (
@@ -191,6 +300,36 @@ class DocumentIndex(JSONSerializableData):
 
         return data_concat
 
+    def get_index_contents(self) -> list[str]:
+        """Returns contents of concat_index_data."""
+        if isinstance(self.concat_index_data, CompactLineSequence):
+            return self.concat_index_data.get_contents()
+
+        return [linebox.content for linebox in self.concat_index_data]
+
+    def get_line_aligner(
+        self,
+        th_valid_similarity_ngram=0.75,
+        th_valid_similarity_sqmatch=0.7,
+        th_valid_str_length=10,
+        th_valid_strlen_rate_min=0.8,
+    ) -> DiagonalRunAligner:
+        """Returns the DiagonalRunAligner for concat_index_data, built once for each set of thresholds."""
+        thresholds = (
+            th_valid_similarity_ngram,
+            th_valid_similarity_sqmatch,
+            th_valid_str_length,
+            th_valid_strlen_rate_min,
+        )
+
+        if thresholds not in self.__line_aligners:
+            self.__line_aligners[thresholds] = DiagonalRunAligner(
+                self.get_index_contents(),
+                *thresholds,
+            )
+
+        return self.__line_aligners[thresholds]
+
     def search_most_matching_line(
         self,
         ocr_result_video_frame: OCRResult,
@@ -199,8 +338,81 @@ class DocumentIndex(JSONSerializableData):
         th_valid_similarity_sqmatch=0.7,
         th_valid_str_length=10,
         th_valid_strlen_rate_min=0.8,
+        line_aligner: DiagonalRunAligner | None = None,
+        deadline: Deadline | None = None,
+    ):
+        """
+        Searches for the most matching line between document index data and OCRResult.data from video frame.
+        Returns the same result as search_most_matching_line_exhaustive(), scoring each pair of lines at most once.
+
+        line_aligner can be given to run the search with another aligner of concat_index_data
+        (e.g. ShardedLineMatcher). Its own thresholds are used in that case.
+        If the deadline passes, the best line found so far is returned with partial=True.
+        """
+        n_series = min(len(ocr_result_video_frame.data), max_n_series)
+
+        # If a number of DocumentIndex OCRResult.data is less than n_series,
+        # the attempt is considered to be failured.
+        if len(self.concat_index_data) < n_series or len(self.concat_index_data) < len(
+            ocr_result_video_frame.data
+        ):
+            raise ValueError(
+                "Invalid LBBFMT index data: contents are too short. Please check pdf data and analyze it again."
+            )
+
+        if len(ocr_result_video_frame.data) < 1:
+            logger.debug("No LBBFMT target detected")
+            return None
+
+        if line_aligner is None:
+            line_aligner = self.get_line_aligner(
+                th_valid_similarity_ngram,
+                th_valid_similarity_sqmatch,
+                th_valid_str_length,
+                th_valid_strlen_rate_min,
+            )
+
+        alignment: LineAlignment | None = line_aligner.search(
+            [linebox.content for linebox in ocr_result_video_frame.data],
+            max_n_series=max_n_series,
+            deadline=deadline,
+        )
+
+        if alignment is None:
+            return None
+
+        # The last pair of lines in the run is reported as the matched lines.
+        i_last = alignment.n_series - 1
+
+        return FoundRelatedLine(
+            i_line_video_frame=alignment.i_line_video_frame,
+            i_line_index_data=alignment.i_line_index_data,
+            match_src_from_index=self.concat_index_data[
+                alignment.i_line_index_data + i_last
+            ],
+            match_src_from_video_frame=ocr_result_video_frame.data[
+                alignment.i_line_video_frame + i_last
+            ],
+            ngram_score=alignment.ngram_score,
+            sq_match_score=alignment.sq_match_score,
+            partial=alignment.partial,
+            n_series=alignment.n_series,
+        )
+
+    def search_most_matching_line_exhaustive(
+        self,
+        ocr_result_video_frame: OCRResult,
+        max_n_series=3,
+        th_valid_similarity_ngram=0.75,
+        th_valid_similarity_sqmatch=0.7,
+        th_valid_str_length=10,
+        th_valid_strlen_rate_min=0.8,
     ):
-        """Searches for the most matching line between document index data and OCRResult.data from video frame."""
+        """
+        Searches for the most matching line between document index data and OCRResult.data from video frame,
+        by comparing every window of video frame lines with every window of index lines.
+        It is kept as the reference implementation of search_most_matching_line().
+        """
         n_series = min(len(ocr_result_video_frame.data), max_n_series)
 
         # If a number of DocumentIndex OCRResult.data is less than n_series,
@@ -213,7 +425,7 @@ class DocumentIndex(JSONSerializableData):
             )
 
         if len(ocr_result_video_frame.data) < 1:
-            print("WARNING: No LBBFMT target detected.")
+            logger.debug("No LBBFMT target detected")
             return None
 
         for n in reversed(range(1, n_series + 1)):  # Attempt order : [n, n-1, ..., 1]
@@ -275,28 +487,72 @@ class DocumentIndex(JSONSerializableData):
                             match_src_from_video_frame=curr_video_frame_line,
                             ngram_score=sm_ngram,
                             sq_match_score=sm_sqmatch,
+                            n_series=n,
                         )
 
         return None
 
+    def get_candidate_pages(
+        self, ocr_result_video_frame: OCRResult, n_candidates=8
+    ) -> list[int] | None:
+        """
+        Returns ids of pages which are likely to match the video frame, found by page signatures.
+        Returns None (= all pages) if the document has no page signatures,
+        or no page is similar to the video frame.
+        """
+        page_signature_index = self.get_page_signature_index()
+
+        if page_signature_index is None:
+            return None
+
+        candidate_pages = page_signature_index.get_candidate_pages(
+            "\n".join(linebox.content for linebox in ocr_result_video_frame.data),
+            n_candidates,
+        )
+
+        return candidate_pages if len(candidate_pages) > 0 else None
+
     def search_most_matching_page(
         self,
-        ocr_result_video_frame: OCRResult,
+        ocr_result_video_frame: OCRResult | Iterable[ShapedLineBox],
         th_valid_similarity_ngram=0.75,
         th_valid_similarity_sqmatch=0.7,
         th_valid_str_length=10,
         th_valid_strlen_rate_min=0.8,
+        candidate_page_ids: list[int] | None = None,
+        deadline: Deadline | None = None,
     ):
-        """Searches for the most matching page between document index data and OCRResult.data from video frame."""
+        """
+        Searches for the most matching page between document index data and OCRResult.data from video frame.
+        If candidate_page_ids is given (e.g. by get_candidate_pages()), only the candidate pages are searched.
+        If the deadline passes, the most matching page found so far is returned with partial=True.
+
+        Lines of the video frame can also be given as an iterable (e.g. BandOCR), which is read only
+        until a unique page is found, so that the lines below are not needed.
+        """
+        interrupted = False
         prev_found_related_page_list: list[FoundRelatedPage] = []
+        all_page_id_list = (
+            list(range(self.metadata.n_pages))
+            if candidate_page_ids is None
+            else candidate_page_ids
+        )
 
-        for curr_linebox_from_vf in ocr_result_video_frame.data:
+        for curr_linebox_from_vf in (
+            ocr_result_video_frame.data
+            if isinstance(ocr_result_video_frame, OCRResult)
+            else ocr_result_video_frame
+        ):
             # targetで検出されたOCR検出結果を上から順に操作
             # スライド差分は上から下に展開されるため，必ずタイトルは残る場合が多い
             # or 早い段階でタイトルに該当する部分は出現するはず
             if len(curr_linebox_from_vf.content) < th_valid_str_length:
                 continue
 
+            if deadline is not None and deadline.is_expired():
+                interrupted = True
+                break
+
             # List of id of pages for next attempt
             # Repeat the attempt for each page in document until it finds one specific related page.
             active_page_id_list_for_next_attempt = (
@@ -304,9 +560,7 @@ class DocumentIndex(JSONSerializableData):
                     v.i_page for v in prev_found_related_page_list
                 ]  # Attempt prev found pages if number of them is more than one page (num of pages > 1)
                 if len(prev_found_related_page_list) > 0
-                else list(
-                    range(self.metadata.n_pages)
-                )  # Attempt all pages in document if no related pages are found in previous attempt
+                else all_page_id_list  # Attempt all pages in document if no related pages are found in previous attempt
             )
 
             # Find related pages of current linebox from ocr result
@@ -317,8 +571,17 @@ class DocumentIndex(JSONSerializableData):
                 th_valid_similarity_sqmatch=th_valid_similarity_sqmatch,
                 th_valid_str_length=th_valid_str_length,
                 th_valid_strlen_rate_min=th_valid_strlen_rate_min,
+                deadline=deadline,
             )
 
+            if deadline is not None and deadline.is_expired():
+                # Not all active pages have been searched for the line,
+                # but the pages found match one more line than the previous ones.
+                interrupted = True
+                if len(curr_found_related_page_list) > 0:
+                    prev_found_related_page_list = curr_found_related_page_list
+                break
+
             # CASE 1:
             # If one related page found, then return it
             if len(curr_found_related_page_list) == 1:
@@ -359,6 +622,7 @@ class DocumentIndex(JSONSerializableData):
                 if score_of_found_page > score_of_most_matching_page:
                     most_matching_page = found_page
 
+            most_matching_page.partial = interrupted
             return most_matching_page
 
         # Failed to match. Return an empty tuple.
@@ -372,11 +636,14 @@ class DocumentIndex(JSONSerializableData):
         th_valid_similarity_sqmatch: float,
         th_valid_str_length: float,
         th_valid_strlen_rate_min: float,
+        deadline: Deadline | None = None,
     ):
         result: list[FoundRelatedPage] = []
-        for i_page, ocr_result_page in enumerate(self.index_data):
-            if i_page not in active_page_id_list:
-                continue
+        for i_page in sorted(set(active_page_id_list)):
+            if deadline is not None and deadline.is_expired():
+                break
+
+            ocr_result_page = self.index_data[i_page]
 
             for curr_linebox_from_index in ocr_result_page:
                 if len(curr_linebox_from_index.content) < th_valid_str_length:
@@ -0,0 +1,189 @@
+import os
+import json
+import threading
+
+from document_index import DocumentIndex
+from document_index_store import DocumentIndexStore
+from util.asset import Asset
+from util.config import Config
+from util.base_class import Singleton
+from util.log import get_logger
+
+logger = get_logger("DocumentIndexPool")
+
+
+class DocumentIndexPool(Singleton):
+    """
+    Loaded document indexes shared by the services in a process: asset_id -> DocumentIndex.
+
+    A document index is reloaded when its output file has been modified (e.g. regenerated
+    by another process), and dropped when the file has been removed.
+    Indexers in the same process can call invalidate() to make a new index visible at once.
+
+    Recently used assets are recorded, so that their indexes can be loaded in background
+    by prewarm() when a service starts.
+
+    An index is loaded under a lock of its asset, so that only callers of the same asset
+    wait for it to be loaded.
+    """
+
+    MAX_RECENT_ASSETS = 50
+
+    __initialized = False
+
+    def __init__(self):
+        if self.__initialized:
+            return
+
+        self.__lock = threading.RLock()
+        self.__load_locks: dict[str, threading.Lock] = {}
+        self.__document_indexes: dict[str, tuple[int, DocumentIndex]] = {}
+        self.__document_index_store: DocumentIndexStore | None = None
+
+        self.__initialized = True
+
+    def get(self, asset_id: str) -> DocumentIndex | None:
+        """Returns the document index of the asset, or None if it does not exist."""
+        return self.__get(asset_id, record_recent=True)
+
+    def __get(self, asset_id: str, record_recent: bool) -> DocumentIndex | None:
+        path_index = Asset.get_path_document_index(asset_id)
+
+        try:
+            mtime_ns = os.stat(path_index).st_mtime_ns
+        except FileNotFoundError:
+            logger.debug("Document index cache does not exist", asset_id=asset_id)
+            self.invalidate(asset_id)
+            return None
+
+        # Loaded indexes are returned without waiting for the other assets being loaded.
+        loaded = self.__document_indexes.get(asset_id)
+        if loaded is not None and loaded[0] == mtime_ns:
+            return loaded[1]
+
+        with self.__get_load_lock(asset_id):
+            loaded = self.__document_indexes.get(asset_id)
+
+            if loaded is not None and loaded[0] == mtime_ns:
+                return loaded[1]
+
+            document_index = self.__load(asset_id, path_index, mtime_ns)
+
+            with self.__lock:
+                self.__document_indexes[asset_id] = (mtime_ns, document_index)
+
+            if loaded is None and record_recent:
+                self.__record_recent_asset(asset_id)
+
+            return document_index
+
+    def __get_load_lock(self, asset_id: str) -> threading.Lock:
+        with self.__lock:
+            if asset_id not in self.__load_locks:
+                self.__load_locks[asset_id] = threading.Lock()
+
+            return self.__load_locks[asset_id]
+
+    def get_version(self, asset_id: str, document_index: DocumentIndex) -> str | None:
+        """
+        Returns the version of the loaded document index of the asset (mtime of its output file),
+        or None if the document index is not the loaded one (e.g. it has been reloaded).
+        """
+        loaded = self.__document_indexes.get(asset_id)
+
+        if loaded is None or loaded[1] is not document_index:
+            return None
+
+        return str(loaded[0])
+
+    def invalidate(self, asset_id: str):
+        """Drops the loaded document index of the asset, to be loaded again on next get()."""
+        with self.__lock:
+            self.__document_indexes.pop(asset_id, None)
+
+    def prewarm(self, n_assets: int) -> threading.Thread | None:
+        """Loads the indexes of the n most recently used assets in a background thread."""
+        asset_ids = self.get_recent_assets()[:n_assets]
+
+        if len(asset_ids) == 0:
+            return None
+
+        thread = threading.Thread(
+            target=self.__prewarm,
+            args=(asset_ids,),
+            name="DocumentIndexPrewarm",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def __prewarm(self, asset_ids: list[str]):
+        logger.info("Prewarming document indexes", asset_ids=asset_ids)
+
+        for asset_id in asset_ids:
+            try:
+                # Not recorded again, to keep the order of recently used assets.
+                self.__get(asset_id, record_recent=False)
+            except Exception as err:
+                logger.warning("Failed to prewarm", asset_id=asset_id, error=err)
+
+        logger.info("Prewarming finished")
+
+    def get_recent_assets(self) -> list[str]:
+        """Returns ids of recently used assets, most recent first."""
+        try:
+            with open(Asset.get_path_recent_assets(), "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return []
+
+    def __record_recent_asset(self, asset_id: str):
+        path_recent_assets = Asset.get_path_recent_assets()
+
+        # Assets loaded at the same time are recorded one by one.
+        with self.__lock:
+            recent_asset_ids = [asset_id] + [
+                recent_asset_id
+                for recent_asset_id in self.get_recent_assets()
+                if recent_asset_id != asset_id
+            ]
+
+            try:
+                os.makedirs(os.path.dirname(path_recent_assets), exist_ok=True)
+                path_tmp = f"{path_recent_assets}.tmp"
+                with open(path_tmp, "w", encoding="utf-8") as fp:
+                    json.dump(recent_asset_ids[: self.MAX_RECENT_ASSETS], fp)
+                os.replace(path_tmp, path_recent_assets)
+            except OSError as err:
+                logger.warning("Failed to record recent assets", error=err)
+
+    def __load(self, asset_id: str, path_index: str, mtime_ns: int) -> DocumentIndex:
+        config = Config.get_instance()
+
+        if config.index_store_backend != "sqlite":
+            return DocumentIndex.from_output_file(path_index)
+
+        # The output file is imported to the store only if it is newer than the stored one.
+        with self.__lock:
+            if self.__document_index_store is None:
+                os.makedirs(
+                    os.path.dirname(Asset.get_path_document_index_store()),
+                    exist_ok=True,
+                )
+                self.__document_index_store = DocumentIndexStore(
+                    Asset.get_path_document_index_store()
+                )
+
+            store = self.__document_index_store
+
+        if store.get_source_mtime_ns(asset_id) != mtime_ns:
+            logger.info("Importing document index to the store", asset_id=asset_id)
+            store.put_document_index(
+                DocumentIndex.from_output_file(path_index),
+                mtime_ns,
+                asset_id=asset_id,
+            )
+
+        return store.load_document_index(
+            asset_id, n_candidate_lines=config.index_store_n_candidate_lines
+        )
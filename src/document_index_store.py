@@ -0,0 +1,488 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from ocr import OCRResult, ShapedLineBox, LinePositionWithPageOffset
+from line_alignment import DiagonalRunAligner
+from document_index import (
+    DocumentIndex,
+    DocumentMetadata,
+    DocumentType,
+    PageMetadata,
+    FoundRelatedPage,
+)
+from util.deadline import Deadline
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    asset_id TEXT PRIMARY KEY,
+    metadata TEXT NOT NULL,
+    first_line_id INTEGER NOT NULL,
+    n_lines INTEGER NOT NULL,
+    source_mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    id INTEGER PRIMARY KEY,
+    asset_id TEXT NOT NULL,
+    i_line INTEGER NOT NULL,
+    i_page INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    position TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS lines_asset_line ON lines(asset_id, i_line);
+CREATE INDEX IF NOT EXISTS lines_asset_page ON lines(asset_id, i_page);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5(
+    content, content='lines', content_rowid='id', tokenize='trigram'
+);
+"""
+
+
+def build_trigram_query(content: str, max_trigrams=64) -> str | None:
+    """
+    Returns a FTS5 query which matches lines sharing any trigram with the content,
+    or None if the content is too short to have a trigram.
+    """
+    trigrams = list(
+        dict.fromkeys(
+            content[i : i + 3].lower()
+            for i in range(len(content) - 2)
+            if content[i : i + 3].strip()
+        )
+    )
+
+    if len(trigrams) == 0:
+        return None
+
+    if len(trigrams) > max_trigrams:
+        # Take trigrams evenly from the whole content
+        step = len(trigrams) / max_trigrams
+        trigrams = [trigrams[int(i * step)] for i in range(max_trigrams)]
+
+    return " OR ".join(
+        '"{}"'.format(trigram.replace('"', '""')) for trigram in trigrams
+    )
+
+
+def _create_line(row: tuple[str, str]) -> ShapedLineBox:
+    content, position = row
+    return ShapedLineBox(
+        content=content, position=LinePositionWithPageOffset(json.loads(position))
+    )
+
+
+class DocumentIndexStore:
+    """
+    SQLite database of document indexes of many assets.
+
+    Lines of all assets are kept in one table with a FTS5 trigram index over their contents.
+    Lines of an asset have consecutive row ids, so that a full-text search can be limited
+    to the asset by a row id range.
+    """
+
+    def __init__(self, path_db: str):
+        # The connection is shared by threads, and used under the lock.
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path_db, check_same_thread=False)
+        self.__connection.executescript(SCHEMA)
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+    def get_source_mtime_ns(self, asset_id: str) -> int | None:
+        """Returns mtime of the file from which the document index was stored, or None if not stored."""
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT source_mtime_ns FROM documents WHERE asset_id = ?", (asset_id,)
+            ).fetchone()
+
+        return row[0] if row is not None else None
+
+    def put_document_index(
+        self,
+        document_index: DocumentIndex,
+        source_mtime_ns=0,
+        asset_id: str | None = None,
+    ):
+        """
+        Stores the document index, replacing the stored one of the same asset.
+        asset_id defaults to the one in the metadata (it differs if the index is shared by assets).
+        """
+        asset_id = asset_id or document_index.metadata.asset_id
+        metadata = document_index.metadata
+        metadata_raw = {
+            "asset_id": metadata.asset_id,
+            "width": metadata.width,
+            "height": metadata.height,
+            "n_pages": metadata.n_pages,
+            "doc_type": metadata.doc_type.value,
+            # Loaded document indexes have raw lists instead of PageMetadata
+            "metadata_pages": [
+                (
+                    page_metadata.get_as_tuple()
+                    if isinstance(page_metadata, PageMetadata)
+                    else page_metadata
+                )
+                for page_metadata in metadata.metadata_pages
+            ],
+        }
+
+        with self.__lock, self.__connection:
+            self.__remove_document_index(asset_id)
+
+            (first_line_id,) = self.__connection.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM lines"
+            ).fetchone()
+
+            rows = [
+                (
+                    first_line_id + i_line,
+                    asset_id,
+                    i_line,
+                    i_page,
+                    linebox.content,
+                    json.dumps(linebox.position.bbox),
+                )
+                for i_line, (i_page, linebox) in enumerate(
+                    (i_page, linebox)
+                    for i_page, lineboxes_of_page in enumerate(
+                        document_index.index_data
+                    )
+                    for linebox in lineboxes_of_page
+                )
+            ]
+
+            self.__connection.executemany(
+                "INSERT INTO lines (id, asset_id, i_line, i_page, content, position) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.__connection.execute(
+                "INSERT INTO lines_fts (rowid, content) SELECT id, content FROM lines WHERE asset_id = ?",
+                (asset_id,),
+            )
+            self.__connection.execute(
+                "INSERT INTO documents (asset_id, metadata, first_line_id, n_lines, source_mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                (
+                    asset_id,
+                    json.dumps(metadata_raw),
+                    first_line_id,
+                    len(rows),
+                    source_mtime_ns,
+                ),
+            )
+
+    def remove_document_index(self, asset_id: str):
+        """Removes the stored document index of the asset."""
+        with self.__lock, self.__connection:
+            self.__remove_document_index(asset_id)
+
+    def __remove_document_index(self, asset_id: str):
+        # Rows of an external content FTS5 table must be deleted with their contents.
+        self.__connection.execute(
+            "INSERT INTO lines_fts (lines_fts, rowid, content) SELECT 'delete', id, content FROM lines WHERE asset_id = ?",
+            (asset_id,),
+        )
+        self.__connection.execute("DELETE FROM lines WHERE asset_id = ?", (asset_id,))
+        self.__connection.execute(
+            "DELETE FROM documents WHERE asset_id = ?", (asset_id,)
+        )
+
+    def load_document_index(self, asset_id: str, n_candidate_lines=32):
+        """Returns StoredDocumentIndex of the asset, or None if it is not stored."""
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT metadata, first_line_id, n_lines FROM documents WHERE asset_id = ?",
+                (asset_id,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        metadata_raw, first_line_id, n_lines = row
+        metadata = json.loads(metadata_raw)
+
+        return StoredDocumentIndex(
+            store=self,
+            asset_id=asset_id,
+            metadata=DocumentMetadata(
+                asset_id=metadata["asset_id"],
+                width=metadata["width"],
+                height=metadata["height"],
+                n_pages=metadata["n_pages"],
+                doc_type=DocumentType.from_str(metadata["doc_type"]),
+                metadata_pages=metadata["metadata_pages"],
+            ),
+            first_line_id=first_line_id,
+            n_lines=n_lines,
+            n_candidate_lines=n_candidate_lines,
+        )
+
+    def get_lines(self, asset_id: str, i_lines: list[int]) -> dict[int, ShapedLineBox]:
+        """Returns lines of the asset: i_line -> ShapedLineBox."""
+        result: dict[int, ShapedLineBox] = {}
+
+        with self.__lock:
+            for i_from in range(0, len(i_lines), 500):
+                chunk = i_lines[i_from : i_from + 500]
+                rows = self.__connection.execute(
+                    "SELECT i_line, content, position FROM lines WHERE asset_id = ? AND i_line IN ({})".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    (asset_id, *chunk),
+                ).fetchall()
+
+                for i_line, *line in rows:
+                    result[i_line] = _create_line(line)
+
+        return result
+
+    def get_page_lines(self, asset_id: str, i_page: int) -> list[ShapedLineBox]:
+        """Returns lines in the page of the asset."""
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT content, position FROM lines WHERE asset_id = ? AND i_page = ? ORDER BY i_line",
+                (asset_id, i_page),
+            ).fetchall()
+
+        return [_create_line(row) for row in rows]
+
+    def search_candidate_lines(
+        self,
+        first_line_id: int,
+        n_lines: int,
+        content: str,
+        min_length: int,
+        max_length: int,
+        limit: int,
+    ) -> list[tuple[int, int, ShapedLineBox]]:
+        """
+        Returns lines of an asset (rows first_line_id, ..., first_line_id + n_lines - 1)
+        which share the most trigrams with the content, as a list of (i_line, i_page, line).
+        """
+        query = build_trigram_query(content)
+
+        if query is None:
+            return []
+
+        with self.__lock:
+            rows = self.__connection.execute(
+                """
+                SELECT lines.i_line, lines.i_page, lines.content, lines.position
+                FROM lines_fts JOIN lines ON lines.id = lines_fts.rowid
+                WHERE lines_fts MATCH ?
+                    AND lines_fts.rowid BETWEEN ? AND ?
+                    AND length(lines.content) BETWEEN ? AND ?
+                ORDER BY lines_fts.rank
+                LIMIT ?
+                """,
+                (
+                    query,
+                    first_line_id,
+                    first_line_id + n_lines - 1,
+                    min_length,
+                    max_length,
+                    limit,
+                ),
+            ).fetchall()
+
+        return [(i_line, i_page, _create_line(line)) for i_line, i_page, *line in rows]
+
+
+class _StoredLines(Sequence):
+    """Lines of a stored document index, read from DocumentIndexStore on demand."""
+
+    def __init__(self, store: DocumentIndexStore, asset_id: str, n_lines: int):
+        self.__store = store
+        self.__asset_id = asset_id
+        self.__n_lines = n_lines
+
+        self.__lock = threading.Lock()
+        self.__cache: OrderedDict[int, ShapedLineBox] = OrderedDict()
+        self.__max_cache_size = 4096
+
+    def __len__(self):
+        return self.__n_lines
+
+    def __getitem__(self, i_line: int) -> ShapedLineBox:
+        if not 0 <= i_line < self.__n_lines:
+            raise IndexError(i_line)
+
+        with self.__lock:
+            if i_line in self.__cache:
+                self.__cache.move_to_end(i_line)
+                return self.__cache[i_line]
+
+        linebox = self.__store.get_lines(self.__asset_id, [i_line])[i_line]
+        self.put(i_line, linebox)
+        return linebox
+
+    def put(self, i_line: int, linebox: ShapedLineBox):
+        """Puts the line in the cache."""
+        with self.__lock:
+            self.__cache[i_line] = linebox
+            self.__cache.move_to_end(i_line)
+
+            while len(self.__cache) > self.__max_cache_size:
+                self.__cache.popitem(last=False)
+
+
+class _StoredLineContents(Sequence):
+    """Contents of _StoredLines, to be matched by DiagonalRunAligner."""
+
+    def __init__(self, lines: _StoredLines):
+        self.__lines = lines
+
+    def __len__(self):
+        return len(self.__lines)
+
+    def __getitem__(self, i_line: int) -> str:
+        return self.__lines[i_line].content
+
+
+class _StoredPages(Sequence):
+    """Pages (lists of lines) of a stored document index, read from DocumentIndexStore on demand."""
+
+    def __init__(self, store: DocumentIndexStore, asset_id: str, n_pages: int):
+        self.__store = store
+        self.__asset_id = asset_id
+        self.__n_pages = n_pages
+
+    def __len__(self):
+        return self.__n_pages
+
+    def __getitem__(self, i_page: int) -> list[ShapedLineBox]:
+        if not 0 <= i_page < self.__n_pages:
+            raise IndexError(i_page)
+
+        return self.__store.get_page_lines(self.__asset_id, i_page)
+
+
+class StoredDocumentIndex(DocumentIndex):
+    """
+    DocumentIndex whose lines are kept in DocumentIndexStore.
+
+    Instead of loading all lines, candidate lines and pages are retrieved by the full-text search
+    of the store, and they are verified by the same scoring as DocumentIndex.
+    """
+
+    def __init__(
+        self,
+        store: DocumentIndexStore,
+        asset_id: str,
+        metadata: DocumentMetadata,
+        first_line_id: int,
+        n_lines: int,
+        n_candidate_lines=32,
+    ):
+        self.metadata = metadata
+        self.index_data = _StoredPages(store, asset_id, metadata.n_pages)
+        self.concat_index_data = _StoredLines(store, asset_id, n_lines)
+
+        self.__store = store
+        self.__first_line_id = first_line_id
+        self.__n_candidate_lines = n_candidate_lines
+        self.__line_aligners: dict[tuple, DiagonalRunAligner] = {}
+
+    def get_page_signature_index(self):
+        # Page signatures would read every line from the store, so all pages are searched.
+        return None
+
+    def __search_candidate_lines(
+        self, content: str, th_valid_str_length: int, th_valid_strlen_rate_min: float
+    ):
+        # Same length range as DiagonalRunAligner looks up candidates by.
+        min_length = max(
+            th_valid_str_length, int(len(content) * th_valid_strlen_rate_min) - 1
+        )
+        max_length = (
+            int(len(content) / th_valid_strlen_rate_min) + 1
+            if th_valid_strlen_rate_min > 0
+            else len(content) * 1000
+        )
+
+        candidates = self.__store.search_candidate_lines(
+            self.__first_line_id,
+            len(self.concat_index_data),
+            content,
+            min_length,
+            max_length,
+            self.__n_candidate_lines,
+        )
+
+        # Candidate lines are likely to be scored soon.
+        for i_line, _, linebox in candidates:
+            self.concat_index_data.put(i_line, linebox)
+
+        return candidates
+
+    def get_line_aligner(
+        self,
+        th_valid_similarity_ngram=0.75,
+        th_valid_similarity_sqmatch=0.7,
+        th_valid_str_length=10,
+        th_valid_strlen_rate_min=0.8,
+    ) -> DiagonalRunAligner:
+        """Returns the DiagonalRunAligner whose candidate lines are retrieved from the store."""
+        thresholds = (
+            th_valid_similarity_ngram,
+            th_valid_similarity_sqmatch,
+            th_valid_str_length,
+            th_valid_strlen_rate_min,
+        )
+
+        def get_candidates(video_frame_content: str):
+            return [
+                i_line
+                for i_line, _, _ in self.__search_candidate_lines(
+                    video_frame_content, th_valid_str_length, th_valid_strlen_rate_min
+                )
+            ]
+
+        if thresholds not in self.__line_aligners:
+            self.__line_aligners[thresholds] = DiagonalRunAligner(
+                _StoredLineContents(self.concat_index_data),
+                *thresholds,
+                candidates_getter=get_candidates,
+            )
+
+        return self.__line_aligners[thresholds]
+
+    def search_most_matching_page(
+        self,
+        ocr_result_video_frame: OCRResult,
+        th_valid_similarity_ngram=0.75,
+        th_valid_similarity_sqmatch=0.7,
+        th_valid_str_length=10,
+        th_valid_strlen_rate_min=0.8,
+        candidate_page_ids: list[int] | None = None,
+        deadline: Deadline | None = None,
+    ) -> FoundRelatedPage | None:
+        """
+        Same as DocumentIndex.search_most_matching_page(), but only the pages which have
+        candidate lines are read from the store and searched, if candidate_page_ids is not given.
+        """
+        if candidate_page_ids is None:
+            candidate_page_ids = set()
+
+            for linebox in ocr_result_video_frame.data:
+                if len(linebox.content) < th_valid_str_length:
+                    continue
+
+                for _, i_page, _ in self.__search_candidate_lines(
+                    linebox.content, th_valid_str_length, th_valid_strlen_rate_min
+                ):
+                    candidate_page_ids.add(i_page)
+
+            candidate_page_ids = sorted(candidate_page_ids)
+
+        return super().search_most_matching_page(
+            ocr_result_video_frame,
+            th_valid_similarity_ngram=th_valid_similarity_ngram,
+            th_valid_similarity_sqmatch=th_valid_similarity_sqmatch,
+            th_valid_str_length=th_valid_str_length,
+            th_valid_strlen_rate_min=th_valid_strlen_rate_min,
+            candidate_page_ids=candidate_page_ids,
+            deadline=deadline,
+        )
@@ -1,16 +1,23 @@
 import os
 import json
+import asyncio
 from pathlib import Path
 from typing import Callable, Any
 
-from pdf import PDFLoader, PDFLoaderResult
-from ocr import TesseractOCR, ShapedLineBox
+from pdf import PDFLoader
+from page_render_cache import get_shared_page_render_cache
+from ocr import ShapedLineBox, get_shared_tesseract_ocr
 from document_index import DocumentIndex, DocumentMetadata, DocumentType, PageMetadata
+from document_index_pool import DocumentIndexPool
 
 # from util import paths
 from util.image import binarize_pilimg
 from util.config import Config
 from util.asset import Asset
+from util.profiling import Profiler
+from util.log import get_logger
+
+logger = get_logger("DocumentPDF")
 
 
 class DocumentPDF:
@@ -25,18 +32,30 @@ class DocumentPDF:
         assert os.path.exists(poppler_exe_path)
 
         self.__path_pdf_src = pdf_src_path
-        self.__loader = PDFLoader(poppler_exe_path)
+        config = Config.get_instance()
+        self.__loader = PDFLoader(
+            poppler_exe_path,
+            page_render_cache=(
+                get_shared_page_render_cache(
+                    Asset.get_dirpath_page_render_cache(),
+                    config.page_render_cache_max_size_mb << 20,
+                )
+                if config.page_render_cache_enabled
+                else None
+            ),
+            dpi=config.page_render_dpi,
+            color_mode=config.page_render_color_mode,
+            n_pages_per_range=config.page_render_n_pages_per_range,
+        )
 
         assert asset_id is not None and asset_id != ""
         self.__asset_id = asset_id
 
-    def detect_document_type(self, pdf_loader_result: PDFLoaderResult) -> DocumentType:
+    def detect_document_type(self, page_metadata: PageMetadata) -> DocumentType:
         """
         Detects PDF document type simply depends on the aspect ratio of the first page.
         If width is larger than height, it is a slide. Else, it is a document.
         """
-        page_metadata: PageMetadata = pdf_loader_result.metadata_pages[0]
-
         return (
             DocumentType.SLIDE
             if page_metadata.width >= page_metadata.height
@@ -45,93 +64,148 @@ class DocumentPDF:
 
     async def generate_document_index_data(
         self,
-        websocketInstance: Any,
+        websocketInstance: Any | None,
         path_output_dir: str | Path,
         path_tesseract_ocr_bin: str | Path,
         page_start=None,
         page_end=None,
         save_file=True,
         progress_callback_async: Callable[[float], None] | None = None,
+        force_profiling=False,
     ):
-        await websocketInstance.send("progress=0%")
-        pdf_src_basename = self.__asset_id
-
-        print("\nConverting pdf into image")
-        pdf2img_result = self.__loader.convert_pdf_to_img(
-            self.__path_pdf_src,
-            i_start=page_start,
-            i_end=page_end,
-            enable_concat=False,  # Concatting can cause memory error if the picture is very large (which kills the process)
-            concat_margin_y_px=0,
-        )
-
-        # You shold use .jpg extension for the output file, because .png has a pixel limit.
-        if pdf2img_result.image_concat is not None:
-            pdf2img_result.image_concat.save(
-                os.path.join(path_output_dir, f"{pdf_src_basename}.concat.png")
-            )
-
-        ocr_result_pages: list[list[ShapedLineBox]] = []
-        n_pages = pdf2img_result.n_pages
-
-        ocr_tool = TesseractOCR(path_tesseract_ocr_bin)
+        """
+        Generates the document index in a worker thread, so that the event loop keeps
+        serving other coroutines, and cProfile records only the indexing job when it is profiled.
+        """
+        loop = asyncio.get_running_loop()
 
-        for i in range(n_pages):
-            await websocketInstance.send(f"progress={int(100 * i / (n_pages - 1))}%")
-            print(f"\nProcessing OCR to image No.{i} / {n_pages - 1}")
+        async def send_progress_async(i: int, n_pages: int):
+            if websocketInstance is not None:
+                await websocketInstance.send(
+                    f"progress={int(100 * i / max(1, n_pages - 1))}%"
+                )
 
             if progress_callback_async is not None:
-                await progress_callback_async(i / n_pages - 1)
-
-            img_page = pdf2img_result.image_pages[i]
-            page_metadata: PageMetadata = pdf2img_result.metadata_pages[i]
-
-            img_gray = binarize_pilimg(img_page)
+                await progress_callback_async(i / n_pages)
+
+        def on_page(i: int, n_pages: int):
+            # Progress is sent on the event loop, and the next page waits until it is sent.
+            asyncio.run_coroutine_threadsafe(
+                send_progress_async(i, n_pages), loop
+            ).result()
+
+        if websocketInstance is not None:
+            await websocketInstance.send("progress=0%")
+
+        return await asyncio.to_thread(
+            self.__generate_document_index_data,
+            path_output_dir,
+            path_tesseract_ocr_bin,
+            page_start,
+            page_end,
+            save_file,
+            on_page,
+            force_profiling,
+        )
 
-            ocr_linebox_object_result = ocr_tool.extract(
-                img_gray,
-                "eng",
-                default_offset_left=0,
-                default_offset_top=page_metadata.offset_top,
+    def __generate_document_index_data(
+        self,
+        path_output_dir: str | Path,
+        path_tesseract_ocr_bin: str | Path,
+        page_start: int | None,
+        page_end: int | None,
+        save_file: bool,
+        on_page: Callable[[int, int], None],
+        force_profiling: bool,
+    ) -> DocumentIndex:
+        with Profiler.get_instance().profile(
+            "document_index", self.__asset_id, force=force_profiling
+        ):
+            pdf_src_basename = self.__asset_id
+
+            logger.info("Converting pdf into image", asset_id=self.__asset_id)
+            n_pages = len(
+                self.__loader.get_page_numbers(
+                    self.__path_pdf_src, page_start, page_end
+                )
             )
 
-            ocr_result_pages.append(ocr_linebox_object_result.data)
-
-        doc_type = self.detect_document_type(pdf2img_result)
+            if n_pages == 0:
+                raise ValueError(
+                    f"No pages to index from page {page_start} to page {page_end} of {self.__asset_id}."
+                )
+
+            ocr_result_pages: list[list[ShapedLineBox]] = []
+            metadata_pages: list[PageMetadata] = []
+
+            ocr_tool = get_shared_tesseract_ocr(path_tesseract_ocr_bin)
+
+            # Pages are rendered by ranges, and each page is OCRed and written as tiles
+            # of an image pyramid as it is rendered, so that only a range of pages is in memory.
+            for i, (img_page, page_metadata) in enumerate(
+                self.__loader.iter_pages(
+                    self.__path_pdf_src,
+                    i_start=page_start,
+                    i_end=page_end,
+                    path_pyramid=(
+                        Asset.get_path_pdf_pyramid(self.__asset_id)
+                        if save_file and Config.get_instance().page_pyramid_enabled
+                        else None
+                    ),
+                    concat_margin_y_px=0,
+                )
+            ):
+                on_page(i, n_pages)
+                logger.debug("Processing OCR of page", i_page=i, n_pages=n_pages)
+
+                img_gray = binarize_pilimg(img_page)
+
+                ocr_linebox_object_result = ocr_tool.extract(
+                    img_gray,
+                    "eng",
+                    default_offset_left=0,
+                    default_offset_top=page_metadata.offset_top,
+                )
+
+                ocr_result_pages.append(ocr_linebox_object_result.data)
+                metadata_pages.append(page_metadata)
+
+            doc_type = self.detect_document_type(metadata_pages[0])
+
+            document_index_data = DocumentIndex(
+                index_data=ocr_result_pages,
+                metadata=DocumentMetadata(
+                    metadata_pages=metadata_pages,
+                    width=metadata_pages[0].width,
+                    # Pages are laid out without margins.
+                    height=metadata_pages[-1].offset_top + metadata_pages[-1].height,
+                    n_pages=len(metadata_pages),
+                    asset_id=self.__asset_id,
+                    doc_type=doc_type,
+                ),
+            )
 
-        document_index_data = DocumentIndex(
-            index_data=ocr_result_pages,
-            metadata=DocumentMetadata(
-                metadata_pages=pdf2img_result.metadata_pages,
-                width=pdf2img_result.width,
-                height=pdf2img_result.height,
-                n_pages=pdf2img_result.n_pages,
-                asset_id=self.__asset_id,
-                doc_type=doc_type,
-            ),
-        )
+            if save_file:
+                os.makedirs(path_output_dir, exist_ok=True)
+                write_file_path = os.path.join(
+                    path_output_dir, f"{pdf_src_basename}.index.json"
+                )
+                # Write to a temporary file and rename it, so that services reading
+                # the index (even in the same process) never see a partially written file.
+                path_tmp = f"{write_file_path}.tmp"
+                with open(path_tmp, "w", encoding="utf-8") as fp:
+                    json.dump(document_index_data.to_json_serializable(), fp)
+                os.replace(path_tmp, write_file_path)
+                logger.info("Index data saved", path=write_file_path)
 
-        if save_file:
-            os.makedirs(path_output_dir, exist_ok=True)
-            write_file_path = os.path.join(
-                path_output_dir, f"{pdf_src_basename}.index.json"
-            )
-            with open(write_file_path, "w", encoding="utf-8") as fp:
-                json.dump(document_index_data.to_json_serializable(), fp)
-                print(f"Index data saved as {write_file_path}")
+                DocumentIndexPool.get_instance().invalidate(self.__asset_id)
 
-        return document_index_data
+            return document_index_data
 
 
 if __name__ == "__main__":
-    targets = []
-
-    for asset_id in targets:
-        print(f"Current Attempt: {asset_id}")
-        DocumentPDF(
-            asset_id,
-            Config.get_instance().path_poppler_exe,
-        ).generate_document_index_data(
-            path_output_dir=Asset.get_dirpath_document_index(),
-            path_tesseract_ocr_bin=Config.get_instance().path_tesseract_ocr_exe,
-        )
+    import sys
+    import batch_indexer
+
+    # Indexing PDFs from the command line is done by batch_indexer.py (e.g. `python document_pdf.py ASSET_ID`).
+    sys.exit(batch_indexer.main(sys.argv[1:]))
@@ -0,0 +1,185 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from collections.abc import Callable, Iterable, Sequence
+
+from util import text
+from util.deadline import Deadline
+
+
+@dataclass
+class LineAlignment:
+    """
+    Represents a run of consecutive matched lines between video frame and document index.
+
+    The run starts at (i_line_video_frame, i_line_index_data) and has n_series lines.
+    The scores are the ones of the last matched pair of the run.
+    partial is True if the search was stopped by its deadline, and the run is the longest one found until then.
+    """
+
+    i_line_video_frame: int
+    i_line_index_data: int
+    n_series: int
+    ngram_score: float
+    sq_match_score: float
+    partial: bool = False
+
+
+class DiagonalRunAligner:
+    """
+    Finds "n consecutive lines match" between video frame lines and document index lines.
+
+    Every (video frame line, index line) pair is scored at most once, and the scores are kept
+    in a sparse similarity matrix. A match of n consecutive lines is a run of length n along
+    a diagonal of that matrix, so the results of the n-th attempt are reused by the (n-1)-th.
+
+    Candidate index lines for a video frame line are looked up by content length first,
+    because pairs whose length rate is out of range can never match.
+    """
+
+    def __init__(
+        self,
+        index_contents: Sequence[str],
+        th_valid_similarity_ngram=0.75,
+        th_valid_similarity_sqmatch=0.7,
+        th_valid_str_length=10,
+        th_valid_strlen_rate_min=0.8,
+        candidates_getter: Callable[[str], Iterable[int]] | None = None,
+    ):
+        self.__index_contents = index_contents
+        self.__th_valid_similarity_ngram = th_valid_similarity_ngram
+        self.__th_valid_similarity_sqmatch = th_valid_similarity_sqmatch
+        self.__th_valid_str_length = th_valid_str_length
+        self.__th_valid_strlen_rate_min = th_valid_strlen_rate_min
+
+        if candidates_getter is not None:
+            self.__get_candidates = candidates_getter
+        else:
+            # Index lines which are long enough to be matched, sorted by their length.
+            self.__sorted_lengths: list[int] = []
+            self.__sorted_line_ids: list[int] = []
+
+            for length, i_line in sorted(
+                (len(content), i)
+                for i, content in enumerate(index_contents)
+                if len(content) >= th_valid_str_length
+            ):
+                self.__sorted_lengths.append(length)
+                self.__sorted_line_ids.append(i_line)
+
+            self.__get_candidates = self.__get_candidates_by_length
+
+    def __get_candidates_by_length(self, video_frame_content: str):
+        # Slightly wider range than the exact length rate condition,
+        # which is checked again when the pair is scored.
+        len_vf = len(video_frame_content)
+        r = self.__th_valid_strlen_rate_min
+
+        i_from = bisect_left(self.__sorted_lengths, int(len_vf * r) - 1)
+        i_to = (
+            bisect_right(self.__sorted_lengths, int(len_vf / r) + 1)
+            if r > 0
+            else len(self.__sorted_lengths)
+        )
+
+        return self.__sorted_line_ids[i_from:i_to]
+
+    def search(
+        self,
+        video_frame_contents: Sequence[str],
+        max_n_series=3,
+        i_index_start=0,
+        i_index_end: int | None = None,
+        deadline: Deadline | None = None,
+    ) -> LineAlignment | None:
+        """
+        Searches for the first run of consecutive matched lines,
+        in the same attempt order as DocumentIndex.search_most_matching_line_exhaustive():
+        n = [max_n_series, ..., 1], then video frame lines, then index lines from the top.
+
+        The run must start at an index line in [i_index_start, i_index_end),
+        which allows to search a part (shard) of the document index.
+
+        If the deadline passes, the longest run found so far is returned as a partial result.
+        """
+        n_lines_vf = len(video_frame_contents)
+        n_lines_index = len(self.__index_contents)
+        n_series = min(n_lines_vf, max_n_series)
+
+        if i_index_end is None:
+            i_index_end = n_lines_index
+
+        # Sparse similarity matrix: (i_line_video_frame, i_line_index) -> scores or None
+        scores: dict[tuple[int, int], tuple[float, float] | None] = {}
+
+        # Candidate index lines of each video frame line, in ascending order
+        candidates_of_row: dict[int, list[int]] = {}
+
+        def get_scores(a: int, b: int):
+            key = (a, b)
+            if key not in scores:
+                scores[key] = text.calc_line_match_scores(
+                    self.__index_contents[b],
+                    video_frame_contents[a],
+                    self.__th_valid_similarity_ngram,
+                    self.__th_valid_similarity_sqmatch,
+                    self.__th_valid_str_length,
+                    self.__th_valid_strlen_rate_min,
+                )
+            return scores[key]
+
+        def get_candidates_of_row(a: int):
+            if a not in candidates_of_row:
+                candidates_of_row[a] = sorted(
+                    self.__get_candidates(video_frame_contents[a])
+                )
+            return candidates_of_row[a]
+
+        # Longest run found so far, shorter than the attempted n: (n_series, a, b, scores)
+        best_run: tuple[int, int, int, tuple[float, float]] | None = None
+
+        for n in reversed(range(1, n_series + 1)):  # Attempt order : [n, n-1, ..., 1]
+            # The last line of the window must exist in the document index.
+            i_index_end_of_n = min(i_index_end, n_lines_index - n)
+
+            for a in range(n_lines_vf - n):
+                candidates = get_candidates_of_row(a)
+
+                for b in candidates[bisect_left(candidates, i_index_start) :]:
+                    if b >= i_index_end_of_n:
+                        break
+
+                    if deadline is not None and deadline.is_expired():
+                        if best_run is None:
+                            return None
+
+                        n_run, a_run, b_run, scores_run = best_run
+                        return LineAlignment(
+                            i_line_video_frame=a_run,
+                            i_line_index_data=b_run,
+                            n_series=n_run,
+                            ngram_score=scores_run[0],
+                            sq_match_score=scores_run[1],
+                            partial=True,
+                        )
+
+                    # Follow the diagonal from (a, b) while the pairs are matched.
+                    run_scores = None
+                    for j in range(n):
+                        prev_run_scores = run_scores
+                        run_scores = get_scores(a + j, b + j)
+                        if run_scores is None:
+                            # (a, b) starts a run of j lines, which a later attempt (n = j) can find.
+                            if j > 0 and (best_run is None or j > best_run[0]):
+                                best_run = (j, a, b, prev_run_scores)
+                            break
+
+                    if run_scores is not None:
+                        return LineAlignment(
+                            i_line_video_frame=a,
+                            i_line_index_data=b,
+                            n_series=n,
+                            ngram_score=run_scores[0],
+                            sq_match_score=run_scores[1],
+                        )
+
+        return None
@@ -0,0 +1,265 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from util.asset import Asset
+from util.interval_index import Interval, IntervalIndex
+from util.log import get_logger
+
+logger = get_logger("MatchHistoryStore")
+
+
+@dataclass
+class MatchHistoryEntry:
+    """
+    Value of an interval in MatchHistory.
+
+    match_key: key of the matched content (see SequenceAnalyzerResult.get_match_key())
+    n_observations: number of frames observed in the interval
+    result: SequenceAnalyzerResult of the last observed frame (JSON serializable)
+    """
+
+    match_key: str
+    n_observations: int
+    result: dict
+
+
+class MatchHistory:
+    """
+    Match results of a video and an asset along the playback time.
+
+    Consecutive frames with the same matched content are merged into a time interval,
+    if they are observed within max_gap_sec. An interval observed by 2 or more frames
+    is "stable", and frames whose playback time is in it can be answered without OCR.
+
+    index_version is the version of the document index (DocumentIndexPool.get_version())
+    which the results are matched against.
+    """
+
+    def __init__(
+        self,
+        max_gap_sec: float,
+        intervals: list[Interval] | None = None,
+        index_version: str | None = None,
+    ):
+        self.index_version = index_version
+        self.__max_gap_sec = max_gap_sec
+        self.__intervals = IntervalIndex(intervals)
+
+    def find_stable_result(self, t: float) -> dict | None:
+        """Returns the result at playback time t if t is in a stable interval."""
+        interval = self.__intervals.find(t)
+
+        if interval is None or interval.value.n_observations < 2:
+            return None
+
+        return interval.value.result
+
+    def record(self, t: float, match_key: str, result: dict):
+        """Records a match result of the frame at playback time t."""
+        interval = self.__intervals.find(t)
+
+        if interval is not None:
+            # Already observed. Conflicting results are not merged.
+            if interval.value.match_key == match_key:
+                interval.value.n_observations += 1
+                interval.value.result = result
+            return
+
+        prev_interval = self.__intervals.find_prev(t)
+        next_interval = self.__intervals.find_next(t)
+
+        if (
+            prev_interval is not None
+            and prev_interval.value.match_key == match_key
+            and t - prev_interval.end <= self.__max_gap_sec
+        ):
+            interval = prev_interval
+            interval.end = t
+            interval.value.n_observations += 1
+            interval.value.result = result
+        else:
+            interval = Interval(
+                start=t,
+                end=t,
+                value=MatchHistoryEntry(
+                    match_key=match_key, n_observations=1, result=result
+                ),
+            )
+            self.__intervals.add(interval)
+
+        if (
+            next_interval is not None
+            and next_interval.value.match_key == match_key
+            and next_interval.start - interval.end <= self.__max_gap_sec
+        ):
+            self.__intervals.remove(next_interval)
+            interval.end = next_interval.end
+            interval.value.n_observations += next_interval.value.n_observations
+
+    def to_json_serializable(self):
+        return {
+            "index_version": self.index_version,
+            "intervals": [
+                {
+                    "start": interval.start,
+                    "end": interval.end,
+                    "match_key": interval.value.match_key,
+                    "n_observations": interval.value.n_observations,
+                    "result": interval.value.result,
+                }
+                for interval in self.__intervals
+            ],
+        }
+
+    @staticmethod
+    def from_json_serializable(data: dict, max_gap_sec: float):
+        """A factory method to create from the output of to_json_serializable()."""
+        return MatchHistory(
+            max_gap_sec,
+            [
+                Interval(
+                    start=item["start"],
+                    end=item["end"],
+                    value=MatchHistoryEntry(
+                        match_key=item["match_key"],
+                        n_observations=item["n_observations"],
+                        result=item["result"],
+                    ),
+                )
+                for item in data["intervals"]
+            ],
+            index_version=data["index_version"],
+        )
+
+
+class MatchHistoryStore:
+    """
+    MatchHistory of each (video_id, asset_id), persisted as JSON files
+    so that histories survive restarts of the service.
+
+    A history of another version of the document index (e.g. the PDF has been indexed again)
+    is discarded. Recorded histories are saved every save_interval_sec by a background thread,
+    not by the requests, and at most max_histories of them are kept in memory.
+    """
+
+    def __init__(self, max_gap_sec=5.0, save_interval_sec=5.0, max_histories=256):
+        self.__max_gap_sec = max_gap_sec
+        self.__save_interval_sec = save_interval_sec
+        self.__max_histories = max_histories
+
+        self.__lock = threading.Lock()
+        # Histories in least recently used order
+        self.__histories: OrderedDict[tuple[str, str], MatchHistory] = OrderedDict()
+        # Histories recorded since they were saved (including the evicted ones)
+        self.__unsaved: dict[tuple[str, str], MatchHistory] = {}
+
+        # Saves by the background thread and save_all() are not interleaved.
+        self.__save_lock = threading.Lock()
+        self.__stop_event = threading.Event()
+        self.__saver_thread = threading.Thread(
+            target=self.__run_saver, name="MatchHistorySaver", daemon=True
+        )
+        self.__saver_thread.start()
+
+    def __get_history(
+        self, video_id: str, asset_id: str, index_version: str
+    ) -> MatchHistory:
+        key = (video_id, asset_id)
+        history = self.__histories.get(key)
+
+        if history is None:
+            history = self.__unsaved.get(key) or self.__load(video_id, asset_id)
+            self.__histories[key] = history
+
+            while len(self.__histories) > self.__max_histories:
+                self.__histories.popitem(last=False)
+
+        self.__histories.move_to_end(key)
+
+        # Recorded results can point to other pages or lines of the document.
+        if history.index_version != index_version:
+            history = MatchHistory(self.__max_gap_sec, index_version=index_version)
+            self.__histories[key] = history
+
+        return history
+
+    def __load(self, video_id: str, asset_id: str) -> MatchHistory:
+        path_history = Asset.get_path_match_history(video_id, asset_id)
+
+        if os.path.exists(path_history):
+            try:
+                with open(path_history, "r", encoding="utf-8") as fp:
+                    return MatchHistory.from_json_serializable(
+                        json.load(fp), self.__max_gap_sec
+                    )
+            except (OSError, ValueError, KeyError, TypeError) as err:
+                logger.warning(
+                    "Failed to load the history, starting a new history",
+                    path=path_history,
+                    error=err,
+                )
+
+        return MatchHistory(self.__max_gap_sec)
+
+    def find_stable_result(
+        self, video_id: str, asset_id: str, index_version: str, t: float
+    ) -> dict | None:
+        """Returns the recorded result at playback time t if it is in a stable interval."""
+        with self.__lock:
+            return self.__get_history(
+                video_id, asset_id, index_version
+            ).find_stable_result(t)
+
+    def record(
+        self,
+        video_id: str,
+        asset_id: str,
+        index_version: str,
+        t: float,
+        match_key: str,
+        result: dict,
+    ):
+        """Records a match result, which is saved by the background thread."""
+        with self.__lock:
+            history = self.__get_history(video_id, asset_id, index_version)
+            history.record(t, match_key, result)
+            self.__unsaved[(video_id, asset_id)] = history
+
+    def save_all(self):
+        """Stops the background thread, and saves the histories recorded since they were saved."""
+        self.__stop_event.set()
+        self.__saver_thread.join()
+        self.__save_unsaved()
+
+    def __run_saver(self):
+        while not self.__stop_event.wait(self.__save_interval_sec):
+            try:
+                self.__save_unsaved()
+            except OSError as err:
+                logger.warning("Failed to save histories", error=err)
+
+    def __save_unsaved(self):
+        with self.__save_lock:
+            with self.__lock:
+                # Serialized under the lock, as the histories are recorded by requests.
+                data = {
+                    key: history.to_json_serializable()
+                    for key, history in self.__unsaved.items()
+                }
+                self.__unsaved = {}
+
+            for (video_id, asset_id), history_data in data.items():
+                self.__save(video_id, asset_id, history_data)
+
+    def __save(self, video_id: str, asset_id: str, history_data: dict):
+        path_history = Asset.get_path_match_history(video_id, asset_id)
+        os.makedirs(os.path.dirname(path_history), exist_ok=True)
+
+        # Write to a temporary file and rename it, not to leave a broken file on crash.
+        path_tmp = f"{path_history}.tmp"
+        with open(path_tmp, "w", encoding="utf-8") as fp:
+            json.dump(history_data, fp)
+        os.replace(path_tmp, path_history)
@@ -0,0 +1,77 @@
+from typing import TYPE_CHECKING
+
+from document_index import DocumentIndex
+from ocr import OCRResult
+
+if TYPE_CHECKING:
+    from page_signature import PageSignatureIndex
+
+
+class MultiDocumentIndex:
+    """
+    Document indexes of several assets, whose pages share one PageSignatureIndex.
+
+    Documents likely to match a video frame are found by a single lookup of the page signatures,
+    so that only those documents are searched, however many documents are given.
+    """
+
+    def __init__(self, document_indexes: dict[str, DocumentIndex]):
+        # numpy is imported when a multi-document index is built, not on startup.
+        from page_signature import PageSignatureIndex
+
+        self.document_indexes = dict(document_indexes)
+
+        # Pages of all documents in order: (asset_id, i_page)
+        self.__pages: list[tuple[str, int]] = []
+        page_texts: list[str] = []
+
+        for asset_id, document_index in document_indexes.items():
+            for i_page, lineboxes_of_page in enumerate(document_index.index_data):
+                self.__pages.append((asset_id, i_page))
+                page_texts.append(
+                    "\n".join(linebox.content for linebox in lineboxes_of_page)
+                )
+
+        self.__page_signature_index: PageSignatureIndex = PageSignatureIndex(page_texts)
+
+    def is_built_from(self, document_indexes: dict[str, DocumentIndex]) -> bool:
+        """Returns True if the index is built from the same loaded document indexes."""
+        return self.document_indexes.keys() == document_indexes.keys() and all(
+            self.document_indexes[asset_id] is document_index
+            for asset_id, document_index in document_indexes.items()
+        )
+
+    def get_candidate_documents(
+        self,
+        ocr_result_video_frame: OCRResult,
+        n_documents: int,
+        n_pages_per_document=8,
+    ) -> list[tuple[str, list[int] | None]]:
+        """
+        Returns up to n_documents (asset_id, candidate page ids) likely to match the video frame,
+        most similar first, found by the pages most similar to the video frame.
+        If no page is similar to the video frame, all documents are returned
+        with None as the candidate page ids (= all pages are searched).
+        """
+        candidate_pages = self.__page_signature_index.get_candidate_pages(
+            "\n".join(linebox.content for linebox in ocr_result_video_frame.data),
+            n_documents * n_pages_per_document,
+        )
+
+        if len(candidate_pages) == 0:
+            return [(asset_id, None) for asset_id in self.document_indexes]
+
+        candidate_documents: dict[str, list[int]] = {}
+
+        for page_id in candidate_pages:
+            asset_id, i_page = self.__pages[page_id]
+
+            if asset_id not in candidate_documents:
+                if len(candidate_documents) >= n_documents:
+                    continue
+
+                candidate_documents[asset_id] = []
+
+            candidate_documents[asset_id].append(i_page)
+
+        return list(candidate_documents.items())
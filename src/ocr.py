@@ -1,11 +1,17 @@
-from typing import Literal
+import os
+import tempfile
+import threading
+import subprocess
+from typing import Literal, TYPE_CHECKING
 from dataclasses import dataclass
 from collections.abc import Iterable
 
-import pyocr
-import pyocr.builders
+# pyocr is imported when TesseractOCR is created, not to slow down the startup of services.
+if TYPE_CHECKING:
+    import pyocr.builders
 
 from util.text import remove_non_ascii, remove_cp932
+from util.deadline import DeadlineExceeded
 from util.base_class import JSONSerializableData
 
 
@@ -78,6 +84,14 @@ class ShapedLineBox(JSONSerializableData):
             "position": self.position.bbox,
         }
 
+    @staticmethod
+    def from_json_serializable(data: dict):
+        """A factory method to create from the output of to_json_serializable()."""
+        return ShapedLineBox(
+            content=data["content"],
+            position=LinePositionWithPageOffset(data["position"]),
+        )
+
 
 # Reference:
 # https://gitlab.gnome.org/World/OpenPaperwork/pyocr
@@ -100,19 +114,27 @@ class OCRResult:
 
     def __init__(
         self,
-        linebox_object_list: list[pyocr.builders.LineBox],
+        linebox_object_list: "list[pyocr.builders.LineBox]",
         default_offset_top=0,
         default_offset_left=0,
+        scale=1.0,
+        crop_top=0,
     ):
         self.data = self.__parse_pyocr_linebox_object(
-            linebox_object_list, default_offset_top, default_offset_left
+            linebox_object_list,
+            default_offset_top,
+            default_offset_left,
+            scale,
+            crop_top,
         )
 
     def __parse_pyocr_linebox_object(
         self,
-        linebox_object_list: Iterable[pyocr.builders.LineBox],
+        linebox_object_list: "Iterable[pyocr.builders.LineBox]",
         default_offset_top=0,
         default_offset_left=0,
+        scale=1.0,
+        crop_top=0,
         valid_str_length_min=10,
     ):
         result: list[ShapedLineBox] = []
@@ -141,11 +163,13 @@ class OCRResult:
             if len(content) < valid_str_length_min:
                 continue
 
+            # Positions in the image scaled for OCR (and cropped from crop_top)
+            # are converted to the ones in the original image.
             position = LinePositionWithPageOffset.from_positions(
-                left=linebox_object.position[0][0],
-                top=linebox_object.position[0][1],
-                right=linebox_object.position[1][0],
-                bottom=linebox_object.position[1][1],
+                left=round(linebox_object.position[0][0] / scale),
+                top=round((linebox_object.position[0][1] + crop_top) / scale),
+                right=round(linebox_object.position[1][0] / scale),
+                bottom=round((linebox_object.position[1][1] + crop_top) / scale),
                 page_offset_left=default_offset_left,
                 page_offset_top=default_offset_top,
             )
@@ -168,6 +192,9 @@ class TesseractOCR:
         self,
         tesseract_path: str,
     ):
+        import pyocr
+        import pyocr.builders
+
         pyocr.pyocr.tesseract.TESSERACT_CMD = tesseract_path
         tools = pyocr.get_available_tools()
 
@@ -179,6 +206,11 @@ class TesseractOCR:
         self.__tool = tools[0]
         self.__builder = pyocr.builders.LineBoxBuilder()
 
+        # Tesseract can be killed at a timeout only if it is run as a command.
+        self.__tesseract_cmd = (
+            tesseract_path if self.__tool is pyocr.tesseract else None
+        )
+
     # def write_extracted_result_as_hOCR_fmt(self, filepath, result):
     #     with open(filepath, "w", encoding="utf-8") as f:
     #         self.builder.write_file(f, result)
@@ -191,8 +223,16 @@ class TesseractOCR:
         language: Literal["jpn", "eng"],
         default_offset_top=0,
         default_offset_left=0,
+        scale=1.0,
+        timeout_sec: float | None = None,
+        crop_top=0,
     ) -> OCRResult:
-        """Perform OCR on given image."""
+        """
+        Perform OCR on given image.
+        If the image has been resized by scale for OCR, positions are returned in the original size.
+        If the image is a part of the resized image from crop_top (e.g. a band), positions are returned in the whole image.
+        If timeout_sec is given, Tesseract is killed at the timeout and DeadlineExceeded is raised.
+        """
         # -------------------------------
         # objects from pyocr builders:
         #
@@ -208,10 +248,84 @@ class TesseractOCR:
         #   position: [[pt1_x, pt1_y], [pt2_x, pt2_y]] (pt1: left-top, pt2: right-bottom)
         # }[]
         # -------------------------------
-        linebox_object_list: list[pyocr.builders.LineBox] = self.__tool.image_to_string(
-            pil_image,
-            lang=language,
-            builder=self.__builder,
+        if timeout_sec is not None and self.__tesseract_cmd is not None:
+            linebox_object_list = self.__run_tesseract_with_timeout(
+                pil_image, language, timeout_sec
+            )
+        else:
+            linebox_object_list: list[pyocr.builders.LineBox] = (
+                self.__tool.image_to_string(
+                    pil_image,
+                    lang=language,
+                    builder=self.__builder,
+                )
+            )
+
+        return OCRResult(
+            linebox_object_list,
+            default_offset_top,
+            default_offset_left,
+            scale,
+            crop_top,
         )
 
-        return OCRResult(linebox_object_list, default_offset_top, default_offset_left)
+    def __run_tesseract_with_timeout(
+        self, pil_image, language: str, timeout_sec: float
+    ) -> "list[pyocr.builders.LineBox]":
+        """Same as pyocr.tesseract.image_to_string(), but Tesseract is killed at the timeout."""
+        import pyocr.tesseract
+
+        if timeout_sec <= 0:
+            raise DeadlineExceeded("No time left for OCR.")
+
+        with tempfile.TemporaryDirectory() as dirpath:
+            pil_image.convert("RGB").save(os.path.join(dirpath, "input.bmp"))
+
+            try:
+                proc = subprocess.run(
+                    [
+                        self.__tesseract_cmd,
+                        "input.bmp",
+                        "output",
+                        "-l",
+                        language,
+                        *self.__builder.tesseract_flags,
+                        *self.__builder.tesseract_configs,
+                    ],
+                    cwd=dirpath,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    timeout=timeout_sec,
+                )
+            except subprocess.TimeoutExpired as err:
+                raise DeadlineExceeded(
+                    f"OCR did not finish in {timeout_sec:.3f} sec."
+                ) from err
+
+            if proc.returncode != 0:
+                raise pyocr.tesseract.TesseractError(proc.returncode, proc.stdout)
+
+            for file_extension in self.__builder.file_extensions:
+                path_output = os.path.join(dirpath, f"output.{file_extension}")
+
+                if os.path.exists(path_output):
+                    with open(
+                        path_output, "r", encoding="utf-8", errors="replace"
+                    ) as fp:
+                        return self.__builder.read_file(fp)
+
+        raise pyocr.tesseract.TesseractError(-1, "Unable to find output file.")
+
+
+# TesseractOCR instances shared in the process: tesseract_path -> TesseractOCR
+_shared_tesseract_ocrs: dict[str, TesseractOCR] = {}
+_shared_tesseract_ocrs_lock = threading.Lock()
+
+
+def get_shared_tesseract_ocr(tesseract_path: str) -> TesseractOCR:
+    """Returns TesseractOCR shared by the services in the process."""
+    with _shared_tesseract_ocrs_lock:
+        if tesseract_path not in _shared_tesseract_ocrs:
+            _shared_tesseract_ocrs[tesseract_path] = TesseractOCR(tesseract_path)
+
+        return _shared_tesseract_ocrs[tesseract_path]
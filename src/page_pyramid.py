@@ -0,0 +1,296 @@
+import os
+import math
+import shutil
+from typing import TYPE_CHECKING
+
+from document_index import PageMetadata
+
+# PIL is imported when a pyramid is written, not to slow down the startup of services.
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+DZI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile_size}" Overlap="{overlap}" Format="{tile_format}">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+"""
+
+
+def get_n_levels(width: int, height: int) -> int:
+    """Returns the number of levels of a Deep Zoom pyramid (the last level has the full size)."""
+    return math.ceil(math.log2(max(width, height, 1))) + 1
+
+
+def get_dirpath_tiles(path_dzi: str) -> str:
+    """Returns the directory of tiles of a .dzi file (e.g. "x.dzi" -> "x_files")."""
+    return f"{os.path.splitext(path_dzi)[0]}_files"
+
+
+class _PyramidLevel:
+    """
+    A level of the pyramid, which receives its rows from top to bottom as strips.
+
+    Rows are kept only until the tiles covering them have been written,
+    and are passed to the next (half size) level in pairs.
+    The height of the level is known when all rows have been pushed, and the next level
+    is created when the level has more than one pixel (the last level has 1x1 pixel).
+    """
+
+    def __init__(self, writer: "PagePyramidWriter", depth: int, width: int):
+        self.__writer = writer
+        self.__depth = depth  # 0 for the full size
+        self.__width = width
+        self.__height: int | None = None
+        self.__next_level: "_PyramidLevel | None" = None
+
+        self.__rows: "Image.Image | None" = None  # Rows from self.__rows_top
+        self.__rows_top = 0
+        self.__n_rows_received = 0
+        self.__i_tile_row = 0
+        self.__row_to_pair: "Image.Image | None" = None  # An odd row for the next level
+
+    def push(self, strip: "Image.Image"):
+        """Appends rows to the level."""
+        self.__rows = (
+            strip if self.__rows is None else _concat_vertically(self.__rows, strip)
+        )
+        self.__n_rows_received += strip.height
+        self.__write_tile_rows()
+
+        if self.__width > 1 or self.__n_rows_received > 1:
+            self.__push_to_next_level(strip)
+        else:
+            # The only row of the last level, unless more rows are pushed.
+            self.__row_to_pair = strip
+
+    def finish(self):
+        """Writes the remaining tiles, when all rows have been pushed."""
+        self.__height = self.__n_rows_received
+        self.__write_tile_rows()
+
+        if self.__width > 1 or self.__height > 1:
+            if self.__row_to_pair is not None:
+                self.__get_next_level().push(self.__downscale(self.__row_to_pair, 1))
+                self.__row_to_pair = None
+
+            self.__get_next_level().finish()
+
+    def __get_next_level(self) -> "_PyramidLevel":
+        if self.__next_level is None:
+            self.__next_level = _PyramidLevel(
+                self.__writer, self.__depth + 1, math.ceil(self.__width / 2)
+            )
+
+        return self.__next_level
+
+    def __push_to_next_level(self, strip: "Image.Image"):
+        if self.__row_to_pair is not None:
+            strip = _concat_vertically(self.__row_to_pair, strip)
+            self.__row_to_pair = None
+
+        n_paired_rows = strip.height - strip.height % 2
+
+        if n_paired_rows < strip.height:
+            self.__row_to_pair = strip.crop(
+                (0, n_paired_rows, strip.width, strip.height)
+            )
+
+        if n_paired_rows > 0:
+            self.__get_next_level().push(
+                self.__downscale(
+                    strip.crop((0, 0, strip.width, n_paired_rows)), n_paired_rows // 2
+                )
+            )
+
+    def __downscale(self, strip: "Image.Image", height: int) -> "Image.Image":
+        from PIL import Image
+
+        return strip.resize((math.ceil(self.__width / 2), height), Image.Resampling.BOX)
+
+    def __write_tile_rows(self):
+        tile_size = self.__writer.tile_size
+        overlap = self.__writer.overlap
+        # Until the height is known, tile rows are written when all of their rows are received.
+        height = self.__height if self.__height is not None else math.inf
+
+        while self.__i_tile_row * tile_size < height:
+            top = max(0, self.__i_tile_row * tile_size - overlap)
+            bottom = min(height, (self.__i_tile_row + 1) * tile_size + overlap)
+
+            if self.__n_rows_received < bottom:
+                return
+
+            row_image = self.__rows.crop(
+                (0, top - self.__rows_top, self.__width, bottom - self.__rows_top)
+            )
+
+            for i_col in range(math.ceil(self.__width / tile_size)):
+                left = max(0, i_col * tile_size - overlap)
+                right = min(self.__width, (i_col + 1) * tile_size + overlap)
+
+                self.__writer.write_tile(
+                    self.__depth,
+                    i_col,
+                    self.__i_tile_row,
+                    row_image.crop((left, 0, right, row_image.height)),
+                )
+
+            self.__i_tile_row += 1
+
+            # Rows above the next tile row (and its overlap) are no longer needed.
+            next_top = min(
+                self.__n_rows_received,
+                max(0, self.__i_tile_row * tile_size - overlap),
+            )
+            if next_top > self.__rows_top:
+                self.__rows = self.__rows.crop(
+                    (0, next_top - self.__rows_top, self.__width, self.__rows.height)
+                )
+                self.__rows_top = next_top
+
+
+def _concat_vertically(top: "Image.Image", bottom: "Image.Image") -> "Image.Image":
+    from PIL import Image
+
+    result = Image.new(top.mode, (top.width, top.height + bottom.height))
+    result.paste(top, (0, 0))
+    result.paste(bottom, (0, top.height))
+    return result
+
+
+class PagePyramidWriter:
+    """
+    Writes pages of a document into a tiled image pyramid in Deep Zoom (DZI) format,
+    laid out vertically at PageMetadata.offset_top as in the document index.
+
+    Pages are streamed into the tiles page by page, so the memory used does not grow
+    with the number of pages (only a band of rows is kept for each level).
+    The height of the document can be given on close(), if it is not known
+    until the last page is rendered.
+    """
+
+    def __init__(
+        self,
+        path_dzi: str,
+        width: int,
+        height: int | None = None,
+        tile_size=254,
+        overlap=1,
+        tile_format="jpg",
+        quality=85,
+        background=(255, 255, 255),
+    ):
+        self.path_dzi = path_dzi
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.tile_format = tile_format
+        self.quality = quality
+        self.background = background
+
+        self.__dirpath_tiles = get_dirpath_tiles(path_dzi)
+        self.__y = 0  # Rows written so far at full size
+
+        # Tiles are written in a temporary directory, which replaces the previous pyramid on close().
+        self.__dirpath_tiles_tmp = f"{self.__dirpath_tiles}.tmp"
+        shutil.rmtree(self.__dirpath_tiles_tmp, ignore_errors=True)
+
+        self.__full_size_level = _PyramidLevel(self, 0, width)
+
+    def write_tile(self, depth: int, i_col: int, i_row: int, tile: "Image.Image"):
+        # Levels are numbered from the smallest one, which is known on close().
+        dirpath_level = os.path.join(self.__dirpath_tiles_tmp, f"d{depth}")
+        os.makedirs(dirpath_level, exist_ok=True)
+
+        path_tile = os.path.join(dirpath_level, f"{i_col}_{i_row}.{self.tile_format}")
+
+        if self.tile_format == "jpg":
+            tile.save(path_tile, "JPEG", quality=self.quality)
+        else:
+            tile.save(path_tile)
+
+    def add_page(self, image_page: "Image.Image", page_metadata: PageMetadata):
+        """Adds a page at page_metadata.offset_top. Pages must be added from top to bottom."""
+        from PIL import Image
+
+        assert (
+            page_metadata.offset_top >= self.__y
+        ), "Pages must be added from top to bottom without overlaps."
+
+        # Margin between pages
+        self.__push_background(page_metadata.offset_top - self.__y)
+
+        image_page = image_page.convert("RGB")
+        if image_page.width != self.width:
+            # Pages of another width are aligned to the left of the document.
+            page = Image.new("RGB", (self.width, image_page.height), self.background)
+            page.paste(image_page, (0, 0))
+            image_page = page
+
+        height = (
+            image_page.height
+            if self.height is None
+            else min(image_page.height, self.height - self.__y)
+        )
+
+        for top in range(0, height, self.tile_size):
+            self.__push(
+                image_page.crop((0, top, self.width, min(height, top + self.tile_size)))
+            )
+
+    def close(self, height: int | None = None):
+        """
+        Writes the remaining tiles and the .dzi file.
+        height is the height of the document if it was not given on creation
+        (by default, the bottom of the last page).
+        """
+        if self.height is None:
+            self.height = height if height is not None else self.__y
+
+        self.__push_background(self.height - self.__y)
+        self.__full_size_level.finish()
+
+        n_levels = get_n_levels(self.width, self.height)
+        for depth in range(n_levels):
+            dirpath_level = os.path.join(self.__dirpath_tiles_tmp, f"d{depth}")
+
+            # Levels without rows have no tiles.
+            if os.path.isdir(dirpath_level):
+                os.replace(
+                    dirpath_level,
+                    os.path.join(self.__dirpath_tiles_tmp, str(n_levels - 1 - depth)),
+                )
+
+        shutil.rmtree(self.__dirpath_tiles, ignore_errors=True)
+        os.replace(self.__dirpath_tiles_tmp, self.__dirpath_tiles)
+
+        path_tmp = f"{self.path_dzi}.tmp"
+        with open(path_tmp, "w", encoding="utf-8") as fp:
+            fp.write(
+                DZI_TEMPLATE.format(
+                    tile_size=self.tile_size,
+                    overlap=self.overlap,
+                    tile_format=self.tile_format,
+                    width=self.width,
+                    height=self.height,
+                )
+            )
+        os.replace(path_tmp, self.path_dzi)
+
+    def __push_background(self, height: int):
+        from PIL import Image
+
+        for top in range(0, height, self.tile_size):
+            self.__push(
+                Image.new(
+                    "RGB",
+                    (self.width, min(self.tile_size, height - top)),
+                    self.background,
+                )
+            )
+
+    def __push(self, strip: "Image.Image"):
+        self.__full_size_level.push(strip)
+        self.__y += strip.height
@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+from typing import TYPE_CHECKING
+
+from util.log import get_logger
+
+# PIL is imported when a page is read or written, not to slow down the startup of services.
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = get_logger("PageRenderCache")
+
+# Temporary files older than this are left by a crash, not being written by another process.
+STALE_TMP_FILE_AGE_SEC = 3600
+
+
+class PageRenderCache:
+    """
+    On-disk cache of rasterized PDF pages, keyed by (PDF content hash, page number, DPI, color mode).
+
+    Pages are stored as PNG files (lossless, compressed). The total size of the files is kept
+    under max_bytes, by removing the least recently used pages (by mtime, which is updated on hits).
+
+    The directory can be shared by processes (e.g. workers of batch_indexer.py), so it is
+    scanned again every rescan_interval_sec when a page is stored, to count and evict
+    the pages stored by the other processes too.
+    """
+
+    def __init__(self, dirpath: str, max_bytes: int, rescan_interval_sec=60.0):
+        self.__dirpath = dirpath
+        self.__max_bytes = max_bytes
+        self.__rescan_interval_sec = rescan_interval_sec
+        self.__lock = threading.Lock()
+
+        # path -> (last used time in ns, size in bytes)
+        self.__entries: dict[str, tuple[int, int]] = {}
+        self.__total_bytes = 0
+        self.__scanned_at = 0.0
+
+        self.n_hits = 0
+        self.n_misses = 0
+
+        with self.__lock:
+            self.__scan()
+
+    def __scan(self):
+        self.__entries = {}
+        self.__total_bytes = 0
+        self.__scanned_at = time.monotonic()
+
+        for dirpath, _, filenames in os.walk(self.__dirpath):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+
+                try:
+                    stat = os.stat(path)
+
+                    # Files left by a crash while writing
+                    if filename.endswith(".tmp"):
+                        if time.time() - stat.st_mtime > STALE_TMP_FILE_AGE_SEC:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    # Removed by another process
+                    continue
+
+                self.__entries[path] = (stat.st_mtime_ns, stat.st_size)
+                self.__total_bytes += stat.st_size
+
+    def get_path(self, pdf_sha256: str, i_page: int, dpi: int, color_mode: str):
+        """Returns the path of the cached page (i_page is 1-based as in poppler)."""
+        return os.path.join(
+            self.__dirpath,
+            pdf_sha256[:2],
+            f"{pdf_sha256}.p{i_page}.d{dpi}.{color_mode}.png",
+        )
+
+    def get_total_bytes(self):
+        return self.__total_bytes
+
+    def get(
+        self, pdf_sha256: str, i_page: int, dpi: int, color_mode: str
+    ) -> "Image.Image | None":
+        """Returns the cached page, or None if it is not cached."""
+        from PIL import Image
+
+        path = self.get_path(pdf_sha256, i_page, dpi, color_mode)
+
+        with self.__lock:
+            if path not in self.__entries and not os.path.exists(path):
+                self.n_misses += 1
+                return None
+
+            try:
+                image = Image.open(path)
+                image.load()
+                os.utime(path)
+                stat = os.stat(path)
+            except OSError as err:
+                logger.warning("Failed to read a page", path=path, error=err)
+                self.__remove(path)
+                self.n_misses += 1
+                return None
+
+            # Pages stored by another process are counted when they are found.
+            if path not in self.__entries:
+                self.__total_bytes += stat.st_size
+
+            self.__entries[path] = (stat.st_mtime_ns, stat.st_size)
+            self.n_hits += 1
+            return image
+
+    def put(
+        self,
+        pdf_sha256: str,
+        i_page: int,
+        dpi: int,
+        color_mode: str,
+        image: "Image.Image",
+    ):
+        """Stores the page, and removes the least recently used pages if the cache is full."""
+        path = self.get_path(pdf_sha256, i_page, dpi, color_mode)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Written to a temporary file, so that a partially written page is never read.
+        path_tmp = f"{path}.{threading.get_ident()}.tmp"
+        image.convert(color_mode).save(path_tmp, "PNG")
+        os.replace(path_tmp, path)
+        stat = os.stat(path)
+
+        with self.__lock:
+            if time.monotonic() - self.__scanned_at >= self.__rescan_interval_sec:
+                self.__scan()
+
+            prev_entry = self.__entries.get(path)
+            if prev_entry is not None:
+                self.__total_bytes -= prev_entry[1]
+
+            self.__entries[path] = (stat.st_mtime_ns, stat.st_size)
+            self.__total_bytes += stat.st_size
+
+            self.__evict()
+
+    def __evict(self):
+        if self.__total_bytes <= self.__max_bytes:
+            return
+
+        for path, _ in sorted(self.__entries.items(), key=lambda item: item[1][0]):
+            self.__remove(path)
+
+            if self.__total_bytes <= self.__max_bytes:
+                return
+
+    def __remove(self, path: str):
+        entry = self.__entries.pop(path, None)
+        if entry is not None:
+            self.__total_bytes -= entry[1]
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Removed by another process
+            pass
+
+
+# PageRenderCache instances shared in the process: dirpath -> PageRenderCache
+_shared_page_render_caches: dict[str, PageRenderCache] = {}
+_shared_page_render_caches_lock = threading.Lock()
+
+
+def get_shared_page_render_cache(dirpath: str, max_bytes: int) -> PageRenderCache:
+    """Returns PageRenderCache of the directory shared by the services in the process."""
+    with _shared_page_render_caches_lock:
+        if dirpath not in _shared_page_render_caches:
+            _shared_page_render_caches[dirpath] = PageRenderCache(dirpath, max_bytes)
+
+        return _shared_page_render_caches[dirpath]
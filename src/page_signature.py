@@ -0,0 +1,133 @@
+import zlib
+from collections.abc import Iterable
+
+import numpy as np
+
+# Mersenne prime (2^31 - 1) for the universal hash functions (a * x + b) mod p.
+# a < p and x < 2^32, so a * x + b never overflows uint64.
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_text(text: str):
+    """Normalizes text for shingling: lower case and single spaces."""
+    return " ".join(text.lower().split())
+
+
+def get_shingles(text: str, shingle_size: int) -> set[str]:
+    """Returns the set of character shingles (n-grams) of the normalized text."""
+    text = normalize_text(text)
+
+    if len(text) < shingle_size:
+        return {text} if len(text) > 0 else set()
+
+    return {text[i : i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+
+class PageSignatureIndex:
+    """
+    MinHash signatures of pages with an LSH table, to find candidate pages for a video frame
+    without comparing the video frame with every page.
+
+    The signature of a page is the MinHash over character shingles of all its lines.
+    Pages whose signatures are equal in at least one band of rows are retrieved as candidates,
+    which happens with high probability if the Jaccard similarity of their shingles is high.
+    """
+
+    def __init__(
+        self,
+        page_texts: Iterable[str],
+        n_hashes=64,
+        n_bands=32,
+        shingle_size=5,
+        seed=0,
+    ):
+        assert n_hashes % n_bands == 0
+
+        self.__n_hashes = n_hashes
+        self.__n_bands = n_bands
+        self.__n_rows = n_hashes // n_bands
+        self.__shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self.__hash_a = rng.integers(1, MERSENNE_PRIME, n_hashes, dtype=np.uint64)
+        self.__hash_b = rng.integers(0, MERSENNE_PRIME, n_hashes, dtype=np.uint64)
+
+        signatures = [self.get_signature(page_text) for page_text in page_texts]
+        self.__is_page_empty = np.array([s is None for s in signatures], dtype=bool)
+        self.__signatures = np.array(
+            [
+                s if s is not None else np.zeros(n_hashes, dtype=np.uint64)
+                for s in signatures
+            ],
+            dtype=np.uint64,
+        ).reshape(len(signatures), n_hashes)
+
+        # LSH table for each band: rows of the band (as bytes) -> page ids
+        self.__lsh_tables: list[dict[bytes, list[int]]] = [{} for _ in range(n_bands)]
+
+        for i_page, signature in enumerate(signatures):
+            if signature is None:
+                continue
+
+            for i_band, band_key in enumerate(self.__get_band_keys(signature)):
+                self.__lsh_tables[i_band].setdefault(band_key, []).append(i_page)
+
+    def get_n_pages(self):
+        """Returns the number of pages in the index."""
+        return len(self.__signatures)
+
+    def get_signature(self, text: str) -> np.ndarray | None:
+        """Returns MinHash signature of the text, or None if the text has no shingles."""
+        shingles = get_shingles(text, self.__shingle_size)
+
+        if len(shingles) == 0:
+            return None
+
+        shingle_hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+
+        hashed = (
+            self.__hash_a[:, None] * shingle_hashes[None, :] + self.__hash_b[:, None]
+        ) % np.uint64(MERSENNE_PRIME)
+
+        return hashed.min(axis=1)
+
+    def __get_band_keys(self, signature: np.ndarray):
+        return [
+            signature[i_band * self.__n_rows : (i_band + 1) * self.__n_rows].tobytes()
+            for i_band in range(self.__n_bands)
+        ]
+
+    def estimate_similarities(self, signature: np.ndarray, page_ids=None):
+        """Returns estimated Jaccard similarities between the signature and the pages."""
+        signatures = (
+            self.__signatures if page_ids is None else self.__signatures[page_ids]
+        )
+        return (signatures == signature[None, :]).mean(axis=1)
+
+    def get_candidate_pages(self, text: str, n_candidates=8) -> list[int]:
+        """
+        Returns ids of up to n_candidates pages similar to the text, most similar first.
+        If no page shares a band with the text, pages are ranked by the signatures instead.
+        """
+        signature = self.get_signature(text)
+
+        if signature is None or self.get_n_pages() == 0:
+            return []
+
+        candidates: set[int] = set()
+        for i_band, band_key in enumerate(self.__get_band_keys(signature)):
+            candidates.update(self.__lsh_tables[i_band].get(band_key, []))
+
+        if len(candidates) > 0:
+            page_ids = np.array(sorted(candidates))
+        else:
+            page_ids = np.flatnonzero(~self.__is_page_empty)
+
+        similarities = self.estimate_similarities(signature, page_ids)
+        ranking = np.argsort(-similarities, kind="stable")[:n_candidates]
+
+        return [int(page_ids[i]) for i in ranking if similarities[i] > 0]
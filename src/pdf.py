@@ -1,100 +1,216 @@
 import os
 from dataclasses import dataclass
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 
-import pdf2image
-from PIL import Image
+from typing import TYPE_CHECKING
 
 from document_index import PageMetadata
+from page_pyramid import PagePyramidWriter
+from page_render_cache import PageRenderCache
+from util.config import Config
+from util.pdf_hash_registry import calc_file_sha256
+from util.log import get_logger
+
+# pdf2image and PIL are imported when they are used, not to slow down the startup of services.
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = get_logger("PDFLoader")
 
 
 @dataclass
 class PDFLoaderResult:
     """Represents PDFLoader result."""
 
-    image_concat: Image.Image | None
-    image_pages: Iterable[Image.Image]
+    path_pyramid: str | None  # .dzi file of the tiled image pyramid of the pages
+    image_pages: "Iterable[Image.Image]"
     metadata_pages: Iterable[PageMetadata]
     width: int
     height: int
     n_pages: int
 
 
+def get_ranges(numbers: list[int]) -> list[tuple[int, int]]:
+    """Returns ranges (first, last) of consecutive numbers in the sorted list."""
+    ranges: list[tuple[int, int]] = []
+
+    for number in numbers:
+        if len(ranges) > 0 and ranges[-1][1] == number - 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+
+    return ranges
+
+
 # https://gammasoft.jp/blog/convert-pdf-to-image-by-python/
 # https://blog.alivate.com.au/poppler-windows/
 # This demo script runs on popper 0.68.0(latest at 2023/5/26)
 class PDFLoader:
     """Loads PDF file to parse its content and metadata."""
 
-    def __init__(self, poppler_exe_path: str):
+    def __init__(
+        self,
+        poppler_exe_path: str,
+        page_render_cache: PageRenderCache | None = None,
+        dpi=200,
+        color_mode="RGB",
+        n_pages_per_range=8,
+    ):
+        """
+        color_mode: "RGB" or "L" (grayscale) of rendered pages.
+        If page_render_cache is given, rendered pages are cached, and poppler renders only the pages not cached.
+        Pages are rendered by ranges of n_pages_per_range pages, so that only a range is kept in memory.
+        """
         os.environ["PATH"] = poppler_exe_path
 
-    def __concat_vertically(
-        self, images_list: list[Image.Image], concat_margin_y_px: int
-    ) -> Image.Image:
-        result = images_list[0]
+        self.__page_render_cache = page_render_cache
+        self.__dpi = dpi
+        self.__color_mode = color_mode
+        self.__n_pages_per_range = n_pages_per_range
+
+    def get_page_numbers(
+        self, pdf_abs_path: str, i_start: int | None = None, i_end: int | None = None
+    ) -> range:
+        """Returns the numbers of the pages to render (1-based as in poppler)."""
+        import pdf2image
+
+        n_pages = pdf2image.pdfinfo_from_path(pdf_abs_path)["Pages"]
+
+        return range(i_start or 1, min(i_end or n_pages, n_pages) + 1)
+
+    def __render_pages(self, pdf_abs_path: str, page_numbers: range):
+        """Renders the pages, and yields them in order, rendering a range of pages at a time."""
+        import pdf2image
+
+        grayscale = self.__color_mode == "L"
+        cache = self.__page_render_cache
+        pdf_sha256 = calc_file_sha256(pdf_abs_path) if cache is not None else None
+        n_cached_pages = 0
+
+        for i_range_start in range(0, len(page_numbers), self.__n_pages_per_range):
+            page_numbers_of_range = page_numbers[
+                i_range_start : i_range_start + self.__n_pages_per_range
+            ]
+            img_pages = {
+                i_page: (
+                    cache.get(pdf_sha256, i_page, self.__dpi, self.__color_mode)
+                    if cache is not None
+                    else None
+                )
+                for i_page in page_numbers_of_range
+            }
+            n_cached_pages += sum(img is not None for img in img_pages.values())
+
+            # Pages not cached are rendered by ranges of consecutive pages.
+            for first_page, last_page in get_ranges(
+                [i_page for i_page, img in img_pages.items() if img is None]
+            ):
+                rendered_pages = pdf2image.convert_from_path(
+                    pdf_abs_path,
+                    dpi=self.__dpi,
+                    first_page=first_page,
+                    last_page=last_page,
+                    grayscale=grayscale,
+                )
 
-        for i in range(1, len(images_list)):
-            print(f"[PDFLoader] Concatting : No.{i} / {len(images_list) - 1}")
-            img_to_concat = images_list[i]
+                for i_page, img_page in zip(
+                    range(first_page, last_page + 1), rendered_pages
+                ):
+                    if cache is not None:
+                        cache.put(
+                            pdf_sha256, i_page, self.__dpi, self.__color_mode, img_page
+                        )
+                    img_pages[i_page] = img_page
+
+            for i_page in page_numbers_of_range:
+                # Only the pages of the range not yielded yet are kept.
+                yield img_pages.pop(i_page)
+
+        if cache is not None:
+            logger.info(
+                "Pages found in the render cache",
+                n_cached_pages=n_cached_pages,
+                n_pages=len(page_numbers),
+            )
 
-            if i > 40:
-                print(
-                    result.width,
-                    result.height + img_to_concat.height + concat_margin_y_px,
-                )
-            dst = Image.new(
-                "RGB",
-                (
-                    result.width,
-                    result.height + img_to_concat.height + concat_margin_y_px,
-                ),
+    def iter_pages(
+        self,
+        pdf_abs_path: str,
+        i_start=None,
+        i_end=None,
+        path_pyramid: str | None = None,
+        concat_margin_y_px=0,
+    ) -> "Iterator[tuple[Image.Image, PageMetadata]]":
+        """
+        Renders the pages of the PDF file by ranges, and yields each page with its metadata,
+        laid out vertically with concat_margin_y_px between pages.
+        If path_pyramid is given, the pages are written there as a tiled image pyramid (DZI)
+        as they are yielded, which is completed after the last page.
+        """
+        config = Config.get_instance()
+        logger.info("Converting pdf into image", path=pdf_abs_path)
+
+        page_numbers = self.get_page_numbers(pdf_abs_path, i_start, i_end)
+        writer = None
+        offset_top = 0
+
+        for i, img_page in enumerate(self.__render_pages(pdf_abs_path, page_numbers)):
+            logger.debug("Converting page", i_page=i, n_pages=len(page_numbers))
+            w, h = img_page.size  #  w, h = PIL.Image.size
+            page_metadata = PageMetadata(
+                width=w, height=h, offset_top=offset_top, page_id=i
             )
-            dst.paste(result, (0, 0))
-            dst.paste(img_to_concat, (0, result.height + concat_margin_y_px))
-            result = dst
+            offset_top = offset_top + h + concat_margin_y_px
+
+            if path_pyramid is not None:
+                # The width of the document is the width of the first page.
+                if writer is None:
+                    os.makedirs(os.path.dirname(path_pyramid), exist_ok=True)
+                    writer = PagePyramidWriter(
+                        path_pyramid,
+                        w,
+                        tile_size=config.page_pyramid_tile_size,
+                        overlap=config.page_pyramid_overlap,
+                        tile_format=config.page_pyramid_tile_format,
+                        quality=config.page_pyramid_quality,
+                    )
+
+                logger.debug("Writing pyramid tiles", i_page=i)
+                writer.add_page(img_page, page_metadata)
+
+            yield img_page, page_metadata
 
-        return result
+        if writer is not None:
+            writer.close(height=offset_top)
 
     def convert_pdf_to_img(
         self,
         pdf_abs_path: str,
         i_start=None,
         i_end=None,
-        enable_concat=False,
+        path_pyramid: str | None = None,
         concat_margin_y_px=0,
     ):
-        """Converts PDF file to image."""
-
-        print("[PDFLoader] Converting pdf into image.")
-        img_pages = pdf2image.convert_from_path(
-            pdf_abs_path, first_page=i_start, last_page=i_end
-        )
-
-        img_concat = None
-        if enable_concat is True:
-            print("[PDFLoader] Converting images vertically.")
-            img_concat = self.__concat_vertically(img_pages, concat_margin_y_px)
-
-        n_pages = len(img_pages)
-        offset_top = 0
+        """
+        Converts PDF file to image, keeping all pages in memory (see iter_pages() not to).
+        If path_pyramid is given, the pages laid out vertically are written there
+        as a tiled image pyramid (DZI), instead of one concatenated image.
+        """
+        img_pages: "list[Image.Image]" = []
         metadata: list[PageMetadata] = []
-        for i, img_page in enumerate(img_pages):
-            print(f"[PDFLoader] Converting : page No.{i} / {n_pages - 1}")
-            w, h = img_page.size  #  w, h = PIL.Image.size
-            metadata.append(
-                PageMetadata(width=w, height=h, offset_top=offset_top, page_id=i)
-            )
-            offset_top = offset_top + h + concat_margin_y_px
 
-        pdf_width = metadata[0].width
-        pdf_height = offset_top
+        for img_page, page_metadata in self.iter_pages(
+            pdf_abs_path, i_start, i_end, path_pyramid, concat_margin_y_px
+        ):
+            img_pages.append(img_page)
+            metadata.append(page_metadata)
 
         return PDFLoaderResult(
-            image_concat=img_concat,
+            path_pyramid=path_pyramid,
             image_pages=img_pages,
             metadata_pages=metadata,
-            width=pdf_width,
-            height=pdf_height,
-            n_pages=n_pages,
+            width=metadata[0].width,
+            height=metadata[-1].offset_top + metadata[-1].height + concat_margin_y_px,
+            n_pages=len(img_pages),
         )
@@ -0,0 +1,114 @@
+from typing import TYPE_CHECKING
+from collections.abc import Iterator
+
+from ocr import ShapedLineBox, TesseractOCR
+from util.deadline import Deadline, DeadlineExceeded
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def get_bands(
+    height: int, band_height: int, overlap: int
+) -> list[tuple[int, int, int]]:
+    """
+    Splits an image of the height into horizontal bands from the top: (top, bottom, limit)[].
+
+    Lines whose vertical center is above the limit of a band are taken from the band.
+    The next band starts at (limit - overlap), so that a line below the limit,
+    which can be cut at the bottom of the band, is read again as a whole by the next band
+    if it is not higher than 2 * overlap.
+    """
+    if band_height <= 2 * overlap:
+        raise ValueError(
+            f"Band height must be more than 2 * overlap, but got {band_height} and {overlap}."
+        )
+
+    bands = []
+    top = 0
+
+    while True:
+        bottom = min(height, top + band_height)
+
+        if bottom >= height:
+            bands.append((top, height, height))
+            return bands
+
+        limit = bottom - overlap
+        bands.append((top, bottom, limit))
+        top = limit - overlap
+
+
+class BandOCR:
+    """
+    Lines of an image OCRed band by band from the top, only as far as they are iterated.
+
+    A search which reads the lines from the top (e.g. DocumentIndex.search_most_matching_page())
+    can stop iterating as soon as it has found a unique match, and the bands below are never OCRed.
+    If the deadline passes, the lines end at the last band OCRed in time, and interrupted is set.
+    """
+
+    def __init__(
+        self,
+        ocr: TesseractOCR,
+        image_bin: "Image.Image",
+        scale: float,
+        band_height: int,
+        overlap: int,
+        deadline: Deadline | None = None,
+    ):
+        self.__ocr = ocr
+        self.__image_bin = image_bin
+        self.__scale = scale
+        self.__deadline = deadline or Deadline()
+        self.bands = get_bands(image_bin.height, band_height, overlap)
+
+        self.n_bands_ocred = 0
+        self.interrupted = False
+
+    def __iter__(self) -> Iterator[ShapedLineBox]:
+        for lines in self.iter_bands():
+            yield from lines
+
+    def iter_bands(self) -> Iterator[list[ShapedLineBox]]:
+        """Yields the lines taken from each band."""
+        prev_limit = 0
+
+        for top, bottom, limit in self.bands:
+            if self.__deadline.is_expired():
+                self.interrupted = True
+                return
+
+            try:
+                ocr_result = self.__ocr.extract(
+                    self.__image_bin.crop((0, top, self.__image_bin.width, bottom)),
+                    "eng",
+                    scale=self.__scale,
+                    timeout_sec=(
+                        self.__deadline.get_remaining_sec()
+                        if self.__deadline.is_set()
+                        else None
+                    ),
+                    crop_top=top,
+                )
+            except DeadlineExceeded:
+                self.interrupted = True
+                return
+
+            self.n_bands_ocred += 1
+
+            lines = []
+            for linebox in ocr_result.data:
+                # Positions of the lines are in the image before scaling.
+                center = (
+                    (linebox.position.get_top() + linebox.position.get_bottom())
+                    / 2
+                    * self.__scale
+                )
+
+                if prev_limit <= center < limit:
+                    lines.append(linebox)
+
+            yield lines
+
+            prev_limit = limit
@@ -0,0 +1,136 @@
+import json
+import time
+import sqlite3
+import threading
+
+from util.metrics import Metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    asset_id TEXT NOT NULL,
+    index_version TEXT NOT NULL,
+    frame_key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used_at REAL NOT NULL,
+    PRIMARY KEY (asset_id, index_version, frame_key)
+);
+CREATE INDEX IF NOT EXISTS results_last_used_at ON results(last_used_at);
+"""
+
+
+class ResultCache:
+    """
+    SQLite database of results of SequenceAnalyzer, shared by all clients and kept across restarts.
+
+    Results are keyed by (asset_id, index_version, frame_key), where the frame key is
+    a perceptual hash of the frame, so that the same frame of a popular video is OCRed only once
+    for a version of the document index.
+    Results are evicted in least recently used order when their total size exceeds max_size_bytes.
+    """
+
+    def __init__(self, path_db: str, max_size_bytes: int):
+        self.__max_size_bytes = max_size_bytes
+
+        # The connection is shared by threads, and used under the lock.
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path_db, check_same_thread=False)
+        self.__connection.executescript(SCHEMA)
+
+        (self.__size_bytes,) = self.__connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+    def get(self, asset_id: str, index_version: str, frame_key: str) -> dict | None:
+        """Returns the cached result (the output of to_json_serializable()), or None."""
+        key = (asset_id, index_version, frame_key)
+
+        with self.__lock, self.__connection:
+            row = self.__connection.execute(
+                "SELECT result FROM results WHERE asset_id = ? AND index_version = ? AND frame_key = ?",
+                key,
+            ).fetchone()
+
+            if row is not None:
+                self.__connection.execute(
+                    "UPDATE results SET last_used_at = ? WHERE asset_id = ? AND index_version = ? AND frame_key = ?",
+                    (time.time(), *key),
+                )
+
+        Metrics.get_instance().increment(
+            "result_cache.hits" if row is not None else "result_cache.misses"
+        )
+
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, asset_id: str, index_version: str, frame_key: str, result: dict):
+        """Caches the result, and evicts the least recently used results beyond the size limit."""
+        result_json = json.dumps(result)
+        size = len(result_json)
+        key = (asset_id, index_version, frame_key)
+
+        with self.__lock, self.__connection:
+            row = self.__connection.execute(
+                "SELECT size FROM results WHERE asset_id = ? AND index_version = ? AND frame_key = ?",
+                key,
+            ).fetchone()
+
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, result_json, size, time.time()),
+            )
+            self.__size_bytes += size - (row[0] if row is not None else 0)
+
+            if self.__size_bytes > self.__max_size_bytes:
+                self.__evict()
+
+    def __evict(self):
+        # Results are evicted down to 90% of the limit, not to evict on every put.
+        n_evicted = 0
+        target_size_bytes = self.__max_size_bytes * 0.9
+
+        while self.__size_bytes > target_size_bytes:
+            rows = self.__connection.execute(
+                "SELECT rowid, size FROM results ORDER BY last_used_at LIMIT 256"
+            ).fetchall()
+
+            if len(rows) == 0:
+                break
+
+            for rowid, size in rows:
+                if self.__size_bytes <= target_size_bytes:
+                    break
+
+                self.__connection.execute(
+                    "DELETE FROM results WHERE rowid = ?", (rowid,)
+                )
+                self.__size_bytes -= size
+                n_evicted += 1
+
+        Metrics.get_instance().increment("result_cache.evictions", n_evicted)
+
+    def get_stats(self) -> dict:
+        """Returns the number of hits and misses, the hit ratio and the size of the cache."""
+        metrics = Metrics.get_instance()
+        n_hits = metrics.get("result_cache.hits")
+        n_misses = metrics.get("result_cache.misses")
+
+        with self.__lock:
+            (n_results,) = self.__connection.execute(
+                "SELECT COUNT(*) FROM results"
+            ).fetchone()
+
+        return {
+            "n_hits": n_hits,
+            "n_misses": n_misses,
+            "hit_ratio": (
+                n_hits / (n_hits + n_misses) if n_hits + n_misses > 0 else None
+            ),
+            "n_results": n_results,
+            "size_bytes": self.__size_bytes,
+            "max_size_bytes": self.__max_size_bytes,
+        }
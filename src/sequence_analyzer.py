@@ -1,26 +1,78 @@
-import os
+import json
+import hashlib
+import threading
+from typing import TYPE_CHECKING
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 from document_index import (
     DocumentIndex,
+    DocumentMetadata,
     DocumentType,
     FoundRelatedLine,
     FoundRelatedPage,
 )
-from ocr import TesseractOCR
+from document_index_store import StoredDocumentIndex
+from document_index_pool import DocumentIndexPool
+from ocr import TesseractOCR, OCRResult, get_shared_tesseract_ocr
+from progressive_ocr import BandOCR
+from sharded_matching import ShardedLineMatcher
+from match_history import MatchHistoryStore
+from result_cache import ResultCache
+from multi_document import MultiDocumentIndex
 from viewport import (
     estimate_viewport_from_line,
     estimate_viewport_from_page,
+    estimate_viewports,
     DocumentScaleViewport,
 )
-from video_frame import VideoFrameImage
-from util.asset import Asset
+from video_frame import VideoFrameImage, VideoFrameMetadata
+from util.config import Config
+from util.metrics import Metrics
+from util.deadline import Deadline, DeadlineExceeded
+from util.text_detection import has_text
+from util.base_class import JSONSerializableData
+from util.log import get_logger
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+# Number of MultiDocumentIndex kept for sets of assets matched together.
+MAX_N_MULTI_DOCUMENT_INDEXES = 16
+
+# Number of assets whose shard workers are kept (each runs matching.n_shards processes).
+MAX_N_SHARDED_LINE_MATCHERS = 2
+
+logger = get_logger("SequenceAnalyzer")
 
 # from util import paths
 
 
+def get_matching_settings_hash() -> str:
+    """
+    Returns a hash of the settings which can change the result of a frame (matching and index_store),
+    so that results kept across restarts are not reused after the settings have been changed.
+    """
+    config = Config.get_instance()
+    settings = sorted(
+        (name, value)
+        for name, value in vars(config).items()
+        if name.startswith(("matching_", "index_store_"))
+    )
+
+    return hashlib.sha1(json.dumps(settings, default=str).encode("utf-8")).hexdigest()
+
+
+def get_match_score(match_result: FoundRelatedPage | FoundRelatedLine) -> float:
+    """Returns the lower one of the scores of the match, by which matches of OCR scale tiers are compared."""
+    return min(match_result.ngram_score, match_result.sq_match_score)
+
+
 @dataclass
-class SequenceAnalyzerResult:
+class SequenceAnalyzerResult(JSONSerializableData):
     """
     Result of SequenceAnalyzer.match_content_sequence()
     """
@@ -29,6 +81,103 @@ class SequenceAnalyzerResult:
     document_available: bool
     content_matching_result: FoundRelatedPage | FoundRelatedLine | None
     viewport_estimation_result: DocumentScaleViewport | None
+    from_history: bool = False
+    from_cache: bool = False
+    # The deadline passed before OCR and matching finished, and the result is the best one found until then.
+    partial: bool = False
+    # The matched asset of SequenceAnalyzer.match_content_sequence_multi()
+    asset_id: str | None = None
+
+    def to_json_serializable(self):
+        content_matching_result = None
+
+        if isinstance(self.content_matching_result, FoundRelatedPage):
+            content_matching_result = {
+                "type": "page",
+                **self.content_matching_result.to_json_serializable(),
+            }
+        elif isinstance(self.content_matching_result, FoundRelatedLine):
+            content_matching_result = {
+                "type": "line",
+                **self.content_matching_result.to_json_serializable(),
+            }
+
+        return {
+            "content_sequence_matched": self.content_sequence_matched,
+            "document_available": self.document_available,
+            "content_matching_result": content_matching_result,
+            "viewport_estimation_result": (
+                self.viewport_estimation_result.to_json_serializable()
+                if self.viewport_estimation_result is not None
+                else None
+            ),
+            "partial": self.partial,
+            "asset_id": self.asset_id,
+        }
+
+    @staticmethod
+    def from_json_serializable(data: dict, document_index: DocumentIndex):
+        """A factory method to create from the output of to_json_serializable()."""
+        content_matching_result = data["content_matching_result"]
+        viewport_estimation_result = data["viewport_estimation_result"]
+
+        if content_matching_result is not None:
+            content_matching_result = (
+                FoundRelatedPage.from_json_serializable(content_matching_result)
+                if content_matching_result["type"] == "page"
+                else FoundRelatedLine.from_json_serializable(content_matching_result)
+            )
+
+        if viewport_estimation_result is not None:
+            viewport_estimation_result = DocumentScaleViewport.from_json_serializable(
+                viewport_estimation_result, document_index.metadata
+            )
+
+        return SequenceAnalyzerResult(
+            content_sequence_matched=data["content_sequence_matched"],
+            document_available=data["document_available"],
+            content_matching_result=content_matching_result,
+            viewport_estimation_result=viewport_estimation_result,
+            partial=data.get("partial", False),
+            asset_id=data.get("asset_id"),
+        )
+
+    def get_match_key(self):
+        """Returns a key which identifies the matched content (page or line) of the result."""
+        if isinstance(self.content_matching_result, FoundRelatedPage):
+            return f"page:{self.content_matching_result.i_page}"
+
+        if isinstance(self.content_matching_result, FoundRelatedLine):
+            return f"line:{self.content_matching_result.i_line_index_data}"
+
+        return "none"
+
+
+@dataclass
+class SequenceAnalyzerBatchResult:
+    """
+    Result of SequenceAnalyzer.match_content_sequence_batch()
+
+    viewports is (n_frames, 4) array of [left, top, right, bottom] (px) in the document,
+    whose rows are NaN for frames without matched content (None if the document is not available).
+    """
+
+    document_available: bool
+    content_matching_results: list[FoundRelatedPage | FoundRelatedLine | None]
+    viewports: "np.ndarray | None"
+    document_metadata: DocumentMetadata | None
+
+    def get_relative_viewports(self) -> "np.ndarray | None":
+        """Get viewports relative to the size of the document."""
+        if self.viewports is None:
+            return None
+
+        return self.viewports / (
+            self.document_metadata.width,
+            self.document_metadata.height,
+            self.document_metadata.width,
+            self.document_metadata.height,
+        )
 
 
 class SequenceAnalyzer:
@@ -37,41 +186,157 @@ class SequenceAnalyzer:
     """
 
     __ocr: TesseractOCR
-    __document_index_data: dict[str, DocumentIndex]
+    __sharded_line_matchers: OrderedDict[str, tuple[DocumentIndex, ShardedLineMatcher]]
+    __multi_document_indexes: OrderedDict[tuple[str, ...], MultiDocumentIndex]
 
-    def __init__(self, path_tesseract_ocr_bin: str):
-        self.__ocr = TesseractOCR(path_tesseract_ocr_bin)
-        self.__document_index_data = {}
+    def __init__(
+        self,
+        path_tesseract_ocr_bin: str,
+        match_history_store: MatchHistoryStore | None = None,
+        result_cache: ResultCache | None = None,
+    ):
+        self.__ocr = get_shared_tesseract_ocr(path_tesseract_ocr_bin)
+        self.__sharded_line_matchers = OrderedDict()
+        self.__multi_document_indexes = OrderedDict()
+        self.__match_history_store = match_history_store
+        self.__result_cache = result_cache
+
+        # SequenceAnalyzer can be shared by requests handled in multiple threads.
+        self.__lock = threading.RLock()
 
     def __get_document_index_data(self, asset_id: str) -> DocumentIndex | None:
-        if self.__document_index_data.get(asset_id) is None:
-            # Load document index data from cached file
+        # Document indexes are shared with the other services in the process.
+        return DocumentIndexPool.get_instance().get(asset_id)
+
+    def shutdown(self):
+        """Stops the shard workers and saves the match histories."""
+        with self.__lock:
+            for _, sharded_line_matcher in self.__sharded_line_matchers.values():
+                sharded_line_matcher.shutdown()
+            self.__sharded_line_matchers = OrderedDict()
 
-            asset_path = Asset.get_path_document_index(asset_id)
+        if self.__match_history_store is not None:
+            self.__match_history_store.save_all()
 
-            # Check if cached file exists
-            if not os.path.exists(asset_path):
-                print("[SequenceAnalyzer] Document index cache does not exist.")
-                return None
+    @staticmethod
+    def get_ocr_cascade_stats() -> list[dict]:
+        """Returns the number of attempts and hits (confident matches) of each OCR scale tier."""
+        metrics = Metrics.get_instance()
+        stats = []
 
-            self.__document_index_data[asset_id] = DocumentIndex.from_output_file(
-                asset_path
+        for scale in Config.get_instance().matching_ocr_scale_tiers:
+            n_attempts = metrics.get(f"ocr_cascade.tier_{scale}.attempts")
+            n_hits = metrics.get(f"ocr_cascade.tier_{scale}.hits")
+            stats.append(
+                {
+                    "scale": scale,
+                    "n_attempts": n_attempts,
+                    "n_hits": n_hits,
+                    "hit_rate": n_hits / n_attempts if n_attempts > 0 else None,
+                }
             )
 
-        return self.__document_index_data[asset_id]
+        return stats
 
-    def match_content_sequence(self, asset_id: str, video_frame: VideoFrameImage):
+    def __acquire_sharded_line_matcher(
+        self, asset_id: str, document_index: DocumentIndex
+    ) -> ShardedLineMatcher | None:
+        """
+        Returns ShardedLineMatcher of the document index if sharded matching is enabled
+        and the document index is large enough, otherwise None.
+        The matcher is acquired, and must be released after the search.
+        Matchers of the least recently used assets are closed beyond MAX_N_SHARDED_LINE_MATCHERS.
+        """
+        config = Config.get_instance()
+
+        if (
+            config.matching_n_shards <= 1
+            # Lines of a stored document index are searched by the store.
+            or isinstance(document_index, StoredDocumentIndex)
+            or len(document_index.concat_index_data)
+            < config.matching_min_lines_for_sharding
+        ):
+            return None
+
+        with self.__lock:
+            sharded = self.__sharded_line_matchers.get(asset_id)
+
+            # The document index has been reloaded since the shards were started.
+            if sharded is not None and sharded[0] is not document_index:
+                sharded[1].close()
+                sharded = None
+
+            if sharded is None:
+                logger.info(
+                    "Starting shards",
+                    asset_id=asset_id,
+                    n_shards=config.matching_n_shards,
+                )
+                sharded = (
+                    document_index,
+                    ShardedLineMatcher(
+                        document_index.get_index_contents(),
+                        config.matching_n_shards,
+                    ),
+                )
+                self.__sharded_line_matchers[asset_id] = sharded
+
+            self.__sharded_line_matchers.move_to_end(asset_id)
+
+            while len(self.__sharded_line_matchers) > MAX_N_SHARDED_LINE_MATCHERS:
+                evicted_asset_id, (_, evicted) = self.__sharded_line_matchers.popitem(
+                    last=False
+                )
+                logger.info("Stopping shards", asset_id=evicted_asset_id)
+                evicted.close()
+
+            sharded[1].acquire()
+            return sharded[1]
+
+    def __get_candidate_pages(
+        self, document_index: DocumentIndex, ocr_result_from_video_frame: OCRResult
+    ) -> list[int] | None:
+        """
+        Returns candidate pages found by page signatures if it is enabled
+        and the document has enough pages, otherwise None (= all pages are searched).
+        """
+        config = Config.get_instance()
+
+        if (
+            not config.matching_page_lsh_enabled
+            or document_index.metadata.n_pages < config.matching_page_lsh_min_pages
+        ):
+            return None
+
+        return document_index.get_candidate_pages(
+            ocr_result_from_video_frame, config.matching_page_lsh_n_candidates
+        )
+
+    def match_content_sequence(
+        self,
+        asset_id: str,
+        video_frame: VideoFrameImage,
+        video_id: str | None = None,
+        playback_time_sec: float | None = None,
+        deadline: Deadline | None = None,
+    ):
         """
         Main function of SequenceAnalyzer class.
 
+        If video_id and playback_time_sec of the frame are given, and the match history is enabled,
+        a frame in a stable interval of the history is answered from the history without OCR.
+        Otherwise, a frame matched before against the same version of the document index
+        is answered from the result cache, if it is enabled.
+
+        If the deadline passes, OCR is aborted (or skipped) and the search is stopped,
+        and the best result found so far is returned with partial=True.
+
         :returns: SequenceAnalyzerResult
         """
         document_index: DocumentIndex | None = self.__get_document_index_data(asset_id)
 
         if document_index is None:
-            print(
-                "\n[SequenceAnalyzer] Found no document index data. Returning empty result. \n"
-            )
+            logger.debug("Found no document index data", asset_id=asset_id)
             return SequenceAnalyzerResult(
                 content_sequence_matched=False,
                 content_matching_result=None,
@@ -79,59 +344,588 @@ class SequenceAnalyzer:
                 viewport_estimation_result=None,
             )
 
-        video_frame_bin = video_frame.get_binary()
+        # Results in the history are valid only for the version of the index they are matched against.
+        index_version = self.__get_index_version(asset_id, document_index)
+        use_match_history = (
+            self.__match_history_store is not None
+            and video_id is not None
+            and playback_time_sec is not None
+            and index_version is not None
+        )
 
-        # Perform OCR on binarized video frame image
-        ocr_result_from_video_frame = self.__ocr.extract(video_frame_bin, "eng")
-        # print("\n OCR Result from video frame:")
-        # pprint.pprint(ocr_result_from_video_frame.data)
+        if use_match_history:
+            recorded_result = self.__match_history_store.find_stable_result(
+                video_id, asset_id, index_version, playback_time_sec
+            )
 
-        # Perform content matching on OCR result
-        match document_index.metadata.doc_type:
-            case DocumentType.SLIDE:
-                most_matching_page = document_index.search_most_matching_page(
-                    ocr_result_from_video_frame
+            if recorded_result is not None:
+                result = SequenceAnalyzerResult.from_json_serializable(
+                    recorded_result, document_index
                 )
+                result.from_history = True
+                return result
 
-                estimated_viewport = None
-                content_matched = most_matching_page is not None
+        cache_key = self.__get_result_cache_key(asset_id, index_version, video_frame)
+        result = None
 
-                if content_matched:
-                    estimated_viewport = estimate_viewport_from_page(
-                        match_result=most_matching_page,
-                        doc_metadata=document_index.metadata,
-                        video_metadata=video_frame.metadata,
-                    )
+        if cache_key is not None:
+            cached_result = self.__result_cache.get(*cache_key)
 
-                return SequenceAnalyzerResult(
-                    content_sequence_matched=content_matched,
-                    viewport_estimation_result=estimated_viewport,
-                    content_matching_result=most_matching_page,
-                    document_available=True,
+            if cached_result is not None:
+                result = SequenceAnalyzerResult.from_json_serializable(
+                    cached_result, document_index
                 )
+                result.from_cache = True
 
-            case DocumentType.DOCUMENT:
-                most_matching_line = document_index.search_most_matching_line(
-                    ocr_result_from_video_frame
+        if result is None:
+            result = self.__match_content(
+                asset_id, document_index, video_frame, deadline or Deadline()
+            )
+
+            if cache_key is not None and not result.partial:
+                self.__result_cache.put(*cache_key, result.to_json_serializable())
+
+        # A partial result can differ from the one of the same frame with enough time.
+        if use_match_history and not result.partial:
+            self.__match_history_store.record(
+                video_id,
+                asset_id,
+                index_version,
+                playback_time_sec,
+                result.get_match_key(),
+                result.to_json_serializable(),
+            )
+
+        return result
+
+    def __get_index_version(
+        self, asset_id: str, document_index: DocumentIndex
+    ) -> str | None:
+        """
+        Returns the version of the document index (the mtime of its file) and of the matching settings,
+        which results of frames are valid for, or None if the document index is not the loaded one.
+        """
+        index_version = DocumentIndexPool.get_instance().get_version(
+            asset_id, document_index
+        )
+
+        if index_version is None:
+            return None
+
+        return f"{index_version}-{get_matching_settings_hash()}"
+
+    def __get_result_cache_key(
+        self,
+        asset_id: str,
+        index_version: str | None,
+        video_frame: VideoFrameImage,
+    ) -> tuple[str, str, str] | None:
+        """
+        Returns the key of the frame in the result cache: (asset_id, index_version, fingerprint),
+        or None if the result cache is disabled or the version of the document index is unknown.
+        """
+        if self.__result_cache is None or index_version is None:
+            return None
+
+        return asset_id, index_version, video_frame.get_fingerprint()
+
+    def match_content_sequence_batch(
+        self,
+        asset_id: str,
+        video_frames: Iterable[VideoFrameImage | Callable[[], VideoFrameImage]],
+        n_workers: int | None = None,
+    ) -> SequenceAnalyzerBatchResult:
+        """
+        Match content sequence of a batch of video frames of an asset.
+
+        Frames can be given as functions loading them (e.g. decoding data URLs).
+        Frames are loaded and OCRed by n_workers threads, while the OCRed frames are
+        matched in order against the document index loaded once,
+        and the viewports of all frames are estimated at once.
+        """
+        video_frames = list(video_frames)
+        document_index: DocumentIndex | None = self.__get_document_index_data(asset_id)
+
+        if document_index is None:
+            logger.debug("Found no document index data", asset_id=asset_id)
+            return SequenceAnalyzerBatchResult(
+                document_available=False,
+                content_matching_results=[None] * len(video_frames),
+                viewports=None,
+                document_metadata=None,
+            )
+
+        def extract(
+            video_frame: VideoFrameImage | Callable[[], VideoFrameImage],
+        ) -> tuple[VideoFrameMetadata, OCRResult | None]:
+            if not isinstance(video_frame, VideoFrameImage):
+                video_frame = video_frame()
+
+            if not self.__has_text(video_frame):
+                return video_frame.metadata, None
+
+            return video_frame.metadata, self.__ocr.extract(
+                video_frame.get_binary(), "eng"
+            )
+
+        match_results: list[FoundRelatedPage | FoundRelatedLine | None] = []
+        video_metadata: list[VideoFrameMetadata] = []
+
+        with ThreadPoolExecutor(
+            max_workers=n_workers
+            or Config.get_instance().sequence_analyzer_batch_n_workers,
+            thread_name_prefix="SequenceAnalyzerBatch",
+        ) as executor:
+            # Results are yielded in order of the frames, as soon as each OCR finishes.
+            for metadata, ocr_result_from_video_frame in executor.map(
+                extract, video_frames
+            ):
+                video_metadata.append(metadata)
+                match_results.append(
+                    self.__search_most_matching_content(
+                        asset_id, document_index, ocr_result_from_video_frame
+                    )
+                    if ocr_result_from_video_frame is not None
+                    else None
                 )
 
-                estimated_viewport = None
-                content_matched = most_matching_line is not None
+        return SequenceAnalyzerBatchResult(
+            document_available=True,
+            content_matching_results=match_results,
+            viewports=estimate_viewports(
+                match_results, document_index.metadata, video_metadata
+            ),
+            document_metadata=document_index.metadata,
+        )
+
+    def __get_multi_document_index(
+        self, document_indexes: dict[str, DocumentIndex]
+    ) -> MultiDocumentIndex:
+        """
+        Returns MultiDocumentIndex of the document indexes, which is kept for the same set of assets.
+        It is built outside the lock, so that frames of other assets are not blocked meanwhile.
+        """
+        key = tuple(sorted(document_indexes.keys()))
+
+        with self.__lock:
+            multi_document_index = self.__multi_document_indexes.get(key)
+
+        # Any of the document indexes has been reloaded since it was built.
+        if multi_document_index is None or not multi_document_index.is_built_from(
+            document_indexes
+        ):
+            multi_document_index = MultiDocumentIndex(document_indexes)
+
+        with self.__lock:
+            # Another thread may have built it meanwhile, and either of them is kept.
+            self.__multi_document_indexes[key] = multi_document_index
+            self.__multi_document_indexes.move_to_end(key)
+
+            while len(self.__multi_document_indexes) > MAX_N_MULTI_DOCUMENT_INDEXES:
+                self.__multi_document_indexes.popitem(last=False)
+
+        return multi_document_index
+
+    def match_content_sequence_multi(
+        self,
+        asset_ids: list[str],
+        video_frame: VideoFrameImage,
+        deadline: Deadline | None = None,
+    ) -> SequenceAnalyzerResult:
+        """
+        Match content sequence of a video frame against the documents of several assets
+        (e.g. the slides and the paper of a talk), when the document shown in the frame is unknown.
+
+        The frame is OCRed once, and only the documents whose pages are the most similar
+        to the frame by page signatures (matching.multi_document_n_candidates) are searched.
+        The asset of the best match is given by asset_id of the result.
+        Results are not recorded in the match history nor in the result cache.
+
+        :returns: SequenceAnalyzerResult
+        """
+        config = Config.get_instance()
+        document_indexes: dict[str, DocumentIndex] = {}
+
+        for asset_id in asset_ids:
+            document_index = self.__get_document_index_data(asset_id)
+
+            if document_index is not None:
+                document_indexes[asset_id] = document_index
+
+        if len(document_indexes) == 0:
+            logger.debug("Found no document index data", asset_ids=asset_ids)
+            return SequenceAnalyzerResult(
+                content_sequence_matched=False,
+                content_matching_result=None,
+                document_available=False,
+                viewport_estimation_result=None,
+            )
+
+        if not self.__has_text(video_frame):
+            return SequenceAnalyzerResult(
+                content_sequence_matched=False,
+                content_matching_result=None,
+                document_available=True,
+                viewport_estimation_result=None,
+            )
+
+        multi_document_index = self.__get_multi_document_index(document_indexes)
+        deadline = deadline or Deadline()
+        # Matches found in the candidate documents: (asset_id, document_index, match_result)
+        found_matches: list[
+            tuple[str, DocumentIndex, FoundRelatedPage | FoundRelatedLine]
+        ] = []
+
+        def match_tier(video_frame_bin: "Image.Image", scale: float):
+            ocr_result_from_video_frame = self.__ocr.extract(
+                video_frame_bin,
+                "eng",
+                scale=scale,
+                timeout_sec=deadline.get_remaining_sec() if deadline.is_set() else None,
+            )
+
+            candidate_documents = multi_document_index.get_candidate_documents(
+                ocr_result_from_video_frame,
+                config.matching_multi_document_n_candidates,
+                config.matching_page_lsh_n_candidates,
+            )
+            best_match_result = None
+            best_score = None
+
+            for asset_id, candidate_page_ids in candidate_documents:
+                if deadline.is_expired():
+                    break
 
-                if content_matched:
-                    estimated_viewport = estimate_viewport_from_line(
-                        match_result=most_matching_line,
-                        doc_metadata=document_index.metadata,
-                        video_metadata=video_frame.metadata,
+                document_index = document_indexes[asset_id]
+
+                if document_index.metadata.doc_type == DocumentType.SLIDE:
+                    match_result = document_index.search_most_matching_page(
+                        ocr_result_from_video_frame,
+                        candidate_page_ids=candidate_page_ids,
+                        deadline=deadline,
+                    )
+                else:
+                    match_result = self.__search_most_matching_content(
+                        asset_id, document_index, ocr_result_from_video_frame, deadline
                     )
 
-                return SequenceAnalyzerResult(
-                    content_sequence_matched=content_matched,
-                    viewport_estimation_result=estimated_viewport,
-                    content_matching_result=most_matching_line,
-                    document_available=True,
+                if match_result is None:
+                    continue
+
+                found_matches.append((asset_id, document_index, match_result))
+                score = min(match_result.ngram_score, match_result.sq_match_score)
+
+                # Documents are given in order of similarity, and the earlier one wins a tie.
+                if best_score is None or score > best_score:
+                    best_match_result = match_result
+                    best_score = score
+
+            return best_match_result
+
+        match_result, interrupted = self.__match_ocr_cascade(
+            video_frame, deadline, match_tier
+        )
+
+        if match_result is None:
+            return SequenceAnalyzerResult(
+                content_sequence_matched=False,
+                content_matching_result=None,
+                document_available=True,
+                viewport_estimation_result=None,
+                partial=interrupted,
+            )
+
+        matched_asset_id, matched_document_index = next(
+            (asset_id, document_index)
+            for asset_id, document_index, found_match_result in found_matches
+            if found_match_result is match_result
+        )
+
+        return self.__create_result(
+            matched_document_index,
+            video_frame,
+            match_result,
+            interrupted,
+            asset_id=matched_asset_id,
+        )
+
+    def __match_content(
+        self,
+        asset_id: str,
+        document_index: DocumentIndex,
+        video_frame: VideoFrameImage,
+        deadline: Deadline,
+    ) -> SequenceAnalyzerResult:
+        if not self.__has_text(video_frame):
+            return SequenceAnalyzerResult(
+                content_sequence_matched=False,
+                content_matching_result=None,
+                document_available=True,
+                viewport_estimation_result=None,
+            )
+
+        def match_tier(video_frame_bin: "Image.Image", scale: float):
+            if self.__can_match_progressively(document_index):
+                return self.__match_progressively(
+                    document_index, video_frame_bin, scale, deadline
                 )
 
+            ocr_result_from_video_frame = self.__ocr.extract(
+                video_frame_bin,
+                "eng",
+                scale=scale,
+                timeout_sec=deadline.get_remaining_sec() if deadline.is_set() else None,
+            )
+            # print("\n OCR Result from video frame:")
+            # pprint.pprint(ocr_result_from_video_frame.data)
+
+            # Perform content matching on OCR result
+            return self.__search_most_matching_content(
+                asset_id, document_index, ocr_result_from_video_frame, deadline
+            )
+
+        match_result, interrupted = self.__match_ocr_cascade(
+            video_frame, deadline, match_tier
+        )
+
+        return self.__create_result(
+            document_index, video_frame, match_result, interrupted
+        )
+
+    def __match_ocr_cascade(
+        self,
+        video_frame: VideoFrameImage,
+        deadline: Deadline,
+        match_tier: Callable[
+            ["Image.Image", float], FoundRelatedPage | FoundRelatedLine | None
+        ],
+    ) -> tuple[FoundRelatedPage | FoundRelatedLine | None, bool]:
+        """
+        OCRs the video frame and matches it by match_tier(video_frame_bin, scale) for each scale tier,
+        and returns (match_result, interrupted), where interrupted is True if the deadline has passed.
+        match_tier() raises DeadlineExceeded if its OCR is aborted by the deadline.
+        """
+        config = Config.get_instance()
+        metrics = Metrics.get_instance()
+        scale_tiers = config.matching_ocr_scale_tiers or [1.0]
+        match_result = None
+        interrupted = False
+
+        # Resolution cascade: the frame is OCRed at the scales of the tiers in order,
+        # until a confident match is found (or any match at the last tier).
+        for i_tier, scale in enumerate(scale_tiers):
+            is_last_tier = i_tier == len(scale_tiers) - 1
+
+            # The match of the previous tier (if any) is the best one found so far.
+            if deadline.is_expired():
+                metrics.increment("deadline.ocr_skipped")
+                interrupted = True
+                break
+
+            metrics.increment(f"ocr_cascade.tier_{scale}.attempts")
+
+            video_frame_bin = (
+                video_frame
+                if scale == 1.0
+                else video_frame.resize(
+                    max(1, round(video_frame.metadata.width * scale)),
+                    max(1, round(video_frame.metadata.height * scale)),
+                )
+            ).get_binary()
+
+            # Perform OCR on binarized video frame image
+            # Positions are scaled back to the frame, so that the viewport estimation stays the same.
+            try:
+                tier_match_result = match_tier(video_frame_bin, scale)
+            except DeadlineExceeded:
+                metrics.increment("deadline.ocr_aborted")
+                interrupted = True
+                break
+
+            # Without a match of this tier before the deadline, the one of the previous tier is kept.
+            if tier_match_result is None and deadline.is_expired():
+                metrics.increment("deadline.search_interrupted")
+                interrupted = True
+                break
+
+            # The best match of all tiers is kept, so that a match of a smaller scale
+            # is not lost when the next tiers find nothing better.
+            if tier_match_result is not None and (
+                match_result is None
+                or get_match_score(tier_match_result) > get_match_score(match_result)
+            ):
+                match_result = tier_match_result
+
+            if tier_match_result is not None and tier_match_result.partial:
+                metrics.increment("deadline.search_interrupted")
+                # The partial match of this tier may be worse than the one kept.
+                interrupted = True
+                break
+
+            if tier_match_result is not None and (
+                is_last_tier
+                or get_match_score(tier_match_result)
+                >= config.matching_ocr_cascade_min_score
+            ):
+                metrics.increment(f"ocr_cascade.tier_{scale}.hits")
+                break
+
+        return match_result, interrupted
+
+    def __create_result(
+        self,
+        document_index: DocumentIndex,
+        video_frame: VideoFrameImage,
+        match_result: FoundRelatedPage | FoundRelatedLine | None,
+        interrupted: bool,
+        asset_id: str | None = None,
+    ) -> SequenceAnalyzerResult:
+        """Creates the result of the match in the document, with the estimated viewport."""
+        estimated_viewport = None
+        content_matched = match_result is not None
+
+        if isinstance(match_result, FoundRelatedPage):
+            estimated_viewport = estimate_viewport_from_page(
+                match_result=match_result,
+                doc_metadata=document_index.metadata,
+                video_metadata=video_frame.metadata,
+            )
+        elif isinstance(match_result, FoundRelatedLine):
+            estimated_viewport = estimate_viewport_from_line(
+                match_result=match_result,
+                doc_metadata=document_index.metadata,
+                video_metadata=video_frame.metadata,
+            )
+
+        return SequenceAnalyzerResult(
+            content_sequence_matched=content_matched,
+            viewport_estimation_result=estimated_viewport,
+            content_matching_result=match_result,
+            document_available=True,
+            partial=interrupted or (match_result is not None and match_result.partial),
+            asset_id=asset_id,
+        )
+
+    def __can_match_progressively(self, document_index: DocumentIndex) -> bool:
+        """
+        Returns True if progressive OCR is enabled and the page search can read the lines
+        of the frame from the top: slides without candidate pages by page signatures,
+        which are not served from the store.
+        Documents are not matched progressively, since their line search would run again
+        over all lines read so far for every band.
+        """
+        config = Config.get_instance()
+
+        return (
+            config.matching_progressive_ocr_enabled
+            and document_index.metadata.doc_type == DocumentType.SLIDE
+            and not isinstance(document_index, StoredDocumentIndex)
+            and not (
+                config.matching_page_lsh_enabled
+                and document_index.metadata.n_pages
+                >= config.matching_page_lsh_min_pages
+            )
+        )
+
+    def __match_progressively(
+        self,
+        document_index: DocumentIndex,
+        video_frame_bin: "Image.Image",
+        scale: float,
+        deadline: Deadline,
+    ) -> FoundRelatedPage | None:
+        """
+        OCRs the frame of a slide in horizontal bands from the top,
+        only until the page search finds a unique page, which the lines below cannot change.
+        """
+        config = Config.get_instance()
+        metrics = Metrics.get_instance()
+
+        band_ocr = BandOCR(
+            self.__ocr,
+            video_frame_bin,
+            scale,
+            max(1, round(config.matching_progressive_ocr_band_height * scale)),
+            round(config.matching_progressive_ocr_band_overlap * scale),
+            deadline,
+        )
+
+        # The page search reads the lines (and OCRs the bands) only until a unique page is found.
+        match_result = document_index.search_most_matching_page(
+            band_ocr, deadline=deadline
+        )
+
+        metrics.increment("progressive_ocr.frames")
+        metrics.increment("progressive_ocr.bands", band_ocr.n_bands_ocred)
+        metrics.increment(
+            "progressive_ocr.bands_skipped",
+            len(band_ocr.bands) - band_ocr.n_bands_ocred,
+        )
+
+        # The lines below the last band OCRed in time have not been searched.
+        if band_ocr.interrupted:
+            metrics.increment("deadline.ocr_aborted")
+
+            if match_result is not None:
+                match_result.partial = True
+
+        return match_result
+
+    def __has_text(self, video_frame: VideoFrameImage) -> bool:
+        """
+        Returns False if the no-text filter is enabled and finds no text lines in the frame,
+        so that OCR of the frame can be skipped.
+        """
+        config = Config.get_instance()
+
+        if not config.matching_no_text_filter_enabled:
+            return True
+
+        metrics = Metrics.get_instance()
+        metrics.increment("no_text_filter.checked")
+
+        if has_text(
+            video_frame.get_binary(),
+            min_text_lines=config.matching_no_text_filter_min_text_lines,
+            min_row_transitions=config.matching_no_text_filter_min_row_transitions,
+        ):
+            return True
+
+        metrics.increment("no_text_filter.skipped")
+        return False
+
+    def __search_most_matching_content(
+        self,
+        asset_id: str,
+        document_index: DocumentIndex,
+        ocr_result_from_video_frame: OCRResult,
+        deadline: Deadline | None = None,
+    ) -> FoundRelatedPage | FoundRelatedLine | None:
+        match document_index.metadata.doc_type:
+            case DocumentType.SLIDE:
+                return document_index.search_most_matching_page(
+                    ocr_result_from_video_frame,
+                    candidate_page_ids=self.__get_candidate_pages(
+                        document_index, ocr_result_from_video_frame
+                    ),
+                    deadline=deadline,
+                )
+
+            case DocumentType.DOCUMENT:
+                sharded_line_matcher = self.__acquire_sharded_line_matcher(
+                    asset_id, document_index
+                )
+
+                try:
+                    return document_index.search_most_matching_line(
+                        ocr_result_from_video_frame,
+                        line_aligner=sharded_line_matcher,
+                        deadline=deadline,
+                    )
+                finally:
+                    if sharded_line_matcher is not None:
+                        sharded_line_matcher.release()
+
         raise ValueError(
             f"[SequenceAnalyzer] Doctype must be either 'SLIDE' or 'DOCUMENT' of DocumentType class, but got {document_index.metadata.doc_type}"
         )
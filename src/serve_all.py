@@ -0,0 +1,104 @@
+import signal
+import asyncio
+import threading
+from http.server import HTTPServer
+
+from websockets.server import serve
+
+import serve_file_explorer
+import serve_pdf_analyzer
+import serve_pdf_receiver
+import serve_sequence_analyzer
+import serve_sequence_analyzer_stream
+from document_index_pool import DocumentIndexPool
+from server.http_local_web_server import HTTPLocalWebServer
+from util.config import Config
+from util.log import setup_logging
+
+# Runs all services in one process, so that they share Config, loaded document indexes
+# (DocumentIndexPool) and OCR, and a new document index is visible to the sequence analyzer at once.
+#
+# The PDF analyzer and the sequence analyzer stream (WebSocket) are served on the asyncio event loop,
+# and the HTTP services are served by their servers in threads driven by the loop.
+
+
+def create_http_servers(config: Config) -> dict[str, HTTPServer]:
+    """Creates the HTTP servers of the services: name -> server."""
+    return {
+        "SequenceAnalyzerService": HTTPLocalWebServer(
+            config.port_sequence_analyzer
+        ).create_server(
+            serve_sequence_analyzer.HttpPostHandler,
+            threaded=serve_sequence_analyzer.is_threaded(config),
+        ),
+        "PdfReceiverService": HTTPLocalWebServer(
+            config.port_pdf_receiver
+        ).create_server(serve_pdf_receiver.HttpPostHandler),
+        "FileExplorerService": HTTPLocalWebServer(
+            config.port_file_explorer
+        ).create_server(serve_file_explorer.HttpPostHandler),
+    }
+
+
+async def main():
+    setup_logging()
+    config = Config()
+    loop = asyncio.get_running_loop()
+
+    stop = loop.create_future()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.cancel)
+
+    http_servers = create_http_servers(config)
+    http_threads = [
+        threading.Thread(target=server.serve_forever, name=name, daemon=True)
+        for name, server in http_servers.items()
+    ]
+
+    for thread in http_threads:
+        thread.start()
+
+    # The servers accept requests while the indexes are being loaded.
+    DocumentIndexPool.get_instance().prewarm(
+        config.sequence_analyzer_prewarm_n_recent_assets
+    )
+
+    async with serve(
+        serve_pdf_analyzer.run_pdf_analyzer, config.host, config.port_pdf_analyzer
+    ), serve(
+        serve_sequence_analyzer_stream.run_sequence_analyzer_stream,
+        config.host,
+        config.port_sequence_analyzer_stream,
+    ):
+        print("\n\n###############################################")
+        print("\n\nServing all services in one process:")
+        for name, server in http_servers.items():
+            print(f"  {name} at {server.server_address}")
+        print(f"  PDFAnalyzerService at {(config.host, config.port_pdf_analyzer)}")
+        print(
+            f"  SequenceAnalyzerStreamService at {(config.host, config.port_sequence_analyzer_stream)}\n\n"
+        )
+        print("###############################################\n\n")
+
+        try:
+            await stop
+        except asyncio.CancelledError:
+            pass
+
+    print("\n[ServiceHost] Shutting down.")
+
+    # shutdown() blocks until serve_forever() returns, so it is called off the event loop.
+    await asyncio.gather(
+        *(asyncio.to_thread(server.shutdown) for server in http_servers.values())
+    )
+    for server in http_servers.values():
+        server.server_close()
+
+    await asyncio.to_thread(serve_pdf_receiver.shutdown)
+    await asyncio.to_thread(
+        serve_sequence_analyzer.HttpPostHandler.shutdown_shared_instances
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,73 +1,135 @@
 # import sys
 import os
+from urllib.parse import urlparse, unquote
 from server.http_local_web_server import HTTPLocalWebServer
 from server.http_post_handler_base import HttpPostHandlerBase
 
+from asset_catalog import AssetCatalog, AssetCatalogEntry
+from util.asset import Asset
 from util.config import Config
-from util.paths import path_dir_data_base
 from util.base_class import JSONSerializableData
+from util.log import get_logger, setup_logging
+
+logger = get_logger("FileExplorerService")
+
+# The catalog is shared by requests and re-scans the data directories only when needed.
+asset_catalog = AssetCatalog(Config().file_explorer_catalog_refresh_interval_sec)
+
+# Content types of the files of image pyramids: extension -> content type
+PYRAMID_CONTENT_TYPES = {
+    ".dzi": "application/xml",
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+}
 
 
 class SwapVidBackendFileExplorerResponse(JSONSerializableData):
     pdf_files: list[str]
     index_files: list[str]
-
-    def __init__(self, pdf_files: list[str], index_files: list[str]):
+    assets: list[AssetCatalogEntry]
+
+    def __init__(
+        self,
+        pdf_files: list[str],
+        index_files: list[str],
+        assets: list[AssetCatalogEntry],
+    ):
         self.pdf_files = pdf_files
         self.index_files = index_files
+        self.assets = assets
 
     def to_json_serializable(self):
-        return {"pdf_files": self.pdf_files, "index_files": self.index_files}
+        return {
+            "pdf_files": self.pdf_files,
+            "index_files": self.index_files,
+            "assets": [asset.to_json_serializable() for asset in self.assets],
+        }
 
 
 class HttpPostHandler(HttpPostHandlerBase):
     def __init__(self, *args, **kwargs):
-        self.SYSTEM_FILES = [".DS_Store"]
-
         super().__init__(*args, **kwargs)
 
-    def __filter_system_files(self, files: list[str]) -> list[str]:
-        return list(filter(lambda f: f not in self.SYSTEM_FILES, files))
-
-    def __get_files_in_pdf_dir(self):
-        try:
-            return os.listdir(os.path.join(path_dir_data_base, "pdf"))
-        except:
-            print("[FileExplorerService] Folder '.data/pdf' not found.")
-            return []
+    def do_GET(self):
+        logger.debug("Request received", path=self.path)
 
-    def __get_files_in_document_index_dir(self):
-        try:
-            return os.listdir(os.path.join(path_dir_data_base, "document_index"))
-        except:
-            print("[FileExplorerService] Folder '.data/document_index' not found.")
-            return []
+        # Files of image pyramids: "/pyramid/ASSET_ID.dzi", "/pyramid/ASSET_ID_files/LEVEL/COL_ROW.jpg"
+        path = unquote(urlparse(self.path).path)
+        if path.startswith("/pyramid/"):
+            self.__send_pyramid_file(path.removeprefix("/pyramid/"))
+            return
 
-    def do_GET(self):
-        print(f"\n\n[FileExplorerService] New request received at {self.path}:")
+        snapshot = asset_catalog.get_snapshot()
 
-        pdf_files = self.__get_files_in_pdf_dir()
-        index_files = self.__get_files_in_document_index_dir()
+        if self.is_not_modified(snapshot.etag):
+            self.send_not_modified_res(snapshot.etag, self.headers["Origin"])
+            return
 
         response_data = SwapVidBackendFileExplorerResponse(
-            pdf_files=self.__filter_system_files(pdf_files),
-            index_files=self.__filter_system_files(index_files),
+            pdf_files=snapshot.pdf_files,
+            index_files=snapshot.index_files,
+            assets=snapshot.assets,
         )
 
         body_content = response_data.to_json_serializable()
-        self.send_ok_res(body_content, self.headers["Origin"])
+        self.send_ok_res(
+            body_content,
+            self.headers["Origin"],
+            headers={
+                "ETag": snapshot.etag,
+                "Cache-Control": "no-cache",
+                "Access-Control-Expose-Headers": "ETag",
+            },
+        )
+
+    def __send_pyramid_file(self, relpath: str):
+        dirpath_pyramid = os.path.realpath(Asset.get_dirpath_pdf_pyramid())
+        path = os.path.realpath(os.path.join(dirpath_pyramid, relpath))
+        content_type = PYRAMID_CONTENT_TYPES.get(os.path.splitext(path)[1])
+
+        if (
+            not path.startswith(dirpath_pyramid + os.sep)
+            or content_type is None
+            or not os.path.isfile(path)
+        ):
+            self.send_error_res(
+                status_code=404,
+                error_type="not_found",
+                error_content=f"{relpath} is not found.",
+            )
+            return
+
+        # Tiles are replaced when the document is indexed again.
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+        if self.is_not_modified(etag):
+            self.send_not_modified_res(etag, self.headers["Origin"])
+            return
+
+        self.send_file_res(
+            path,
+            content_type,
+            self.headers["Origin"],
+            headers={
+                "ETag": etag,
+                "Cache-Control": "no-cache",
+                "Access-Control-Expose-Headers": "ETag",
+            },
+        )
 
     # Handle preflight request caused by the cors problem
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header("Content-Type", "application/pdf")
         self.send_header("Access-Control-Allow-Origin", self.headers["Origin"])
-        self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, If-None-Match")
         self.end_headers()
 
 
 def main():
+    setup_logging()
     PORT = Config().port_file_explorer
     server = HTTPLocalWebServer(PORT)
     server.listen(HttpPostHandler)
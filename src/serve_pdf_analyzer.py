@@ -1,19 +1,22 @@
 import asyncio
 import os
-
+from urllib.parse import parse_qs
 
 from websockets.server import serve
 from document_pdf import DocumentPDF
 from util.config import Config
 from util.asset import Asset
+from util.log import get_logger, setup_logging
+
+logger = get_logger("PDFAnalyzerService")
 
 
 # Start message protocol:
-# "run=ASSET_ID&i_page_start=I_PAGE_START&i_page_end=I_PAGE_END"
+# "run=ASSET_ID&i_page_start=I_PAGE_START&i_page_end=I_PAGE_END&profile=1"
 def parse_start_message(message: str):
     # queries = message.split("&")
     # start_query = queries[0] if len(queries) > 0 else queries
-    target_asset_id = message.split("=")[1]
+    target_asset_id = message.split("&")[0].split("=")[1]
 
     i_page_start: int | None = None
     i_page_end: int | None = None
@@ -27,6 +30,12 @@ def parse_start_message(message: str):
     return target_asset_id, i_page_start, i_page_end
 
 
+def parse_profile_flag(message: str):
+    """Returns True if the start message asks for profiling of the indexing job."""
+    profile_values = parse_qs(message).get("profile", [])
+    return len(profile_values) > 0 and profile_values[0] in ("1", "true")
+
+
 def generate_progress_message(progress: float):
     return f"progress={progress}"
 
@@ -41,11 +50,11 @@ def generate_error_message(message: str):
 
 async def run_pdf_analyzer(websocket):
     async for message in websocket:
-        print("[PDFAnalyzerService] Running pdf analyzer main.")
-        print(f"[PDFAnalyzerService] Received message: {message}")
+        logger.info("Received message", message=message)
 
         if "run" in message:
-            (asset_id, i_page_start, i_page_end) = parse_start_message(message)
+            asset_id, i_page_start, i_page_end = parse_start_message(message)
+            profile = parse_profile_flag(message)
 
             dindex_cache_exists = os.path.exists(
                 Asset.get_path_document_index(asset_id)
@@ -54,13 +63,13 @@ async def run_pdf_analyzer(websocket):
 
             # Needs PDF to run
             if not pdf_exists:
-                print("[PDFAnalyzerService] PDF file does not exist. Skipping...")
+                logger.info("PDF file does not exist. Skipping", asset_id=asset_id)
                 return await websocket.send("PDF file does not exist. Skipping...")
 
             # Skip to run if document index cache already exists
             if dindex_cache_exists:
-                print(
-                    "[PDFAnalyzerService] Document index cache already exists. Skipping..."
+                logger.info(
+                    "Document index cache already exists. Skipping", asset_id=asset_id
                 )
                 return await websocket.send(
                     "Document index cache already exists. Skipping..."
@@ -72,16 +81,23 @@ async def run_pdf_analyzer(websocket):
             async def progress_handler(progress):
                 await websocket.send(f"progress={progress}")
 
-            await DocumentPDF(
-                asset_id, Config().path_poppler_exe
-            ).generate_document_index_data(
-                websocket,
-                Asset.get_dirpath_document_index(),
-                Config().path_tesseract_ocr_exe,
-                page_start=i_page_start,
-                page_end=i_page_end,
-                progress_callback_async=progress_handler,
-            )
+            try:
+                await DocumentPDF(
+                    asset_id, Config().path_poppler_exe
+                ).generate_document_index_data(
+                    websocket,
+                    Asset.get_dirpath_document_index(),
+                    Config().path_tesseract_ocr_exe,
+                    page_start=i_page_start,
+                    page_end=i_page_end,
+                    progress_callback_async=progress_handler,
+                    force_profiling=profile,
+                )
+            except ValueError as err:
+                # e.g. the page range has no pages
+                logger.warning("Failed to index the PDF", asset_id=asset_id, error=err)
+                await websocket.send(generate_error_message(str(err)))
+                return await websocket.close()
 
             await websocket.send(generate_success_message())
 
@@ -96,6 +112,7 @@ async def run_pdf_analyzer(websocket):
 
 
 async def main():
+    setup_logging()
     HOST = Config().host
     PORT = Config().port_pdf_analyzer
 
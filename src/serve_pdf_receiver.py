@@ -1,11 +1,106 @@
 # import sys
 import os
-import pprint
+import json
+import asyncio
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from server.http_local_web_server import HTTPLocalWebServer
 from server.http_post_handler_base import HttpPostHandlerBase
+from document_pdf import DocumentPDF
+from document_index_pool import DocumentIndexPool
 from util.asset import Asset
 from util.config import Config
+from util.pdf_hash_registry import PdfHashRegistry
+from util.log import get_logger, setup_logging
+
+logger = get_logger("PdfReceiverService")
+
+# Indexing jobs enqueued by received PDFs are run one by one in the background.
+indexing_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def run_indexing(asset_id: str):
+    """Generates the document index of the asset."""
+    logger.info("Indexing in background", asset_id=asset_id)
+
+    try:
+        asyncio.run(
+            DocumentPDF(
+                asset_id, Config().path_poppler_exe
+            ).generate_document_index_data(
+                None,
+                Asset.get_dirpath_document_index(),
+                Config().path_tesseract_ocr_exe,
+            )
+        )
+        logger.info("Indexing finished", asset_id=asset_id)
+
+    except Exception as err:
+        logger.exception("Indexing failed", asset_id=asset_id)
+
+
+def link_document_index(src_asset_id: str, dst_asset_id: str):
+    """
+    Makes the document index of src_asset_id available as the one of dst_asset_id.
+
+    A new index file is written for dst_asset_id (instead of a hard link or a copy),
+    so that its asset_id is the destination, and it is newer than the PDF just received.
+    """
+    path_dst = Asset.get_path_document_index(dst_asset_id)
+
+    with open(Asset.get_path_document_index(src_asset_id), encoding="utf-8") as fp:
+        index_data = json.load(fp)
+
+    index_data["metadata"]["asset_id"] = dst_asset_id
+
+    # Write to a temporary file and rename it, as DocumentPDF does.
+    path_tmp = f"{path_dst}.tmp"
+    with open(path_tmp, "w", encoding="utf-8") as fp:
+        json.dump(index_data, fp)
+    os.replace(path_tmp, path_dst)
+
+
+def update_document_index(asset_id: str, sha256: str, auto_index: bool):
+    """
+    Links or enqueues the document index of the received PDF.
+
+    :returns: "exists", "linked", "queued" or "none"
+    """
+    registry = PdfHashRegistry.get_instance()
+    path_index = Asset.get_path_document_index(asset_id)
+    prev_sha256 = registry.get_hash(asset_id)
+
+    registry.register(asset_id, sha256)
+
+    if os.path.exists(path_index):
+        if prev_sha256 is None or prev_sha256 == sha256:
+            return "exists"
+
+        # The index was generated from the previous content of the PDF.
+        logger.info("Removing outdated index", asset_id=asset_id)
+        os.remove(path_index)
+        DocumentIndexPool.get_instance().invalidate(asset_id)
+
+    indexed_asset_id = registry.find_indexed_asset(sha256, exclude_asset_id=asset_id)
+
+    if indexed_asset_id is not None:
+        logger.info(
+            "Same PDF as an indexed asset. Linking its document index",
+            asset_id=asset_id,
+            indexed_asset_id=indexed_asset_id,
+        )
+        os.makedirs(Asset.get_dirpath_document_index(), exist_ok=True)
+        link_document_index(indexed_asset_id, asset_id)
+        DocumentIndexPool.get_instance().invalidate(asset_id)
+        return "linked"
+
+    if auto_index:
+        indexing_executor.submit(run_indexing, asset_id)
+        return "queued"
+
+    return "none"
 
 
 class HttpPostHandler(HttpPostHandlerBase):
@@ -13,20 +108,50 @@ class HttpPostHandler(HttpPostHandlerBase):
         super().__init__(*args, **kwargs)
 
     def do_POST(self):
-        print(f"\n\n[PdfReceiverService] New request received at {self.path}:")
+        logger.debug("Request received", path=self.path)
 
         filename = self.path.split("/")[-1]
-        filedata_bin = self.get_body_content_raw()
+        config = Config()
 
         output_dir = Asset.get_dirpath_pdf_src()
         os.makedirs(output_dir, exist_ok=True)
-
         output_path = os.path.join(output_dir, f"{filename}.pdf")
-        with open(output_path, "wb") as fp:
-            print(f"\n[PdfReceiverService] Writting received PDF to {output_path}")
-            fp.write(filedata_bin)
 
-        self.send_ok_res(None, self.headers["Origin"])
+        # Stream the body to a temporary file in the same directory, hashing it on the fly,
+        # and rename it at the end so that a partially received PDF is never visible.
+        sha256 = hashlib.sha256()
+        fd_tmp, path_tmp = tempfile.mkstemp(dir=output_dir, suffix=".pdf.part")
+
+        try:
+            with os.fdopen(fd_tmp, "wb") as fp:
+                for chunk in self.iter_body_content_chunks(
+                    config.pdf_receiver_chunk_size
+                ):
+                    sha256.update(chunk)
+                    fp.write(chunk)
+
+            logger.info("Writing received PDF", path=output_path)
+            os.chmod(
+                path_tmp, 0o644
+            )  # mkstemp() creates the file as readable only by owner
+            os.replace(path_tmp, output_path)
+
+        except BaseException:
+            os.remove(path_tmp)
+            raise
+
+        index_status = update_document_index(
+            filename, sha256.hexdigest(), config.pdf_receiver_auto_index
+        )
+
+        self.send_ok_res(
+            {
+                "asset_id": filename,
+                "sha256": sha256.hexdigest(),
+                "index_status": index_status,
+            },
+            self.headers["Origin"],
+        )
 
     # Handle preflight request caused by the cors problem
     def do_OPTIONS(self):
@@ -38,7 +163,13 @@ class HttpPostHandler(HttpPostHandlerBase):
         self.end_headers()
 
 
+def shutdown():
+    """Waits for the indexing jobs in progress, and cancels the queued ones."""
+    indexing_executor.shutdown(wait=True, cancel_futures=True)
+
+
 def main():
+    setup_logging()
     PORT = Config().port_pdf_receiver
     server = HTTPLocalWebServer(PORT)
     server.listen(HttpPostHandler)
@@ -1,14 +1,45 @@
-import pprint
+import os
+import json
+import math
+import threading
 from dataclasses import dataclass
+from urllib.parse import urlparse
 
 from server.http_local_web_server import HTTPLocalWebServer
 from server.http_post_handler_base import HttpPostHandlerBase, ResponseBodyContent
 from sequence_analyzer import (
     SequenceAnalyzer,
     SequenceAnalyzerResult,
+    SequenceAnalyzerBatchResult,
 )
+from match_history import MatchHistoryStore
+from result_cache import ResultCache
+from document_index_pool import DocumentIndexPool
 from video_frame import VideoFrameImage
+from util.asset import Asset
 from util.config import Config
+from util.metrics import Metrics
+from util.profiling import Profiler
+from util.deadline import Deadline
+from util.coalescer import RequestCoalescer
+from util.admission import AdmissionController, Overloaded, Superseded
+from util.log import get_logger, setup_logging
+
+# Request header to identify a client (e.g. a viewer tab), whose newer frame supersedes its pending one.
+HEADER_CLIENT_ID = "X-SwapVid-Client-Id"
+
+logger = get_logger("SequenceAnalyzerService")
+
+
+def is_threaded(config: Config) -> bool:
+    """
+    Returns True if requests are handled in threads.
+    Admission control turns threading on, since a server handling one request at a time
+    never has a frame to supersede or to reject, and stale frames wait in the socket backlog instead.
+    """
+    return (
+        config.sequence_analyzer_threaded or config.sequence_analyzer_admission_enabled
+    )
 
 
 @dataclass
@@ -21,10 +52,17 @@ class SequenceAnalyzerApiResponse(ResponseBodyContent):
     matched_content_doc: str | None
     score_ngram: int | None
     score_sqmatch: int | None
+    partial: bool
+    matched_asset_id: str | None
 
     @staticmethod
-    def from_sequence_analyzer_result(result: SequenceAnalyzerResult):
-        """A factory method to create from a SequenceAnalyzerResult object."""
+    def from_sequence_analyzer_result(
+        result: SequenceAnalyzerResult, asset_id: str | None = None
+    ):
+        """
+        A factory method to create from a SequenceAnalyzerResult object.
+        asset_id is the matched asset of a result of a single asset.
+        """
 
         if result.content_matching_result is None:
             return SequenceAnalyzerApiResponse(
@@ -34,6 +72,8 @@ class SequenceAnalyzerApiResponse(ResponseBodyContent):
                 matched_content_doc=None,
                 score_ngram=None,
                 score_sqmatch=None,
+                partial=result.partial,
+                matched_asset_id=None,
             )
 
         return SequenceAnalyzerApiResponse(
@@ -43,6 +83,66 @@ class SequenceAnalyzerApiResponse(ResponseBodyContent):
             matched_content_doc=result.content_matching_result.match_src_from_index.content,
             score_ngram=result.content_matching_result.ngram_score,
             score_sqmatch=result.content_matching_result.sq_match_score,
+            partial=result.partial,
+            matched_asset_id=result.asset_id or asset_id,
+        )
+
+    def to_json_serializable(self):
+        return self.__dict__
+
+
+@dataclass
+class SequenceAnalyzerBatchApiResponse(ResponseBodyContent):
+    """
+    Represents data for response body content of a batch request.
+
+    Values of the frames are in columns (lists of length n_frames, None for frames without matched content),
+    and estimated_viewport has columns left, top, right and bottom relative to the document size.
+    """
+
+    document_available: bool
+    n_frames: int
+    estimated_viewport: dict[str, list[float | None]]
+    matched_content_vf: list[str | None]
+    matched_content_doc: list[str | None]
+    score_ngram: list[float | None]
+    score_sqmatch: list[float | None]
+
+    @staticmethod
+    def from_sequence_analyzer_batch_result(result: SequenceAnalyzerBatchResult):
+        """A factory method to create from a SequenceAnalyzerBatchResult object."""
+        match_results = result.content_matching_results
+        n_frames = len(match_results)
+        viewports = result.get_relative_viewports()
+
+        def get_column(get_value):
+            return [
+                get_value(match_result) if match_result is not None else None
+                for match_result in match_results
+            ]
+
+        return SequenceAnalyzerBatchApiResponse(
+            document_available=result.document_available,
+            n_frames=n_frames,
+            estimated_viewport={
+                key: (
+                    [
+                        None if math.isnan(value) else value
+                        for value in viewports[:, i].tolist()
+                    ]
+                    if viewports is not None
+                    else [None] * n_frames
+                )
+                for i, key in enumerate(["left", "top", "right", "bottom"])
+            },
+            matched_content_vf=get_column(
+                lambda match_result: match_result.match_src_from_video_frame.content
+            ),
+            matched_content_doc=get_column(
+                lambda match_result: match_result.match_src_from_index.content
+            ),
+            score_ngram=get_column(lambda match_result: match_result.ngram_score),
+            score_sqmatch=get_column(lambda match_result: match_result.sq_match_score),
         )
 
     def to_json_serializable(self):
@@ -50,46 +150,313 @@ class SequenceAnalyzerApiResponse(ResponseBodyContent):
 
 
 class HttpPostHandler(HttpPostHandlerBase):
+    # Shared by all requests (and threads), to reuse loaded document indexes
+    # and the results of identical requests in flight.
+    __sqa: SequenceAnalyzer | None = None
+    __coalescer: RequestCoalescer | None = None
+    __admission: AdmissionController | None = None
+    __result_cache: ResultCache | None = None
+    __shared_instances_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         self.__config = Config.get_instance()
+        self.__init_shared_instances(self.__config)
+
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def __init_shared_instances(cls, config: Config):
+        with cls.__shared_instances_lock:
+            if cls.__result_cache is None and config.result_cache_enabled:
+                path_result_cache = Asset.get_path_result_cache()
+                os.makedirs(os.path.dirname(path_result_cache), exist_ok=True)
+                cls.__result_cache = ResultCache(
+                    path_result_cache,
+                    int(config.result_cache_max_size_mb * 1024 * 1024),
+                )
+
+            if cls.__sqa is None:
+                cls.__sqa = SequenceAnalyzer(
+                    config.path_tesseract_ocr_exe,
+                    match_history_store=(
+                        MatchHistoryStore(
+                            config.sequence_analyzer_match_history_max_gap_sec,
+                            config.sequence_analyzer_match_history_save_interval_sec,
+                            config.sequence_analyzer_match_history_max_histories,
+                        )
+                        if config.sequence_analyzer_match_history_enabled
+                        else None
+                    ),
+                    result_cache=cls.__result_cache,
+                )
+
+            if cls.__coalescer is None and config.sequence_analyzer_coalescing_enabled:
+                cls.__coalescer = RequestCoalescer(
+                    config.sequence_analyzer_coalescing_ttl_sec
+                )
+
+            if cls.__admission is None and config.sequence_analyzer_admission_enabled:
+                cls.__admission = AdmissionController(
+                    config.sequence_analyzer_admission_max_queue_depth,
+                    config.sequence_analyzer_admission_retry_after_sec,
+                )
+
+    @classmethod
+    def get_shared_sequence_analyzer(cls) -> SequenceAnalyzer:
+        """Returns the SequenceAnalyzer shared by the requests, and by the streaming sessions."""
+        cls.__init_shared_instances(Config.get_instance())
+        return cls.__sqa
+
+    @classmethod
+    def get_shared_admission_controller(cls) -> AdmissionController | None:
+        """Returns the AdmissionController shared by the requests and the streaming sessions (None if disabled)."""
+        cls.__init_shared_instances(Config.get_instance())
+        return cls.__admission
+
+    @classmethod
+    def shutdown_shared_instances(cls):
+        """Shuts down the shared SequenceAnalyzer, if it has been started."""
+        with cls.__shared_instances_lock:
+            if cls.__sqa is not None:
+                cls.__sqa.shutdown()
+
+    def __get_playback_position(self):
+        """Returns (video_id, playback_time_sec) of the frame given by the request queries."""
+        queries = self.get_parsed_queries()
+        video_id = queries.get("video_id", [None])[0]
+
+        try:
+            playback_time_sec = float(queries["t"][0])
+        except (KeyError, ValueError):
+            playback_time_sec = None
+
+        return video_id, playback_time_sec
+
+    def __get_client_key(self) -> str | None:
+        """
+        Returns the key of the client given by the header, or None.
+        Clients are not identified by their address, which viewers behind a NAT or a proxy share.
+        """
+        return self.headers[HEADER_CLIENT_ID]
+
+    def __send_not_admitted_res(self, err: Overloaded | Superseded):
+        headers = {"Access-Control-Allow-Origin": self.headers["Origin"]}
 
-        self.__sqa = SequenceAnalyzer(
-            self.__config.path_tesseract_ocr_exe,
+        if isinstance(err, Superseded):
+            self.send_error_res(
+                status_code=409,
+                error_type="superseded",
+                error_content="A newer frame of the client has arrived.",
+                headers=headers,
+            )
+            return
+
+        self.send_error_res(
+            status_code=503,
+            error_type="overloaded",
+            error_content=str(err),
+            headers={
+                **headers,
+                "Retry-After": str(math.ceil(err.retry_after_sec)),
+                "Access-Control-Expose-Headers": "Retry-After",
+            },
         )
 
-        super().__init__(*args, **kwargs)
+    def do_GET(self):
+        if urlparse(self.path).path != "/metrics":
+            self.send_error_res(
+                status_code=404,
+                error_type="not_found",
+                error_content=f"{self.path} is not found.",
+            )
+            return
+
+        coalescer_stats = None
+        if self.__coalescer is not None:
+            coalescer_stats = {
+                "n_calls": self.__coalescer.n_calls,
+                "n_coalesced": self.__coalescer.n_coalesced,
+                "n_cache_hits": self.__coalescer.n_cache_hits,
+            }
+
+        self.send_ok_res(
+            {
+                "counters": Metrics.get_instance().to_json_serializable(),
+                "ocr_cascade": SequenceAnalyzer.get_ocr_cascade_stats(),
+                "coalescer": coalescer_stats,
+                "result_cache": (
+                    self.__result_cache.get_stats()
+                    if self.__result_cache is not None
+                    else None
+                ),
+                "admission": (
+                    {"queue_depth": self.__admission.get_queue_depth()}
+                    if self.__admission is not None
+                    else None
+                ),
+            },
+            self.headers["Origin"],
+        )
 
     def do_POST(self):
         # try:
 
-        print(f"\n\n\n[SequenceAnalyzerService] New request received at {self.path}:")
-        request_origin = self.headers["Origin"]
-        print(
-            f"\n[SequenceAnalyzerService] Current request: Protocol Version={self.protocol_version}, Client Address={self.client_address}, Request Origin={request_origin}"
+        # The deadline of the request counts from its arrival.
+        deadline = Deadline.from_request_headers(
+            self.headers, self.__config.sequence_analyzer_deadline_ms
+        )
+
+        logger.debug(
+            "Request received",
+            path=self.path,
+            protocol_version=self.protocol_version,
+            client_address=self.client_address,
+            origin=self.headers["Origin"],
         )
 
-        asset_id = self.path.split("/")[-1]
+        # Request path: "/ASSET_ID?video_id=VIDEO_ID&t=PLAYBACK_TIME_SEC" (queries are optional),
+        # "/ASSET_ID,ASSET_ID,..." for a frame of any of the assets,
+        # or "/batch/ASSET_ID" for a batch of frames.
+        path_parts = urlparse(self.path).path.split("/")
+        asset_id = path_parts[-1]
 
+        if len(path_parts) >= 3 and path_parts[-2] == "batch":
+            self.__handle_batch(asset_id)
+            return
+
+        video_id, playback_time_sec = self.__get_playback_position()
+        # The body is read in any case, to answer a dropped frame on a clean connection.
         body_content_dataurl_str = self.get_body_content_str()
-        video_frame = VideoFrameImage.from_dataurl(body_content_dataurl_str).resize(
-            1280, 720
-        )
 
-        result = self.__sqa.match_content_sequence(
-            asset_id=asset_id,
-            video_frame=video_frame,
-        )
+        def handle_frame():
+            self.__handle_frame(
+                asset_id,
+                video_id,
+                playback_time_sec,
+                body_content_dataurl_str,
+                deadline,
+            )
 
-        res_data = SequenceAnalyzerApiResponse.from_sequence_analyzer_result(result)
+        if self.__admission is None:
+            handle_frame()
+            return
+
+        # A frame is analyzed only in its turn among the frames of the client,
+        # and dropped if a newer frame of the client arrives meanwhile.
+        try:
+            with self.__admission.admit(self.__get_client_key()):
+                handle_frame()
+        except (Overloaded, Superseded) as err:
+            self.__send_not_admitted_res(err)
+
+    def __handle_frame(
+        self,
+        asset_id: str,
+        video_id: str | None,
+        playback_time_sec: float | None,
+        body_content_dataurl_str: str,
+        deadline: Deadline,
+    ):
+        """Matches the frame given as a data URL."""
+        profiler = Profiler.get_instance()
+
+        with profiler.profile(
+            "sequence_analyzer",
+            asset_id,
+            force=profiler.is_requested_by_header(self.headers),
+        ):
+            video_frame = VideoFrameImage.from_dataurl(body_content_dataurl_str).resize(
+                1280, 720
+            )
+
+            def analyze():
+                if "," in asset_id:
+                    return self.__sqa.match_content_sequence_multi(
+                        asset_ids=asset_id.split(","),
+                        video_frame=video_frame,
+                        deadline=deadline,
+                    )
+
+                return self.__sqa.match_content_sequence(
+                    asset_id=asset_id,
+                    video_frame=video_frame,
+                    video_id=video_id,
+                    playback_time_sec=playback_time_sec,
+                    deadline=deadline,
+                )
+
+            # Requests with a deadline are not coalesced, since one with more time left
+            # would get the partial result of another one.
+            if self.__coalescer is None or deadline.is_set():
+                result = analyze()
+            else:
+                # Near-identical frames of the same asset and video from different clients
+                # share one OCR and matching (the video selects the match history).
+                result = self.__coalescer.run(
+                    (asset_id, video_id, video_frame.get_fingerprint()),
+                    analyze,
+                    is_cacheable=lambda result: not result.partial,
+                )
+
+        res_data = SequenceAnalyzerApiResponse.from_sequence_analyzer_result(
+            result, asset_id
+        )
         res_data_dict = res_data.to_json_serializable()
 
         if result.content_matching_result:
-            print("\n[SequenceAnalyzerService] Sequence Analyzer Response:")
-            pprint.pprint(res_data)
-            print("\n")
+            logger.debug("Response", path=self.path, response=res_data)
 
         self.send_ok_res(res_data_dict, self.headers["Origin"])
 
+    def __handle_batch(self, asset_id: str):
+        """
+        Matches a batch of frames of the asset.
+        Request body: {"frames": [DATAURL, ...]}
+        """
+        try:
+            dataurls = json.loads(self.get_body_content_str())["frames"]
+            assert isinstance(dataurls, list)
+        except (ValueError, KeyError, TypeError, AssertionError):
+            self.send_error_res(
+                status_code=400,
+                error_type="invalid_request",
+                error_content='Request body must be {"frames": [DATAURL, ...]}.',
+            )
+            return
+
+        max_frames = self.__config.sequence_analyzer_batch_max_frames
+        if len(dataurls) > max_frames:
+            self.send_error_res(
+                status_code=413,
+                error_type="too_many_frames",
+                error_content=f"A batch can contain at most {max_frames} frames, but got {len(dataurls)}.",
+            )
+            return
+
+        logger.info("Batch received", asset_id=asset_id, n_frames=len(dataurls))
+        profiler = Profiler.get_instance()
+
+        with profiler.profile(
+            "sequence_analyzer_batch",
+            asset_id,
+            force=profiler.is_requested_by_header(self.headers),
+        ):
+            # Frames are decoded in the workers of the batch, along with OCR.
+            result = self.__sqa.match_content_sequence_batch(
+                asset_id=asset_id,
+                video_frames=[
+                    lambda dataurl=dataurl: VideoFrameImage.from_dataurl(
+                        dataurl
+                    ).resize(1280, 720)
+                    for dataurl in dataurls
+                ],
+            )
+
+        res_data = SequenceAnalyzerBatchApiResponse.from_sequence_analyzer_batch_result(
+            result
+        )
+        self.send_ok_res(res_data.to_json_serializable(), self.headers["Origin"])
+
     # except (TypeError, NameError, ValueError) as err:
     #     print("\nRequest-dependent error occurred:")
     #     print(err)
@@ -111,8 +478,15 @@ server = None
 
 
 def main():
+    setup_logging()
+
+    # The server accepts requests while the indexes are being loaded.
+    DocumentIndexPool.get_instance().prewarm(
+        Config().sequence_analyzer_prewarm_n_recent_assets
+    )
+
     server = HTTPLocalWebServer(8881)
-    server.listen(HttpPostHandler)
+    server.listen(HttpPostHandler, threaded=is_threaded(Config()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,305 @@
+import math
+import json
+import struct
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+from websockets.server import serve
+
+from serve_sequence_analyzer import HttpPostHandler
+from sequence_analyzer import SequenceAnalyzer, SequenceAnalyzerResult
+from document_index_pool import DocumentIndexPool
+from video_frame import VideoFrameImage
+from util.config import Config
+from util.metrics import Metrics
+from util.deadline import Deadline
+from util.admission import AdmissionController, Overloaded, Superseded
+from util.log import get_logger, setup_logging
+
+# Streaming protocol of the sequence analyzer:
+#
+# A client opens a WebSocket session for an asset at "/ASSET_ID?video_id=VIDEO_ID" (video_id is optional),
+# and sends each frame as a binary message: the playback time in seconds
+# (big-endian float64, NaN if unknown) followed by the encoded image (JPEG, PNG, WebP, ...).
+#
+# The server answers each frame with a JSON text message, in the order of the frames
+# (a frame answered early, e.g. superseded, waits for the answers of the frames before it):
+#   {"i": I_FRAME, "viewport": [LEFT, TOP, RIGHT, BOTTOM]}  viewport relative to the document size
+#   {"i": I_FRAME, "viewport": null}  no matched content
+#   {"i": I_FRAME, "unchanged": true}  the viewport has not moved since the last message
+#   {"i": I_FRAME, "error": MESSAGE}  the frame could not be read
+#   {"i": I_FRAME, "superseded": true}  a newer frame arrived before the frame was analyzed
+#   {"i": I_FRAME, "overloaded": true, "retry_after_sec": SEC}  the server is overloaded
+# "partial": true is added to a viewport found before the deadline of the frame passed.
+
+FRAME_HEADER = struct.Struct(">d")
+
+logger = get_logger("SequenceAnalyzerStreamService")
+
+
+def parse_frame_message(message: bytes) -> tuple[float | None, VideoFrameImage]:
+    """Returns (playback_time_sec, video_frame) of a binary frame message."""
+    if len(message) <= FRAME_HEADER.size:
+        raise ValueError("Frame message must be a playback time and an image.")
+
+    (playback_time_sec,) = FRAME_HEADER.unpack_from(message)
+    video_frame = VideoFrameImage.from_bytes(message[FRAME_HEADER.size :]).resize(
+        1280, 720
+    )
+
+    return (None if math.isnan(playback_time_sec) else playback_time_sec), video_frame
+
+
+def dumps_message(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"))
+
+
+class StreamSession:
+    """
+    State of a streaming session of an asset, kept on its connection.
+
+    A frame identical to the last one (by its fingerprint) is answered without matching,
+    and a viewport which has not moved by more than unchanged_tolerance
+    (relative to the document size) is answered with an "unchanged" message.
+    """
+
+    def __init__(
+        self,
+        sqa: SequenceAnalyzer,
+        asset_id: str,
+        video_id: str | None = None,
+        unchanged_tolerance: float = 0.0,
+    ):
+        self.asset_id = asset_id
+        self.video_id = video_id
+        self.n_frames = 0
+
+        self.__sqa = sqa
+        self.__unchanged_tolerance = unchanged_tolerance
+        self.__last_fingerprint: str | None = None
+        self.__last_viewport: list[float] | None = None
+        self.__has_sent_viewport = False
+
+    def new_frame_index(self) -> int:
+        """Returns the index of a frame arriving, by which it is answered."""
+        Metrics.get_instance().increment("stream.frames")
+        self.n_frames += 1
+        return self.n_frames - 1
+
+    def process_frame(
+        self, i_frame: int, message: bytes, deadline: Deadline | None = None
+    ) -> dict:
+        """Matches a binary frame message, and returns the message to answer."""
+        metrics = Metrics.get_instance()
+
+        try:
+            playback_time_sec, video_frame = parse_frame_message(message)
+        except Exception as err:
+            metrics.increment("stream.invalid_frames")
+            return {"i": i_frame, "error": str(err)}
+
+        fingerprint = video_frame.get_fingerprint()
+
+        if fingerprint == self.__last_fingerprint:
+            metrics.increment("stream.same_frames")
+            return self.__get_unchanged_message(i_frame)
+
+        result = self.__sqa.match_content_sequence(
+            asset_id=self.asset_id,
+            video_frame=video_frame,
+            video_id=self.video_id,
+            playback_time_sec=playback_time_sec,
+            deadline=deadline,
+        )
+
+        # The next frame is matched again if the result of this one is not complete.
+        self.__last_fingerprint = fingerprint if not result.partial else None
+
+        return self.__get_viewport_message(i_frame, result)
+
+    def __get_unchanged_message(self, i_frame: int) -> dict:
+        Metrics.get_instance().increment("stream.unchanged")
+        return {"i": i_frame, "unchanged": True}
+
+    def __get_viewport_message(self, i_frame: int, result: SequenceAnalyzerResult):
+        viewport = None
+
+        if result.content_matching_result is not None:
+            viewport = [
+                round(value, 4)
+                for point in result.viewport_estimation_result.get_relative_bbox_tuple()
+                for value in point
+            ]
+
+        if not result.partial and self.__is_unchanged(viewport):
+            return self.__get_unchanged_message(i_frame)
+
+        self.__last_viewport = viewport
+        self.__has_sent_viewport = True
+
+        message = {"i": i_frame, "viewport": viewport}
+        if result.partial:
+            message["partial"] = True
+
+        return message
+
+    def __is_unchanged(self, viewport: list[float] | None) -> bool:
+        if not self.__has_sent_viewport:
+            return False
+
+        if viewport is None or self.__last_viewport is None:
+            return viewport is self.__last_viewport
+
+        return all(
+            abs(value - last_value) <= self.__unchanged_tolerance
+            for value, last_value in zip(viewport, self.__last_viewport)
+        )
+
+
+# Threads analyzing frames of the sessions under admission control, shared in the process
+_frame_executor: ThreadPoolExecutor | None = None
+_frame_executor_lock = threading.Lock()
+
+
+def get_frame_executor(admission: AdmissionController) -> ThreadPoolExecutor:
+    """
+    Returns the threads analyzing frames under admission control.
+    A pending frame holds a thread while it waits, so there is a thread more than the frames admitted,
+    for a new frame to supersede a pending one (or to be rejected) at once.
+    """
+    global _frame_executor
+
+    with _frame_executor_lock:
+        if _frame_executor is None:
+            _frame_executor = ThreadPoolExecutor(
+                max_workers=admission.max_queue_depth + 1,
+                thread_name_prefix="SequenceAnalyzerStream",
+            )
+
+        return _frame_executor
+
+
+def process_frame_admitted(
+    admission: AdmissionController,
+    session: StreamSession,
+    i_frame: int,
+    message: bytes,
+    deadline: Deadline,
+) -> dict:
+    """Processes the frame in its turn among the frames of the session."""
+    try:
+        with admission.admit(session):
+            return session.process_frame(i_frame, message, deadline)
+    except Superseded:
+        return {"i": i_frame, "superseded": True}
+    except Overloaded as err:
+        return {
+            "i": i_frame,
+            "overloaded": True,
+            "retry_after_sec": err.retry_after_sec,
+        }
+
+
+async def run_sequence_analyzer_stream(websocket):
+    config = Config()
+    url = urlparse(websocket.path)
+    asset_id = url.path.split("/")[-1]
+    video_id = parse_qs(url.query).get("video_id", [None])[0]
+
+    if asset_id == "":
+        await websocket.send(dumps_message({"error": "Asset ID is not given."}))
+        return await websocket.close()
+
+    session = StreamSession(
+        HttpPostHandler.get_shared_sequence_analyzer(),
+        asset_id,
+        video_id,
+        config.sequence_analyzer_stream_unchanged_tolerance,
+    )
+    admission = HttpPostHandler.get_shared_admission_controller()
+    loop = asyncio.get_running_loop()
+    # Answers (awaitables of messages) in the order of the messages received
+    answers: asyncio.Queue = asyncio.Queue()
+
+    Metrics.get_instance().increment("stream.sessions")
+    logger.info(
+        "Session opened", asset_id=asset_id, remote_address=websocket.remote_address
+    )
+
+    async def answer(i_frame: int, message: bytes, deadline: Deadline) -> dict:
+        try:
+            # OCR and matching run in a thread, not to block the other sessions.
+            if admission is None:
+                return await asyncio.to_thread(
+                    session.process_frame, i_frame, message, deadline
+                )
+
+            return await loop.run_in_executor(
+                get_frame_executor(admission),
+                process_frame_admitted,
+                admission,
+                session,
+                i_frame,
+                message,
+                deadline,
+            )
+        except Exception as err:
+            # The answers of the next frames are not held by this one.
+            logger.exception("Failed to answer a frame", asset_id=asset_id)
+            return {"i": i_frame, "error": str(err)}
+
+    async def send_answers():
+        while (res_message := await answers.get()) is not None:
+            await websocket.send(dumps_message(await res_message))
+
+    sender = asyncio.create_task(send_answers())
+
+    async for message in websocket:
+        # The deadline of a frame counts from its arrival.
+        deadline = Deadline.from_ms(config.sequence_analyzer_deadline_ms)
+
+        if isinstance(message, str):
+            error = loop.create_future()
+            error.set_result({"error": "Frames must be sent as binary messages."})
+            answers.put_nowait(error)
+            continue
+
+        i_frame = session.new_frame_index()
+        task = asyncio.create_task(answer(i_frame, message, deadline))
+        answers.put_nowait(task)
+
+        # Frames keep being received while a frame is analyzed,
+        # so that a newer frame supersedes the pending one.
+        if admission is None:
+            await task
+
+    answers.put_nowait(None)
+    await asyncio.gather(sender, return_exceptions=True)
+
+    logger.info("Session closed", asset_id=asset_id, n_frames=session.n_frames)
+
+
+async def main():
+    setup_logging()
+    config = Config()
+
+    # The server accepts sessions while the indexes are being loaded.
+    DocumentIndexPool.get_instance().prewarm(
+        config.sequence_analyzer_prewarm_n_recent_assets
+    )
+
+    async with serve(
+        run_sequence_analyzer_stream, config.host, config.port_sequence_analyzer_stream
+    ):
+        print("\n\n###############################################")
+        print(
+            f"\n\nServing sequence analyzer stream at localhost:{config.port_sequence_analyzer_stream}\n\n"
+        )
+        print("###############################################\n\n")
+        await asyncio.Future()  # run forever
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from http.server import HTTPServer
+from http.server import HTTPServer, ThreadingHTTPServer
 from util.config import Config
 
 
@@ -10,8 +10,20 @@ class HTTPLocalWebServer:
     def get_address(self):
         return self.__address
 
-    def listen(self, RequestHandlerClass):
-        with HTTPServer(self.__address, RequestHandlerClass) as server:
+    def create_server(self, RequestHandlerClass, threaded=False) -> HTTPServer:
+        """
+        Creates a server bound to the address, which is not serving yet.
+        If threaded is True, each request is handled in a new thread.
+        """
+        ServerClass = ThreadingHTTPServer if threaded else HTTPServer
+        return ServerClass(self.__address, RequestHandlerClass)
+
+    def listen(self, RequestHandlerClass, threaded=False):
+        """
+        Serves requests with the handler class.
+        If threaded is True, each request is handled in a new thread.
+        """
+        with self.create_server(RequestHandlerClass, threaded) as server:
             print("\n\n###############################################")
             print(f"\n\nNow listening at {self.__address}\n\n")
             print("###############################################\n\n")
@@ -37,8 +37,29 @@ class HttpPostHandlerBase(
         content_length = int(self.headers["content-length"])
         return self.rfile.read(content_length)
 
-    def send_ok_res(self, body_content_to_json, host_root_url: str):
-        """Send success response with the given body content."""
+    def iter_body_content_chunks(self, chunk_size=1 << 20):
+        """Read the body content of the request as raw byte chunks of at most chunk_size bytes."""
+
+        n_bytes_left = int(self.headers["content-length"])
+
+        while n_bytes_left > 0:
+            chunk = self.rfile.read(min(chunk_size, n_bytes_left))
+
+            if not chunk:
+                raise ConnectionError(
+                    f"Connection closed with {n_bytes_left} bytes of body content left."
+                )
+
+            n_bytes_left -= len(chunk)
+            yield chunk
+
+    def send_ok_res(
+        self,
+        body_content_to_json,
+        host_root_url: str,
+        headers: dict[str, str] | None = None,
+    ):
+        """Send success response with the given body content (and extra headers)."""
 
         # create response header
         self.send_response(200)
@@ -48,16 +69,69 @@ class HttpPostHandlerBase(
             "Access-Control-Allow-Origin",
             host_root_url,  # Allow CORS request from client
         )
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.end_headers()
 
         # create response body
         self.wfile.write(json.dumps(body_content_to_json).encode("utf-8"))
 
-    def send_error_res(self, status_code: int, error_type: str, error_content: str):
-        """Send error response with the given error type and message."""
+    def send_file_res(
+        self,
+        path: str,
+        content_type: str,
+        host_root_url: str,
+        headers: dict[str, str] | None = None,
+    ):
+        """Send success response with the content of the file (and extra headers)."""
+
+        with open(path, "rb") as fp:
+            body_content = fp.read()
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body_content)))
+        self.send_header("Access-Control-Allow-Origin", host_root_url)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        self.wfile.write(body_content)
+
+    def send_not_modified_res(self, etag: str, host_root_url: str):
+        """Send 304 Not Modified response for a conditional request."""
+
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Access-Control-Allow-Origin", host_root_url)
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+        self.end_headers()
+
+    def is_not_modified(self, etag: str):
+        """Returns True if the request has If-None-Match header matching the etag."""
+
+        if_none_match = self.headers["If-None-Match"]
+
+        if if_none_match is None:
+            return False
+
+        return if_none_match.strip() == "*" or etag in [
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ]
+
+    def send_error_res(
+        self,
+        status_code: int,
+        error_type: str,
+        error_content: str,
+        headers: dict[str, str] | None = None,
+    ):
+        """Send error response with the given error type and message (and extra headers)."""
 
         self.send_response(status_code)
         self.send_header("Content-Type", "text/plain; charset=utf-8")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
         self.end_headers()
 
         body_content = {"error_type": error_type, "error_content": error_content}
@@ -0,0 +1,253 @@
+import threading
+import dataclasses
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+from line_alignment import DiagonalRunAligner, LineAlignment
+from util.deadline import Deadline
+
+
+# Byte size of each offset of the shared line contents
+OFFSET_SIZE = 8
+
+
+def create_shared_line_contents(contents: Sequence[str]) -> SharedMemory:
+    """
+    Writes the lines into a new shared memory block, which is read by SharedLineContents.
+    The block starts with the (len(contents) + 1) byte offsets of the lines, followed by the UTF-8 lines.
+    """
+    encoded = [content.encode("utf-8") for content in contents]
+    size_offsets = OFFSET_SIZE * (len(encoded) + 1)
+
+    shm = SharedMemory(create=True, size=max(1, size_offsets + sum(map(len, encoded))))
+    offsets = shm.buf[:size_offsets].cast("q")
+    offsets[0] = 0
+    for i, content in enumerate(encoded):
+        offsets[i + 1] = offsets[i] + len(content)
+        shm.buf[size_offsets + offsets[i] : size_offsets + offsets[i + 1]] = content
+    offsets.release()
+
+    return shm
+
+
+class SharedLineContents(Sequence):
+    """Read-only lines in a shared memory block written by create_shared_line_contents()."""
+
+    def __init__(self, shm: SharedMemory, n_lines: int):
+        self.__shm = shm
+        self.__n_lines = n_lines
+        size_offsets = OFFSET_SIZE * (n_lines + 1)
+        self.__offsets = shm.buf[:size_offsets].cast("q")
+        self.__data = shm.buf[size_offsets:]
+
+    def __len__(self):
+        return self.__n_lines
+
+    def __getitem__(self, i: int) -> str:
+        if not -self.__n_lines <= i < self.__n_lines:
+            raise IndexError(i)
+        i %= self.__n_lines
+
+        return str(self.__data[self.__offsets[i] : self.__offsets[i + 1]], "utf-8")
+
+
+# DiagonalRunAligner of the document index, built once in each worker process.
+_worker_aligner: DiagonalRunAligner | None = None
+
+
+def _init_worker(shm_name: str, n_lines: int, thresholds: tuple):
+    global _worker_aligner
+    # The block stays attached until the worker exits, and is removed by the matcher.
+    index_contents = SharedLineContents(SharedMemory(name=shm_name), n_lines)
+    _worker_aligner = DiagonalRunAligner(index_contents, *thresholds)
+
+
+def _search_shard(
+    video_frame_contents: list[str],
+    max_n_series: int,
+    i_index_start: int,
+    i_index_end: int,
+    remaining_sec: float | None,
+):
+    # The deadline is passed by the time left, as the clocks of processes are not comparable on every platform.
+    return _worker_aligner.search(
+        video_frame_contents,
+        max_n_series=max_n_series,
+        i_index_start=i_index_start,
+        i_index_end=i_index_end,
+        deadline=Deadline(remaining_sec) if remaining_sec is not None else None,
+    )
+
+
+def split_into_shards(n_lines: int, n_shards: int) -> list[tuple[int, int]]:
+    """Splits [0, n_lines) into n_shards contiguous ranges of (almost) the same size."""
+    n_shards = max(1, min(n_shards, n_lines))
+    shard_size, n_larger_shards = divmod(n_lines, n_shards)
+
+    shards = []
+    i_start = 0
+    for i_shard in range(n_shards):
+        i_end = i_start + shard_size + (1 if i_shard < n_larger_shards else 0)
+        shards.append((i_start, i_end))
+        i_start = i_end
+
+    return shards
+
+
+def merge_shard_alignments(
+    alignments: Sequence[LineAlignment | None],
+) -> LineAlignment | None:
+    """
+    Merges the results of each shard into the result of the whole document index.
+
+    The unsharded search attempts n = [max, ..., 1] and returns the first match in scan order,
+    so the merged result is the one with the largest n_series,
+    and then the smallest (i_line_video_frame, i_line_index_data).
+    If a shard returned a partial result, the merged result is partial too.
+    """
+    found = [alignment for alignment in alignments if alignment is not None]
+
+    if len(found) == 0:
+        return None
+
+    merged = min(
+        found,
+        key=lambda alignment: (
+            -alignment.n_series,
+            alignment.i_line_video_frame,
+            alignment.i_line_index_data,
+        ),
+    )
+
+    if merged.partial or not any(alignment.partial for alignment in found):
+        return merged
+
+    return dataclasses.replace(merged, partial=True)
+
+
+class ShardedLineMatcher:
+    """
+    Searches for the most matching lines of a large document index in worker processes.
+
+    concat_index_data is split into contiguous shards of window start positions,
+    and each shard is searched in parallel by DiagonalRunAligner.
+    The windows starting at the end of a shard overlap the next shard by up to (n_series - 1) lines,
+    so every worker reads the contents of the whole document index.
+    The contents are written once into a shared memory block, which all workers attach to.
+
+    Workers are started by the "forkserver" (or "spawn") start method, not by forking
+    the threaded server, whose locks may be held by other threads at the time of the fork.
+    A matcher being used by searches is held by acquire(), and its workers are terminated
+    after close() when the last search releases it.
+    """
+
+    def __init__(
+        self,
+        index_contents: list[str],
+        n_shards: int,
+        th_valid_similarity_ngram=0.75,
+        th_valid_similarity_sqmatch=0.7,
+        th_valid_str_length=10,
+        th_valid_strlen_rate_min=0.8,
+    ):
+        thresholds = (
+            th_valid_similarity_ngram,
+            th_valid_similarity_sqmatch,
+            th_valid_str_length,
+            th_valid_strlen_rate_min,
+        )
+
+        self.__shards = split_into_shards(len(index_contents), n_shards)
+        self.__shm = create_shared_line_contents(index_contents)
+        self.__executor = ProcessPoolExecutor(
+            max_workers=len(self.__shards),
+            mp_context=multiprocessing.get_context(
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            ),
+            initializer=_init_worker,
+            initargs=(self.__shm.name, len(index_contents), thresholds),
+        )
+
+        self.__lock = threading.Lock()
+        self.__n_users = 0
+        self.__closed = False
+
+    def get_shards(self):
+        """Returns the ranges of window start positions of each shard."""
+        return self.__shards
+
+    def search(
+        self,
+        video_frame_contents: Sequence[str],
+        max_n_series=3,
+        deadline: Deadline | None = None,
+    ) -> LineAlignment | None:
+        """Same as DiagonalRunAligner.search(), but runs on each shard in parallel."""
+        video_frame_contents = list(video_frame_contents)
+        remaining_sec = (
+            deadline.get_remaining_sec()
+            if deadline is not None and deadline.is_set()
+            else None
+        )
+
+        futures = [
+            self.__executor.submit(
+                _search_shard,
+                video_frame_contents,
+                max_n_series,
+                i_index_start,
+                i_index_end,
+                remaining_sec,
+            )
+            for i_index_start, i_index_end in self.__shards
+        ]
+
+        merged = merge_shard_alignments([future.result() for future in futures])
+
+        # A shard stopped by the deadline without a result may have missed a better run.
+        if (
+            merged is not None
+            and not merged.partial
+            and deadline is not None
+            and deadline.is_expired()
+        ):
+            merged = dataclasses.replace(merged, partial=True)
+
+        return merged
+
+    def acquire(self):
+        """Holds the worker processes until release(), even if the matcher is closed meanwhile."""
+        with self.__lock:
+            self.__n_users += 1
+
+    def release(self):
+        with self.__lock:
+            self.__n_users -= 1
+
+            if self.__closed and self.__n_users == 0:
+                self.__shutdown_executor()
+
+    def close(self):
+        """Terminates the worker processes when no search holds the matcher."""
+        with self.__lock:
+            self.__closed = True
+
+            if self.__n_users == 0:
+                self.__shutdown_executor()
+
+    def shutdown(self):
+        """Terminates the worker processes."""
+        self.__shutdown_executor(wait=True)
+
+    def __shutdown_executor(self, wait=False):
+        self.__executor.shutdown(wait=wait, cancel_futures=True)
+
+        # Workers still running keep their mapping of the block after it is unlinked.
+        if self.__shm is not None:
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
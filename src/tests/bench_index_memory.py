@@ -0,0 +1,87 @@
+"""
+Benchmark of the memory retained by a loaded document index, with and without CompactLines.
+
+Usage (in src directory):
+    python -m tests.bench_index_memory [PATH_INDEX_JSON ...] [--n-lines N]
+
+Without index files, a synthetic document index of n lines is written to a temporary file.
+Memory is measured by tracemalloc as the size retained after loading (the parsed JSON is freed).
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+from document_index import DocumentIndex
+from tests.test_line_alignment import create_document_index
+
+
+def measure(path_index: str, compact: bool):
+    gc.collect()
+    tracemalloc.start()
+    time_start = time.perf_counter()
+
+    document_index = DocumentIndex.from_output_file(path_index, compact=compact)
+
+    time_elapsed = time.perf_counter() - time_start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_lines = len(document_index.concat_index_data)
+    del document_index
+
+    return n_lines, size, time_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--n-lines", type=int, default=50000)
+    args = parser.parse_args()
+
+    paths = args.paths
+    tmpdir = None
+
+    if len(paths) == 0:
+        tmpdir = tempfile.TemporaryDirectory()
+        n_lines_per_page = 50
+        document_index = create_document_index(
+            random.Random(0),
+            n_pages=max(1, args.n_lines // n_lines_per_page),
+            n_lines_per_page=n_lines_per_page,
+        )
+        path_index = os.path.join(tmpdir.name, "synthetic.index.json")
+        with open(path_index, "w") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+
+        del document_index
+        paths = [path_index]
+
+    for path_index in paths:
+        n_lines, size_legacy, time_legacy = measure(path_index, compact=False)
+        _, size_compact, time_compact = measure(path_index, compact=True)
+
+        print(f"{os.path.basename(path_index)}: {n_lines} lines")
+        print(
+            f"  ShapedLineBox: {size_legacy / 2**20:8.2f} MiB ({size_legacy / n_lines:6.1f} B/line), {time_legacy:.2f}s"
+        )
+        print(
+            f"  CompactLines:  {size_compact / 2**20:8.2f} MiB ({size_compact / n_lines:6.1f} B/line), {time_compact:.2f}s"
+        )
+        print(f"  Reduction: {size_legacy / size_compact:.1f}x")
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Benchmark of page candidates by MinHash/LSH signatures against the exhaustive page search.
+
+Usage (in src directory):
+    python -m tests.bench_page_lsh_recall [PATH_INDEX_JSON ...] [--n-candidates N]
+
+Without index files, a synthetic slide deck is used.
+Recall is the rate of frames for which the search on candidate pages returns
+the same page as the exhaustive search (among frames matched by the exhaustive search).
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from ocr import OCRResult, ShapedLineBox, LinePositionWithPageOffset
+from document_index import (
+    DocumentIndex,
+    DocumentMetadata,
+    DocumentType,
+    PageMetadata,
+)
+
+
+def create_line(content: str, i_line: int, offset_top=0):
+    return ShapedLineBox(
+        content=content,
+        position=LinePositionWithPageOffset.from_positions(
+            top=i_line * 40,
+            left=20,
+            right=20 + 12 * len(content),
+            bottom=i_line * 40 + 30,
+            page_offset_left=0,
+            page_offset_top=offset_top,
+        ),
+    )
+
+
+def create_synthetic_slide_deck(rng: random.Random, n_pages: int):
+    vocabulary = [
+        "".join(
+            rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))
+        )
+        for _ in range(3000)
+    ]
+    footer = "CHI 2024 SwapVid: Integrating Video Viewing and Document Exploration"
+    page_height = 720
+
+    index_data = []
+    for i_page in range(n_pages):
+        lines = [" ".join(rng.choices(vocabulary, k=rng.randint(2, 6)))]  # title
+        lines += [
+            " ".join(rng.choices(vocabulary, k=rng.randint(3, 10)))
+            for _ in range(rng.randint(2, 8))
+        ]
+        lines.append(footer)
+
+        index_data.append(
+            [
+                create_line(content, i_line, i_page * page_height)
+                for i_line, content in enumerate(lines)
+            ]
+        )
+
+    return DocumentIndex(
+        index_data=index_data,
+        metadata=DocumentMetadata(
+            asset_id="synthetic",
+            width=1280,
+            height=n_pages * page_height,
+            n_pages=n_pages,
+            doc_type=DocumentType.SLIDE,
+            metadata_pages=[
+                PageMetadata(1280, page_height, i * page_height, i)
+                for i in range(n_pages)
+            ],
+        ),
+    )
+
+
+def create_video_frame(rng: random.Random, lines: list[ShapedLineBox]):
+    """Simulates OCR of a video frame showing the slide: reveal animation and OCR errors."""
+    n_revealed = rng.randint(1, len(lines))
+    contents = [
+        "".join(
+            rng.choice("abcdefghijklmnopqrstuvwxyz ") if rng.random() < 0.03 else c
+            for c in line.content
+        )
+        for line in lines[:n_revealed]
+    ]
+
+    ocr_result = OCRResult([])
+    ocr_result.data = [create_line(content, i) for i, content in enumerate(contents)]
+    return ocr_result
+
+
+def run_benchmark(
+    document_index: DocumentIndex, n_candidates: int, n_frames_per_page=3
+):
+    rng = random.Random(0)
+
+    t_exhaustive = 0.0
+    t_candidates = 0.0
+    n_frames = 0
+    n_matched_exhaustive = 0
+    n_same_page = 0
+    n_candidate_pages_total = 0
+
+    for page in document_index.index_data:
+        if len(page) == 0:
+            continue
+
+        for _ in range(n_frames_per_page):
+            ocr_result = create_video_frame(rng, page)
+            n_frames += 1
+
+            t = time.perf_counter()
+            result_exhaustive = document_index.search_most_matching_page(ocr_result)
+            t_exhaustive += time.perf_counter() - t
+
+            t = time.perf_counter()
+            candidate_page_ids = document_index.get_candidate_pages(
+                ocr_result, n_candidates
+            )
+            result_candidates = document_index.search_most_matching_page(
+                ocr_result, candidate_page_ids=candidate_page_ids
+            )
+            t_candidates += time.perf_counter() - t
+
+            n_candidate_pages_total += len(candidate_page_ids)
+
+            if result_exhaustive is not None:
+                n_matched_exhaustive += 1
+                if (
+                    result_candidates is not None
+                    and result_candidates.i_page == result_exhaustive.i_page
+                ):
+                    n_same_page += 1
+
+    print(f"\nasset_id: {document_index.metadata.asset_id}")
+    print(f"  pages: {document_index.metadata.n_pages}, frames: {n_frames}")
+    print(
+        f"  recall against exhaustive search: {n_same_page / max(1, n_matched_exhaustive):.4f}"
+        f" ({n_same_page} / {n_matched_exhaustive})"
+    )
+    print(
+        f"  candidate pages per frame: {n_candidate_pages_total / max(1, n_frames):.2f}"
+    )
+    print(f"  exhaustive search: {1000 * t_exhaustive / max(1, n_frames):.2f} ms/frame")
+    print(
+        f"  LSH candidates + search: {1000 * t_candidates / max(1, n_frames):.2f} ms/frame"
+    )
+
+
+def main(argv: list[str]):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path_index", nargs="*")
+    parser.add_argument("--n-candidates", type=int, default=8)
+    parser.add_argument("--n-synthetic-pages", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    if len(args.path_index) == 0:
+        document_indexes = [
+            create_synthetic_slide_deck(random.Random(0), args.n_synthetic_pages)
+        ]
+    else:
+        document_indexes = [
+            DocumentIndex.from_output_file(path) for path in args.path_index
+        ]
+
+    for document_index in document_indexes:
+        if document_index.get_page_signature_index() is None:
+            print(f"\nSkipping {document_index.metadata.asset_id}: not a slide deck.")
+            continue
+
+        run_benchmark(document_index, args.n_candidates)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,124 @@
+import time
+import threading
+import unittest
+
+from serve_sequence_analyzer import is_threaded
+from util.admission import AdmissionController, Overloaded, Superseded
+from util.config import Config
+from util.metrics import Metrics
+
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        Metrics.get_instance().reset()
+
+    def start_frame(self, admission, client_key, outcomes, name):
+        """Starts a thread admitting a frame, which records its outcome in outcomes."""
+
+        def run():
+            try:
+                with admission.admit(client_key):
+                    outcomes.append(("done", name))
+            except Superseded:
+                outcomes.append(("superseded", name))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def wait_queue_depth(self, admission, queue_depth):
+        while admission.get_queue_depth() != queue_depth:
+            time.sleep(0.01)
+
+    def test_newer_frame_supersedes_pending_one(self):
+        admission = AdmissionController(max_queue_depth=4)
+        outcomes = []
+
+        with admission.admit("client"):
+            threads = [self.start_frame(admission, "client", outcomes, 1)]
+            self.wait_queue_depth(admission, 2)
+
+            threads.append(self.start_frame(admission, "client", outcomes, 2))
+            threads[0].join()
+            self.assertEqual(outcomes, [("superseded", 1)])
+
+            # Another client is not affected.
+            with admission.admit("another client"):
+                self.assertEqual(admission.get_queue_depth(), 3)
+
+        threads[1].join()
+        self.assertEqual(outcomes, [("superseded", 1), ("done", 2)])
+        self.assertEqual(admission.get_queue_depth(), 0)
+        self.assertEqual(Metrics.get_instance().get("admission.superseded"), 1)
+
+    def test_frames_beyond_queue_depth_are_rejected(self):
+        admission = AdmissionController(max_queue_depth=2, retry_after_sec=3)
+        outcomes = []
+
+        with admission.admit("client 1"):
+            thread = self.start_frame(admission, "client 1", outcomes, 1)
+            self.wait_queue_depth(admission, 2)
+
+            with self.assertRaises(Overloaded) as cm:
+                with admission.admit("client 2"):
+                    pass
+
+            self.assertEqual(cm.exception.retry_after_sec, 3)
+
+        thread.join()
+        self.assertEqual(outcomes, [("done", 1)])
+        self.assertEqual(Metrics.get_instance().get("admission.rejected"), 1)
+
+        # The place of the frames which are done is given to new frames.
+        with admission.admit("client 2"):
+            pass
+
+    def test_frames_of_unknown_clients_are_not_superseded(self):
+        admission = AdmissionController(max_queue_depth=3)
+        outcomes = []
+
+        with admission.admit(None):
+            threads = [
+                self.start_frame(admission, None, outcomes, name) for name in [1, 2]
+            ]
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(sorted(outcomes), [("done", 1), ("done", 2)])
+
+            with admission.admit(None), admission.admit(None):
+                with self.assertRaises(Overloaded):
+                    with admission.admit(None):
+                        pass
+
+        self.assertEqual(admission.get_queue_depth(), 0)
+        self.assertEqual(Metrics.get_instance().get("admission.superseded"), 0)
+
+
+class TestThreadedServing(unittest.TestCase):
+    def setUp(self):
+        self.prev_settings = (
+            Config().sequence_analyzer_threaded,
+            Config().sequence_analyzer_admission_enabled,
+        )
+
+    def tearDown(self):
+        (
+            Config().sequence_analyzer_threaded,
+            Config().sequence_analyzer_admission_enabled,
+        ) = self.prev_settings
+
+    def test_admission_control_turns_threading_on(self):
+        for threaded, admission_enabled, expected in [
+            (False, False, False),
+            (True, False, True),
+            (False, True, True),
+        ]:
+            with self.subTest(threaded=threaded, admission_enabled=admission_enabled):
+                Config().sequence_analyzer_threaded = threaded
+                Config().sequence_analyzer_admission_enabled = admission_enabled
+                self.assertEqual(is_threaded(Config()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+from asset_catalog import AssetCatalog, IndexStatus
+from document_index import DocumentType
+from util.config import Config
+from tests.test_line_alignment import create_document_index
+
+
+class TestAssetCatalog(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        Config().dirpath_data_root = self.dirpath_data_root
+
+        os.makedirs(os.path.join(self.dirpath_data_root, "pdf"))
+        os.makedirs(os.path.join(self.dirpath_data_root, "document_index"))
+
+    def tearDown(self):
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        shutil.rmtree(self.dirpath_data_root)
+
+    def write_pdf(self, asset_id: str, content: bytes, mtime: int):
+        path = os.path.join(self.dirpath_data_root, "pdf", f"{asset_id}.pdf")
+        with open(path, "wb") as fp:
+            fp.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def write_index(self, asset_id: str, n_pages: int, mtime: int):
+        path = os.path.join(
+            self.dirpath_data_root, "document_index", f"{asset_id}.index.json"
+        )
+        document_index = create_document_index(
+            random.Random(0), n_pages=n_pages, n_lines_per_page=2
+        )
+        document_index.metadata.asset_id = asset_id
+        document_index.metadata.doc_type = DocumentType.SLIDE
+
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+        os.utime(path, (mtime, mtime))
+
+    def test_index_status(self):
+        self.write_pdf("fresh", b"%PDF-1", 100)
+        self.write_index("fresh", 3, 200)
+        self.write_pdf("stale", b"%PDF-2", 300)
+        self.write_index("stale", 3, 200)
+        self.write_pdf("missing", b"%PDF-3", 100)
+
+        catalog = AssetCatalog(min_refresh_interval_sec=0)
+        catalog.get_snapshot()
+        catalog.wait_for_details()
+        snapshot = catalog.get_snapshot()
+        assets = {asset.asset_id: asset for asset in snapshot.assets}
+
+        self.assertEqual(assets["fresh"].index_status, IndexStatus.FRESH)
+        self.assertEqual(assets["fresh"].doc_type, "slide")
+        self.assertEqual(assets["fresh"].n_pages, 3)
+        self.assertEqual(assets["fresh"].pdf_size, 6)
+        self.assertEqual(len(assets["fresh"].pdf_sha256), 64)
+        self.assertEqual(assets["stale"].index_status, IndexStatus.STALE)
+        self.assertEqual(assets["missing"].index_status, IndexStatus.MISSING)
+        self.assertFalse(assets["missing"].index_exists)
+        self.assertEqual(snapshot.pdf_files, ["fresh.pdf", "missing.pdf", "stale.pdf"])
+
+    def test_details_are_read_in_background(self):
+        self.write_pdf("a", b"%PDF-1", 100)
+        self.write_index("a", 2, 200)
+        catalog = AssetCatalog(min_refresh_interval_sec=60)
+
+        # Not read yet by the request getting the snapshot
+        snapshot = catalog.get_snapshot()
+        self.assertIsNone(snapshot.assets[0].pdf_sha256)
+        self.assertIsNone(snapshot.assets[0].doc_type)
+
+        catalog.wait_for_details()
+        snapshot_read = catalog.get_snapshot()
+        self.assertEqual(len(snapshot_read.assets[0].pdf_sha256), 64)
+        self.assertEqual(snapshot_read.assets[0].doc_type, "slide")
+        self.assertNotEqual(snapshot_read.etag, snapshot.etag)
+
+        # Read only once while the PDF is not modified.
+        self.assertIs(catalog.get_snapshot(), snapshot_read)
+
+    def test_etag_changes_only_with_contents(self):
+        self.write_pdf("a", b"%PDF-1", 100)
+        catalog = AssetCatalog(min_refresh_interval_sec=0)
+        catalog.get_snapshot()
+        catalog.wait_for_details()
+
+        etag = catalog.get_snapshot().etag
+        self.assertEqual(catalog.get_snapshot().etag, etag)
+
+        self.write_index("a", 1, 200)
+        self.assertNotEqual(catalog.get_snapshot().etag, etag)
+
+    def test_temporary_files_are_ignored(self):
+        self.write_pdf("a", b"%PDF-1", 100)
+        with open(os.path.join(self.dirpath_data_root, "pdf", "x.pdf.part"), "wb"):
+            pass
+
+        snapshot = AssetCatalog(min_refresh_interval_sec=0).get_snapshot()
+
+        self.assertEqual(snapshot.pdf_files, ["a.pdf"])
+        self.assertEqual([asset.asset_id for asset in snapshot.assets], ["a"])
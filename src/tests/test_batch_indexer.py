@@ -0,0 +1,84 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+from batch_indexer import BatchIndexerResult, run_batch, select_assets
+from util.config import Config
+from tests.test_line_alignment import create_document_index
+
+
+def fake_index_asset(asset_id: str) -> BatchIndexerResult:
+    if asset_id == "broken":
+        raise ValueError("broken PDF")
+
+    return BatchIndexerResult(asset_id, n_pages=len(asset_id), elapsed_sec=0.5)
+
+
+class TestBatchIndexer(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        Config().dirpath_data_root = self.dirpath_data_root
+
+        os.makedirs(os.path.join(self.dirpath_data_root, "pdf"))
+        os.makedirs(os.path.join(self.dirpath_data_root, "document_index"))
+
+    def tearDown(self):
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        shutil.rmtree(self.dirpath_data_root)
+
+    def write_pdf(self, asset_id: str, size: int, mtime: int):
+        path = os.path.join(self.dirpath_data_root, "pdf", f"{asset_id}.pdf")
+        with open(path, "wb") as fp:
+            fp.write(b"%" * size)
+        os.utime(path, (mtime, mtime))
+
+    def write_index(self, asset_id: str, mtime: int):
+        path = os.path.join(
+            self.dirpath_data_root, "document_index", f"{asset_id}.index.json"
+        )
+        document_index = create_document_index(
+            random.Random(0), n_pages=1, n_lines_per_page=2
+        )
+        document_index.metadata.asset_id = asset_id
+
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+        os.utime(path, (mtime, mtime))
+
+    def test_select_assets(self):
+        self.write_pdf("small", 10, 100)
+        self.write_pdf("large", 1000, 100)
+        self.write_pdf("stale", 100, 300)
+        self.write_index("stale", 200)
+        self.write_pdf("fresh", 10000, 100)
+        self.write_index("fresh", 200)
+        self.write_index("no_pdf", 200)
+
+        self.assertEqual(
+            [entry.asset_id for entry in select_assets()],
+            ["large", "stale", "small"],
+        )
+        self.assertEqual(
+            [entry.asset_id for entry in select_assets(["small", "fresh", "no_pdf"])],
+            ["small"],
+        )
+        self.assertEqual(
+            [entry.asset_id for entry in select_assets(["small", "fresh"], force=True)],
+            ["fresh", "small"],
+        )
+
+    def test_run_batch(self):
+        results = run_batch(
+            ["a", "broken", "abc"], n_workers=2, index_fn=fake_index_asset
+        )
+        results = {result.asset_id: result for result in results}
+
+        self.assertEqual(results["a"].n_pages, 1)
+        self.assertEqual(results["abc"].n_pages, 3)
+        self.assertIsNone(results["abc"].error)
+        self.assertIn("broken PDF", results["broken"].error)
+        self.assertEqual(run_batch([], n_workers=2, index_fn=fake_index_asset), [])
@@ -0,0 +1,70 @@
+import time
+import threading
+import unittest
+
+from util.coalescer import RequestCoalescer
+
+
+class TestRequestCoalescer(unittest.TestCase):
+    def test_identical_requests_in_flight_share_one_call(self):
+        coalescer = RequestCoalescer(ttl_sec=0)
+        n_calls = 0
+        results = []
+
+        def slow_call():
+            nonlocal n_calls
+            n_calls += 1
+            time.sleep(0.2)
+            return "result"
+
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(coalescer.run("key", slow_call))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(n_calls, 1)
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(coalescer.n_coalesced, 4)
+
+    def test_result_is_cached_until_ttl(self):
+        coalescer = RequestCoalescer(ttl_sec=0.1)
+
+        self.assertEqual(coalescer.run("key", lambda: 1), 1)
+        self.assertEqual(coalescer.run("key", lambda: 2), 1)
+        self.assertEqual(coalescer.run("another key", lambda: 3), 3)
+
+        time.sleep(0.15)
+        self.assertEqual(coalescer.run("key", lambda: 4), 4)
+
+    def test_errors_are_not_cached(self):
+        coalescer = RequestCoalescer(ttl_sec=10)
+
+        def failing_call():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            coalescer.run("key", failing_call)
+
+        self.assertEqual(coalescer.run("key", lambda: "retried"), "retried")
+
+    def test_uncacheable_results_are_not_cached(self):
+        coalescer = RequestCoalescer(ttl_sec=10)
+
+        def is_cacheable(result):
+            return result != "partial"
+
+        self.assertEqual(
+            coalescer.run("key", lambda: "partial", is_cacheable), "partial"
+        )
+        self.assertEqual(coalescer.run("key", lambda: "full", is_cacheable), "full")
+        self.assertEqual(coalescer.run("key", lambda: "other", is_cacheable), "full")
+
+
+if __name__ == "__main__":
+    unittest.main()
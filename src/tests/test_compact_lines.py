@@ -0,0 +1,122 @@
+import os
+import json
+import random
+import tempfile
+import unittest
+
+from document_index import DocumentIndex
+from compact_lines import CompactLineSequence, CompactPageSequence
+from tests.test_line_alignment import (
+    create_document_index,
+    create_ocr_result,
+    create_video_frame_contents,
+)
+
+
+def to_json(result):
+    return json.dumps(result.to_json_serializable() if result is not None else None)
+
+
+class TestCompactLines(unittest.TestCase):
+    """A document index loaded with compact=True must behave as the one loaded with compact=False."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def load(self, document_index: DocumentIndex):
+        path_index = os.path.join(self.tmpdir.name, "test.index.json")
+        with open(path_index, "w") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+
+        return (
+            DocumentIndex.from_output_file(path_index, compact=False),
+            DocumentIndex.from_output_file(path_index, compact=True),
+        )
+
+    def test_views(self):
+        document_index, compact_document_index = self.load(
+            create_document_index(random.Random(0), n_pages=4, n_lines_per_page=7)
+        )
+
+        self.assertIsInstance(compact_document_index.index_data, CompactPageSequence)
+        self.assertIsInstance(
+            compact_document_index.concat_index_data, CompactLineSequence
+        )
+        self.assertEqual(
+            len(compact_document_index.index_data), len(document_index.index_data)
+        )
+        self.assertEqual(
+            list(compact_document_index.concat_index_data),
+            document_index.concat_index_data,
+        )
+        self.assertEqual(
+            compact_document_index.get_index_contents(),
+            document_index.get_index_contents(),
+        )
+        self.assertEqual(
+            compact_document_index.get_the_page_index_data(-1)[-1],
+            document_index.get_the_page_index_data(-1)[-1],
+        )
+        self.assertEqual(
+            json.dumps(
+                [
+                    [linebox.to_json_serializable() for linebox in lineboxes_of_page]
+                    for lineboxes_of_page in compact_document_index.index_data
+                ]
+            ),
+            json.dumps(
+                [
+                    [linebox.to_json_serializable() for linebox in lineboxes_of_page]
+                    for lineboxes_of_page in document_index.index_data
+                ]
+            ),
+        )
+
+    def test_search_most_matching_line(self):
+        rng = random.Random(1)
+
+        for _ in range(10):
+            document_index, compact_document_index = self.load(
+                create_document_index(
+                    rng, n_pages=rng.randint(1, 3), n_lines_per_page=rng.randint(10, 25)
+                )
+            )
+
+            for _ in range(15):
+                ocr_result = create_ocr_result(
+                    create_video_frame_contents(rng, document_index)
+                )
+
+                try:
+                    expected = document_index.search_most_matching_line(ocr_result)
+                except ValueError:
+                    continue
+
+                actual = compact_document_index.search_most_matching_line(ocr_result)
+                self.assertEqual(to_json(actual), to_json(expected))
+
+    def test_search_most_matching_page(self):
+        rng = random.Random(2)
+
+        for _ in range(10):
+            document_index, compact_document_index = self.load(
+                create_document_index(
+                    rng, n_pages=rng.randint(2, 8), n_lines_per_page=rng.randint(3, 10)
+                )
+            )
+
+            for _ in range(15):
+                ocr_result = create_ocr_result(
+                    create_video_frame_contents(rng, document_index)
+                )
+
+                expected = document_index.search_most_matching_page(ocr_result)
+                actual = compact_document_index.search_most_matching_page(ocr_result)
+                self.assertEqual(to_json(actual), to_json(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import sequence_analyzer
+from line_alignment import DiagonalRunAligner
+from document_index import DocumentType
+from document_index_pool import DocumentIndexPool
+from video_frame import VideoFrameImage
+from util.asset import Asset
+from util.config import Config
+from util.deadline import HEADER_DEADLINE_MS, Deadline, DeadlineExceeded
+from tests.test_line_alignment import create_document_index, create_ocr_result
+from tests.test_ocr_cascade import FakeOCR
+
+
+class ExpiringDeadline(Deadline):
+    """Deadline which expires at the n-th check, so that a search is stopped at a known point."""
+
+    __slots__ = ("n_checks_left",)
+
+    def __init__(self, n_checks: int):
+        super().__init__(60)
+        self.n_checks_left = n_checks
+
+    def is_expired(self) -> bool:
+        self.n_checks_left -= 1
+        return self.n_checks_left < 0
+
+
+class TestDeadline(unittest.TestCase):
+    def test_from_request_headers(self):
+        self.assertFalse(Deadline.from_request_headers({}, 0).is_set())
+        self.assertFalse(Deadline.from_request_headers(None, None).is_set())
+
+        deadline = Deadline.from_request_headers({HEADER_DEADLINE_MS: "500"}, 0)
+        self.assertTrue(deadline.is_set())
+        self.assertFalse(deadline.is_expired())
+        self.assertLessEqual(deadline.get_remaining_sec(), 0.5)
+
+        # Invalid values fall back to the default.
+        deadline = Deadline.from_request_headers({HEADER_DEADLINE_MS: "soon"}, 0)
+        self.assertFalse(deadline.is_set())
+
+        self.assertTrue(Deadline(0).is_expired())
+        self.assertEqual(Deadline(-1).get_remaining_sec(), 0)
+
+
+class TestAnytimeSearch(unittest.TestCase):
+    def setUp(self):
+        # Lines of very different lengths, so that each line is the only candidate of itself.
+        self.index_contents = [f"line{i:02d} " * (2**i) for i in range(1, 9)]
+        # Lines 2 and 3, and a line which is not in the document
+        self.video_frame_contents = [
+            self.index_contents[2],
+            self.index_contents[3],
+            "q" * len(self.index_contents[4]),
+            self.index_contents[6],
+        ]
+
+    def test_line_search_returns_longest_run_so_far(self):
+        aligner = DiagonalRunAligner(self.index_contents)
+
+        complete = aligner.search(self.video_frame_contents)
+        self.assertFalse(complete.partial)
+        self.assertEqual((complete.i_line_index_data, complete.n_series), (2, 2))
+
+        # Stopped after the first diagonal of n = 3, which matched 2 lines.
+        partial = aligner.search(
+            self.video_frame_contents, deadline=ExpiringDeadline(1)
+        )
+        self.assertTrue(partial.partial)
+        self.assertEqual(
+            (partial.i_line_video_frame, partial.i_line_index_data, partial.n_series),
+            (0, 2, 2),
+        )
+
+        self.assertIsNone(
+            aligner.search(self.video_frame_contents, deadline=Deadline(0))
+        )
+
+    def test_page_search_returns_best_page_so_far(self):
+        document_index = create_document_index(
+            random.Random(0), n_pages=4, n_lines_per_page=10
+        )
+        document_index.metadata.doc_type = DocumentType.SLIDE
+        ocr_result = create_ocr_result(
+            [
+                linebox.content
+                for linebox in document_index.index_data[2]
+                if len(linebox.content) >= 10
+            ]
+        )
+
+        complete = document_index.search_most_matching_page(ocr_result)
+        self.assertEqual(complete.i_page, 2)
+        self.assertFalse(complete.partial)
+
+        # Stopped while searching the pages for the first line.
+        partial = document_index.search_most_matching_page(
+            ocr_result, deadline=ExpiringDeadline(4)
+        )
+        self.assertEqual(partial.i_page, 2)
+        self.assertTrue(partial.partial)
+
+        self.assertIsNone(
+            document_index.search_most_matching_page(ocr_result, deadline=Deadline(0))
+        )
+
+
+class TestSequenceAnalyzerDeadline(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        self.prev_no_text_filter_enabled = Config().matching_no_text_filter_enabled
+        Config().dirpath_data_root = self.dirpath_data_root
+        # Frames of the tests are blank.
+        Config().matching_no_text_filter_enabled = False
+        os.makedirs(Asset.get_dirpath_document_index())
+
+        document_index = create_document_index(
+            random.Random(0), n_pages=2, n_lines_per_page=20
+        )
+        with open(Asset.get_path_document_index("asset"), "w") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+
+        self.lines = [
+            (
+                linebox.content,
+                [
+                    [linebox.position.get_left(), linebox.position.get_top()],
+                    [linebox.position.get_right(), linebox.position.get_bottom()],
+                ],
+            )
+            for linebox in document_index.concat_index_data
+            if len(linebox.content) >= 10
+        ][:4]
+        self.video_frame = VideoFrameImage(Image.new("L", (1280, 720)))
+
+    def tearDown(self):
+        DocumentIndexPool.get_instance().invalidate("asset")
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        Config().matching_no_text_filter_enabled = self.prev_no_text_filter_enabled
+        shutil.rmtree(self.dirpath_data_root)
+
+    def match(self, ocr, deadline: Deadline | None):
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ):
+            return sequence_analyzer.SequenceAnalyzer("").match_content_sequence(
+                "asset", self.video_frame, deadline=deadline
+            )
+
+    def test_complete_within_deadline(self):
+        result = self.match(FakeOCR(self.lines, 1.0), Deadline(60))
+        self.assertTrue(result.content_sequence_matched)
+        self.assertFalse(result.partial)
+        self.assertFalse(result.to_json_serializable()["partial"])
+
+    def test_ocr_is_skipped_after_deadline(self):
+        ocr = FakeOCR(self.lines, 1.0)
+        result = self.match(ocr, Deadline(0))
+
+        self.assertEqual(ocr.scales, [])
+        self.assertFalse(result.content_sequence_matched)
+        self.assertTrue(result.partial)
+
+    def test_aborted_ocr(self):
+        ocr = FakeOCR(self.lines, 1.0)
+
+        with mock.patch.object(ocr, "extract", side_effect=DeadlineExceeded()):
+            result = self.match(ocr, Deadline(60))
+
+        self.assertFalse(result.content_sequence_matched)
+        self.assertTrue(result.partial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import document_index_pool
+from document_index import DocumentIndex
+from document_index_pool import DocumentIndexPool
+from util.asset import Asset
+from util.config import Config
+from tests.test_line_alignment import create_document_index
+
+
+class TestDocumentIndexPool(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        Config().dirpath_data_root = self.dirpath_data_root
+        os.makedirs(Asset.get_dirpath_document_index())
+
+    def tearDown(self):
+        DocumentIndexPool.get_instance().invalidate("asset")
+        DocumentIndexPool.get_instance().invalidate("slow_asset")
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        shutil.rmtree(self.dirpath_data_root)
+
+    def write_index(self, n_pages: int, mtime: int, asset_id="asset"):
+        document_index = create_document_index(
+            random.Random(0), n_pages=n_pages, n_lines_per_page=5
+        )
+        path = Asset.get_path_document_index(asset_id)
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+        os.utime(path, (mtime, mtime))
+
+    def test_reloads_modified_index(self):
+        pool = DocumentIndexPool.get_instance()
+        self.assertIsNone(pool.get("asset"))
+
+        self.write_index(n_pages=1, mtime=100)
+        document_index = pool.get("asset")
+        self.assertIs(pool.get("asset"), document_index)
+        self.assertEqual(document_index.metadata.n_pages, 1)
+
+        self.write_index(n_pages=2, mtime=200)
+        self.assertEqual(pool.get("asset").metadata.n_pages, 2)
+
+        os.remove(Asset.get_path_document_index("asset"))
+        self.assertIsNone(pool.get("asset"))
+
+    def test_prewarm_loads_recent_assets(self):
+        pool = DocumentIndexPool.get_instance()
+        self.write_index(n_pages=1, mtime=100)
+
+        pool.get("asset")
+        self.assertEqual(pool.get_recent_assets(), ["asset"])
+
+        pool.invalidate("asset")
+        pool.prewarm(n_assets=1).join()
+
+        self.assertIs(pool.get("asset"), pool.get("asset"))
+        self.assertEqual(pool.get_recent_assets(), ["asset"])
+        self.assertIsNone(pool.prewarm(n_assets=0))
+
+    def test_loading_does_not_block_other_assets(self):
+        pool = DocumentIndexPool.get_instance()
+        self.write_index(n_pages=1, mtime=100)
+        self.write_index(n_pages=1, mtime=100, asset_id="slow_asset")
+
+        loading = threading.Event()
+        finish_loading = threading.Event()
+        waited_until_timeout = []
+        from_output_file = DocumentIndex.from_output_file
+
+        def load_slowly(path_index: str):
+            if path_index == Asset.get_path_document_index("slow_asset"):
+                loading.set()
+                waited_until_timeout.append(not finish_loading.wait(timeout=5))
+
+            return from_output_file(path_index)
+
+        with mock.patch.object(
+            document_index_pool.DocumentIndex,
+            "from_output_file",
+            side_effect=load_slowly,
+        ):
+            thread = threading.Thread(target=pool.get, args=("slow_asset",))
+            thread.start()
+            self.assertTrue(loading.wait(timeout=5))
+
+            # Loaded while the other asset is being loaded.
+            self.assertIsNotNone(pool.get("asset"))
+
+            finish_loading.set()
+            thread.join()
+
+        self.assertEqual(waited_until_timeout, [False])
+
+        self.assertIsNotNone(pool.get("slow_asset"))
@@ -0,0 +1,93 @@
+import json
+import random
+import unittest
+
+from document_index import DocumentType
+from document_index_store import DocumentIndexStore, build_trigram_query
+from tests.test_line_alignment import (
+    create_document_index,
+    create_ocr_result,
+    create_video_frame_contents,
+)
+
+
+def to_json(result):
+    # Positions of stored lines are lists as in the output files, not tuples.
+    return json.dumps(result.to_json_serializable() if result is not None else None)
+
+
+class TestDocumentIndexStore(unittest.TestCase):
+    """Searches on StoredDocumentIndex must return the same results as DocumentIndex."""
+
+    def setUp(self):
+        self.store = DocumentIndexStore(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_search_most_matching_line(self):
+        rng = random.Random(0)
+
+        for i_asset in range(10):
+            document_index = create_document_index(
+                rng, n_pages=rng.randint(1, 3), n_lines_per_page=rng.randint(10, 25)
+            )
+            self.store.put_document_index(document_index, asset_id=f"asset{i_asset}")
+            stored_document_index = self.store.load_document_index(f"asset{i_asset}")
+
+            for _ in range(15):
+                ocr_result = create_ocr_result(
+                    create_video_frame_contents(rng, document_index)
+                )
+
+                try:
+                    expected = document_index.search_most_matching_line(ocr_result)
+                except ValueError:
+                    continue
+
+                actual = stored_document_index.search_most_matching_line(ocr_result)
+                self.assertEqual(to_json(actual), to_json(expected))
+
+    def test_search_most_matching_page(self):
+        rng = random.Random(1)
+
+        for i_asset in range(10):
+            document_index = create_document_index(
+                rng, n_pages=rng.randint(2, 8), n_lines_per_page=rng.randint(3, 10)
+            )
+            self.store.put_document_index(document_index, asset_id=f"asset{i_asset}")
+            stored_document_index = self.store.load_document_index(f"asset{i_asset}")
+
+            for _ in range(10):
+                ocr_result = create_ocr_result(
+                    create_video_frame_contents(rng, document_index)
+                )
+
+                expected = document_index.search_most_matching_page(ocr_result)
+                actual = stored_document_index.search_most_matching_page(ocr_result)
+                self.assertEqual(to_json(actual), to_json(expected))
+
+    def test_put_replaces_stored_document_index(self):
+        rng = random.Random(2)
+
+        self.store.put_document_index(
+            create_document_index(rng, n_pages=2, n_lines_per_page=10), 1, "asset"
+        )
+        document_index = create_document_index(rng, n_pages=3, n_lines_per_page=5)
+        document_index.metadata.doc_type = DocumentType.SLIDE
+        self.store.put_document_index(document_index, 2, "asset")
+
+        stored_document_index = self.store.load_document_index("asset")
+
+        self.assertEqual(self.store.get_source_mtime_ns("asset"), 2)
+        self.assertEqual(stored_document_index.metadata.doc_type, DocumentType.SLIDE)
+        self.assertEqual(len(stored_document_index.concat_index_data), 15)
+        self.assertEqual(
+            [line.content for line in stored_document_index.index_data[2]],
+            [line.content for line in document_index.index_data[2]],
+        )
+        self.assertIsNone(self.store.load_document_index("unknown"))
+
+    def test_build_trigram_query(self):
+        self.assertIsNone(build_trigram_query("ab"))
+        self.assertEqual(build_trigram_query('A"bc'), '"a""b" OR """bc"')
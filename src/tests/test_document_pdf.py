@@ -0,0 +1,51 @@
+import os
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import document_pdf
+from util.asset import Asset
+from util.config import Config
+
+
+class TestDocumentPDF(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        Config().dirpath_data_root = self.dirpath_data_root
+        os.makedirs(Asset.get_dirpath_pdf_src())
+        with open(Asset.get_path_pdf_src("asset"), "wb") as fp:
+            fp.write(b"%PDF-1.4 test")
+
+    def tearDown(self):
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        shutil.rmtree(self.dirpath_data_root)
+
+    def test_empty_page_range(self):
+        async def generate(page_start, page_end):
+            return await document_pdf.DocumentPDF(
+                "asset", self.dirpath_data_root
+            ).generate_document_index_data(
+                None,
+                Asset.get_dirpath_document_index(),
+                "",
+                page_start=page_start,
+                page_end=page_end,
+                save_file=False,
+            )
+
+        with mock.patch.object(document_pdf, "get_shared_tesseract_ocr"), mock.patch(
+            "pdf2image.pdfinfo_from_path", return_value={"Pages": 3}
+        ), mock.patch("pdf2image.convert_from_path") as convert_from_path:
+            for page_start, page_end in [(4, None), (3, 2)]:
+                with self.subTest(page_start=page_start, page_end=page_end):
+                    with self.assertRaises(ValueError):
+                        asyncio.run(generate(page_start, page_end))
+
+        convert_from_path.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+from PIL import Image
+
+from util.image import calc_dhash
+
+
+class TestDHash(unittest.TestCase):
+    def test_bits_compare_horizontal_neighbors(self):
+        decreasing = Image.new("L", (170, 160))
+        decreasing.putdata([255 - x for _ in range(160) for x in range(170)])
+
+        self.assertEqual(calc_dhash(decreasing), "f" * 64)
+        self.assertEqual(
+            calc_dhash(decreasing.transpose(Image.FLIP_LEFT_RIGHT)), "0" * 64
+        )
+
+        # Only the top left pixels are brighter than their right neighbors.
+        image = Image.new("L", (17, 16))
+        image.putpixel((0, 0), 255)
+        self.assertEqual(calc_dhash(image), "8" + "0" * 63)
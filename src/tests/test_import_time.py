@@ -0,0 +1,65 @@
+import os
+import sys
+import subprocess
+import unittest
+
+DIRPATH_SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICE_MODULES = [
+    "serve_sequence_analyzer",
+    "serve_sequence_analyzer_stream",
+    "serve_pdf_receiver",
+    "serve_pdf_analyzer",
+    "serve_file_explorer",
+    "serve_all",
+]
+
+# Heavy packages which must be imported only when they are used (not on startup).
+LAZY_PACKAGES = ["pyocr", "pdf2image", "PIL", "numpy"]
+
+
+def get_imported_modules(module_name: str) -> dict[str, int]:
+    """
+    Imports the module in a new interpreter with "-X importtime",
+    and returns the imported modules: name -> cumulative import time (us).
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=DIRPATH_SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    imported_modules: dict[str, int] = {}
+
+    # Each line: "import time: <self us> | <cumulative us> | <indented module name>"
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative_us, name = line.split("|")
+        imported_modules[name.strip()] = int(cumulative_us)
+
+    return imported_modules
+
+
+class TestImportTime(unittest.TestCase):
+    def test_services_do_not_import_heavy_packages(self):
+        for module_name in SERVICE_MODULES:
+            with self.subTest(module_name=module_name):
+                imported_modules = get_imported_modules(module_name)
+
+                imported_lazy_packages = sorted(
+                    {
+                        name.split(".")[0]
+                        for name in imported_modules
+                        if name.split(".")[0] in LAZY_PACKAGES
+                    }
+                )
+
+                self.assertEqual(
+                    imported_lazy_packages,
+                    [],
+                    msg=f"{module_name} took {imported_modules.get(module_name)} us to import.",
+                )
@@ -0,0 +1,146 @@
+import random
+import unittest
+
+from ocr import OCRResult, ShapedLineBox, LinePositionWithPageOffset
+from document_index import (
+    DocumentIndex,
+    DocumentMetadata,
+    DocumentType,
+    PageMetadata,
+)
+
+WORDS = (
+    "policy reward agent training video model learning transformer "
+    "attention layer dataset baseline episode action state value "
+    "pretraining inverse dynamics labels contractor minecraft diamond"
+).split()
+
+
+def create_line(content: str, i_line: int, offset_top=0):
+    return ShapedLineBox(
+        content=content,
+        position=LinePositionWithPageOffset.from_positions(
+            top=i_line * 30,
+            left=10,
+            right=10 + 8 * len(content),
+            bottom=i_line * 30 + 20,
+            page_offset_left=0,
+            page_offset_top=offset_top,
+        ),
+    )
+
+
+def create_ocr_result(contents: list[str]):
+    ocr_result = OCRResult([])
+    ocr_result.data = [create_line(content, i) for i, content in enumerate(contents)]
+    return ocr_result
+
+
+def create_random_sentence(rng: random.Random):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8)))
+
+
+def add_ocr_noise(rng: random.Random, content: str, p_noise: float):
+    return "".join(
+        rng.choice("abcdefghijklmnopqrstuvwxyz ") if rng.random() < p_noise else c
+        for c in content
+    )
+
+
+def create_document_index(rng: random.Random, n_pages: int, n_lines_per_page: int):
+    page_height = 1000
+    index_data = [
+        [
+            create_line(create_random_sentence(rng), i_line, i_page * page_height)
+            for i_line in range(n_lines_per_page)
+        ]
+        for i_page in range(n_pages)
+    ]
+
+    return DocumentIndex(
+        index_data=index_data,
+        metadata=DocumentMetadata(
+            asset_id="test",
+            width=800,
+            height=n_pages * page_height,
+            n_pages=n_pages,
+            doc_type=DocumentType.DOCUMENT,
+            metadata_pages=[
+                PageMetadata(800, page_height, i * page_height, i)
+                for i in range(n_pages)
+            ],
+        ),
+    )
+
+
+def create_video_frame_contents(rng: random.Random, document_index: DocumentIndex):
+    index_contents = [line.content for line in document_index.concat_index_data]
+    n_lines = rng.randint(0, 8)
+    i_start = rng.randrange(len(index_contents) - n_lines)
+    p_noise = rng.choice([0.0, 0.02, 0.1, 0.3])
+
+    contents = [
+        add_ocr_noise(rng, content, p_noise)
+        for content in index_contents[i_start : i_start + n_lines]
+    ]
+
+    # Lines which are not in the document (e.g. subtitles, UI of the video player)
+    for _ in range(rng.randint(0, 3)):
+        contents.insert(rng.randint(0, len(contents)), create_random_sentence(rng))
+
+    return contents
+
+
+class TestSearchMostMatchingLineEquivalence(unittest.TestCase):
+    """search_most_matching_line must return the same result as the exhaustive search."""
+
+    def assert_same_result(self, document_index: DocumentIndex, contents: list[str]):
+        ocr_result = create_ocr_result(contents)
+
+        expected = document_index.search_most_matching_line_exhaustive(ocr_result)
+        actual = document_index.search_most_matching_line(ocr_result)
+
+        self.assertEqual(actual, expected, msg=f"video frame contents: {contents}")
+
+    def test_random_documents(self):
+        rng = random.Random(0)
+
+        for _ in range(20):
+            document_index = create_document_index(
+                rng, n_pages=rng.randint(1, 3), n_lines_per_page=rng.randint(10, 25)
+            )
+
+            for _ in range(15):
+                self.assert_same_result(
+                    document_index, create_video_frame_contents(rng, document_index)
+                )
+
+    def test_repeated_lines_returns_first_in_scan_order(self):
+        rng = random.Random(1)
+        document_index = create_document_index(rng, n_pages=2, n_lines_per_page=10)
+
+        repeated = ["figure 1 shows the reward curve", "of the trained policy agent"]
+        for page in document_index.index_data:
+            page[3] = create_line(repeated[0], 3)
+            page[4] = create_line(repeated[1], 4)
+
+        document_index = DocumentIndex(
+            index_data=document_index.index_data, metadata=document_index.metadata
+        )
+
+        self.assert_same_result(document_index, repeated + ["page footer text here"])
+        self.assert_same_result(document_index, ["unrelated header line"] + repeated)
+
+    def test_short_video_frames(self):
+        rng = random.Random(2)
+        document_index = create_document_index(rng, n_pages=1, n_lines_per_page=20)
+        index_contents = [line.content for line in document_index.concat_index_data]
+
+        self.assert_same_result(document_index, [])
+        self.assert_same_result(document_index, index_contents[5:6])
+        self.assert_same_result(document_index, index_contents[5:7])
+        self.assert_same_result(document_index, index_contents[5:8])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import queue
+import logging
+import unittest
+
+from util.log import (
+    ROOT_LOGGER_NAME,
+    JSONFormatter,
+    KeyValueFormatter,
+    _DeferredQueueHandler,
+    get_logger,
+)
+
+
+class CountingValue:
+    """Field value counting how many times it is formatted."""
+
+    def __init__(self):
+        self.n_formatted = 0
+
+    def __str__(self):
+        self.n_formatted += 1
+        return "value"
+
+
+class TestLog(unittest.TestCase):
+    def setUp(self):
+        self.queue = queue.SimpleQueue()
+        self.handler = _DeferredQueueHandler(self.queue)
+        self.std_logger = logging.getLogger(f"{ROOT_LOGGER_NAME}.test")
+        self.std_logger.addHandler(self.handler)
+        self.std_logger.setLevel(logging.INFO)
+        self.std_logger.propagate = False
+        self.logger = get_logger("test")
+
+    def tearDown(self):
+        self.std_logger.removeHandler(self.handler)
+        self.std_logger.setLevel(logging.NOTSET)
+        self.std_logger.propagate = True
+
+    def test_records_are_formatted_off_the_logging_thread(self):
+        value = CountingValue()
+
+        # Below the level
+        self.logger.debug("Ignored", value=value)
+        self.assertTrue(self.queue.empty())
+
+        self.logger.info("Request received", path="/asset", value=value, note="a b")
+        record = self.queue.get_nowait()
+        self.assertEqual(value.n_formatted, 0)
+
+        text = KeyValueFormatter().format(record)
+        self.assertTrue(
+            text.endswith(
+                'INFO [test] Request received path=/asset value=value note="a b"'
+            )
+        )
+        self.assertEqual(value.n_formatted, 1)
+
+        data = json.loads(JSONFormatter().format(record))
+        self.assertEqual(data["logger"], "test")
+        self.assertEqual(data["event"], "Request received")
+        self.assertEqual(data["value"], "value")
+
+    def test_exception_is_logged_with_traceback(self):
+        try:
+            raise ValueError("broken")
+        except ValueError:
+            self.logger.exception("Indexing failed", asset_id="asset")
+
+        text = KeyValueFormatter().format(self.queue.get_nowait())
+        self.assertIn("ERROR [test] Indexing failed asset_id=asset", text)
+        self.assertIn("ValueError: broken", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
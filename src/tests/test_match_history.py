@@ -0,0 +1,115 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from match_history import MatchHistory, MatchHistoryStore
+from util.asset import Asset
+from util.config import Config
+
+
+class TestMatchHistory(unittest.TestCase):
+    def test_single_observation_is_not_stable(self):
+        history = MatchHistory(max_gap_sec=5.0)
+        history.record(10.0, "page:1", {"i": 1})
+
+        self.assertIsNone(history.find_stable_result(10.0))
+
+    def test_consecutive_observations_make_stable_interval(self):
+        history = MatchHistory(max_gap_sec=5.0)
+        history.record(10.0, "page:1", {"i": 1})
+        history.record(12.0, "page:1", {"i": 2})
+        history.record(15.0, "page:1", {"i": 3})
+
+        self.assertEqual(history.find_stable_result(13.5), {"i": 3})
+        self.assertIsNone(history.find_stable_result(9.9))
+        self.assertIsNone(history.find_stable_result(15.1))
+
+    def test_gap_and_different_content_split_intervals(self):
+        history = MatchHistory(max_gap_sec=5.0)
+        history.record(0.0, "page:1", {"i": 1})
+        history.record(1.0, "page:1", {"i": 1})
+        history.record(2.0, "page:2", {"i": 2})
+        history.record(3.0, "page:2", {"i": 2})
+        history.record(20.0, "page:2", {"i": 2})
+
+        self.assertEqual(history.find_stable_result(0.5), {"i": 1})
+        self.assertIsNone(history.find_stable_result(1.5))
+        self.assertEqual(history.find_stable_result(2.5), {"i": 2})
+        self.assertIsNone(history.find_stable_result(10.0))
+
+    def test_observation_between_intervals_merges_them(self):
+        history = MatchHistory(max_gap_sec=5.0)
+        history.record(0.0, "line:3", {"i": 3})
+        history.record(8.0, "line:3", {"i": 3})
+        self.assertIsNone(history.find_stable_result(4.0))
+
+        history.record(4.0, "line:3", {"i": 3})
+        self.assertEqual(history.find_stable_result(6.0), {"i": 3})
+
+    def test_json_round_trip(self):
+        history = MatchHistory(max_gap_sec=5.0)
+        history.record(0.0, "page:1", {"i": 1})
+        history.record(1.0, "page:1", {"i": 1})
+
+        restored = MatchHistory.from_json_serializable(
+            history.to_json_serializable(), max_gap_sec=5.0
+        )
+        self.assertEqual(restored.find_stable_result(0.5), {"i": 1})
+
+
+class TestMatchHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        Config().dirpath_data_root = self.dirpath_data_root
+
+    def tearDown(self):
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        shutil.rmtree(self.dirpath_data_root)
+
+    def record_stable(self, store: MatchHistoryStore, asset_id: str, index_version):
+        store.record("video", asset_id, index_version, 0.0, "page:1", {"i": 1})
+        store.record("video", asset_id, index_version, 1.0, "page:1", {"i": 1})
+
+    def test_history_of_another_index_version_is_discarded(self):
+        store = MatchHistoryStore(save_interval_sec=60)
+        self.record_stable(store, "asset", "1")
+        self.assertEqual(store.find_stable_result("video", "asset", "1", 0.5), {"i": 1})
+
+        # The PDF has been indexed again.
+        self.assertIsNone(store.find_stable_result("video", "asset", "2", 0.5))
+        self.assertIsNone(store.find_stable_result("video", "asset", "1", 0.5))
+        store.save_all()
+
+    def test_histories_are_saved_in_background_and_evicted(self):
+        store = MatchHistoryStore(save_interval_sec=0.01, max_histories=1)
+        self.record_stable(store, "asset_a", "1")
+        # asset_a is evicted from memory, and reloaded from its file or the unsaved ones.
+        self.record_stable(store, "asset_b", "1")
+        self.assertEqual(
+            store.find_stable_result("video", "asset_a", "1", 0.5), {"i": 1}
+        )
+
+        path_history = Asset.get_path_match_history("video", "asset_b")
+        store.save_all()
+
+        with open(path_history, encoding="utf-8") as fp:
+            self.assertEqual(json.load(fp)["index_version"], "1")
+
+        restored_store = MatchHistoryStore(save_interval_sec=60)
+        for asset_id in ["asset_a", "asset_b"]:
+            self.assertEqual(
+                restored_store.find_stable_result("video", asset_id, "1", 0.5),
+                {"i": 1},
+            )
+        self.assertIsNone(
+            restored_store.find_stable_result("video", "asset_a", "2", 0.5)
+        )
+        restored_store.save_all()
+        self.assertTrue(os.path.exists(path_history))
+
+
+if __name__ == "__main__":
+    unittest.main()
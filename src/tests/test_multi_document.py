@@ -0,0 +1,176 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import sequence_analyzer
+from multi_document import MultiDocumentIndex
+from ocr import OCRResult
+from document_index_pool import DocumentIndexPool
+from video_frame import VideoFrameImage
+from util.asset import Asset
+from util.config import Config
+from tests.test_line_alignment import create_document_index
+from tests.test_ocr_cascade import FakeOCR, create_pyocr_linebox
+
+ASSET_IDS = ["asset_a", "asset_b", "asset_c"]
+
+
+def get_frame_lines(document_index, i_page: int, n_lines=4):
+    """Returns lines of the page, as read by FakeOCR from a frame."""
+    return [
+        (
+            linebox.content,
+            [
+                [linebox.position.get_left(), linebox.position.get_top()],
+                [linebox.position.get_right(), linebox.position.get_bottom()],
+            ],
+        )
+        for linebox in document_index.index_data[i_page]
+        if len(linebox.content) >= 10
+    ][:n_lines]
+
+
+class TestMultiDocumentIndex(unittest.TestCase):
+    def test_candidate_documents(self):
+        rng = random.Random(0)
+        document_indexes = {
+            asset_id: create_document_index(rng, n_pages=3, n_lines_per_page=20)
+            for asset_id in ASSET_IDS
+        }
+        multi_document_index = MultiDocumentIndex(document_indexes)
+
+        lines = get_frame_lines(document_indexes["asset_b"], 2)
+        ocr_result = OCRResult(
+            [create_pyocr_linebox(content, position) for content, position in lines]
+        )
+
+        candidate_documents = multi_document_index.get_candidate_documents(
+            ocr_result, n_documents=1
+        )
+        # Pages of the document are candidates, the most similar first.
+        self.assertEqual(len(candidate_documents), 1)
+        self.assertEqual(candidate_documents[0][0], "asset_b")
+        self.assertEqual(candidate_documents[0][1][0], 2)
+
+        self.assertTrue(multi_document_index.is_built_from(dict(document_indexes)))
+        document_indexes["asset_b"] = create_document_index(rng, 3, 20)
+        self.assertFalse(multi_document_index.is_built_from(document_indexes))
+
+    def test_all_documents_without_similar_pages(self):
+        rng = random.Random(0)
+        multi_document_index = MultiDocumentIndex(
+            {
+                asset_id: create_document_index(rng, n_pages=3, n_lines_per_page=20)
+                for asset_id in ASSET_IDS
+            }
+        )
+        ocr_result = OCRResult(
+            [create_pyocr_linebox("zzzz qqqq xxxx", [[0, 0], [600, 30]])]
+        )
+
+        self.assertEqual(
+            multi_document_index.get_candidate_documents(ocr_result, n_documents=1),
+            [(asset_id, None) for asset_id in ASSET_IDS],
+        )
+
+
+class TestSequenceAnalyzerMultiDocument(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        self.prev_no_text_filter_enabled = Config().matching_no_text_filter_enabled
+        self.prev_n_candidates = Config().matching_multi_document_n_candidates
+        Config().dirpath_data_root = self.dirpath_data_root
+        # Frames of the tests are blank.
+        Config().matching_no_text_filter_enabled = False
+        Config().matching_multi_document_n_candidates = 1
+        os.makedirs(Asset.get_dirpath_document_index())
+
+        rng = random.Random(0)
+        self.document_indexes = {}
+
+        for asset_id in ASSET_IDS:
+            document_index = create_document_index(rng, n_pages=3, n_lines_per_page=20)
+            self.document_indexes[asset_id] = document_index
+
+            with open(Asset.get_path_document_index(asset_id), "w") as fp:
+                json.dump(document_index.to_json_serializable(), fp)
+
+    def tearDown(self):
+        for asset_id in ASSET_IDS:
+            DocumentIndexPool.get_instance().invalidate(asset_id)
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        Config().matching_no_text_filter_enabled = self.prev_no_text_filter_enabled
+        Config().matching_multi_document_n_candidates = self.prev_n_candidates
+        shutil.rmtree(self.dirpath_data_root)
+
+    def create_sequence_analyzer(self, ocr):
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ):
+            return sequence_analyzer.SequenceAnalyzer("")
+
+    def test_frame_is_matched_in_its_document(self):
+        lines = get_frame_lines(self.document_indexes["asset_c"], 1)
+        ocr = FakeOCR(lines, 1.0)
+        sqa = self.create_sequence_analyzer(ocr)
+        video_frame = VideoFrameImage(Image.new("L", (1280, 720)))
+
+        expected = sqa.match_content_sequence("asset_c", video_frame)
+        self.assertTrue(expected.content_sequence_matched)
+        ocr.scales.clear()
+
+        pool = DocumentIndexPool.get_instance()
+        get = pool.get
+        searched_asset_ids = []
+
+        def get_document_index(asset_id):
+            document_index = get(asset_id)
+            if document_index is None:
+                return None
+
+            search = document_index.search_most_matching_line
+
+            def search_most_matching_line(*args, **kwargs):
+                searched_asset_ids.append(asset_id)
+                return search(*args, **kwargs)
+
+            document_index.search_most_matching_line = search_most_matching_line
+            return document_index
+
+        with mock.patch.object(pool, "get", side_effect=get_document_index):
+            result = sqa.match_content_sequence_multi(
+                ASSET_IDS + ["missing"], video_frame
+            )
+
+        self.assertTrue(result.content_sequence_matched)
+        self.assertEqual(result.asset_id, "asset_c")
+        self.assertEqual(
+            result.content_matching_result.i_line_index_data,
+            expected.content_matching_result.i_line_index_data,
+        )
+        self.assertEqual(
+            result.viewport_estimation_result.get_relative_bbox_tuple(),
+            expected.viewport_estimation_result.get_relative_bbox_tuple(),
+        )
+        # The frame is OCRed once, and only the candidate document is searched.
+        self.assertEqual(ocr.scales, [1.0])
+        self.assertEqual(searched_asset_ids, ["asset_c"])
+
+    def test_no_document_available(self):
+        sqa = self.create_sequence_analyzer(FakeOCR([], 1.0))
+        result = sqa.match_content_sequence_multi(
+            ["missing"], VideoFrameImage(Image.new("L", (1280, 720)))
+        )
+        self.assertFalse(result.document_available)
+        self.assertFalse(result.content_sequence_matched)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from PIL import Image
+
+import sequence_analyzer
+from ocr import OCRResult
+from document_index_pool import DocumentIndexPool
+from video_frame import VideoFrameImage
+from util.asset import Asset
+from util.config import Config
+from util.metrics import Metrics
+from tests.test_line_alignment import add_ocr_noise, create_document_index
+
+
+def create_pyocr_linebox(content: str, position):
+    return SimpleNamespace(
+        word_boxes=[SimpleNamespace(content=word) for word in content.split()],
+        position=position,
+    )
+
+
+class FakeOCR:
+    """OCR returning the given lines of the frame, as read from the frame resized by scale."""
+
+    def __init__(self, lines, readable_scale_min: float):
+        self.lines = lines
+        self.readable_scale_min = readable_scale_min
+        self.scales = []
+
+    def extract(self, pil_image, language, scale=1.0, timeout_sec=None):
+        self.scales.append(scale)
+        rng = random.Random(0)
+
+        return OCRResult(
+            [
+                create_pyocr_linebox(
+                    (
+                        content
+                        if scale >= self.readable_scale_min
+                        else add_ocr_noise(rng, content, 0.5)
+                    ),
+                    [[round(x * scale), round(y * scale)] for x, y in position],
+                )
+                for content, position in self.lines
+            ],
+            scale=scale,
+        )
+
+
+class TestOCRCascade(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        self.prev_scale_tiers = Config().matching_ocr_scale_tiers
+        self.prev_no_text_filter_enabled = Config().matching_no_text_filter_enabled
+        self.prev_cascade_min_score = Config().matching_ocr_cascade_min_score
+        Config().dirpath_data_root = self.dirpath_data_root
+        # Frames of the tests are blank.
+        Config().matching_no_text_filter_enabled = False
+        os.makedirs(Asset.get_dirpath_document_index())
+        Metrics.get_instance().reset()
+
+        document_index = create_document_index(
+            random.Random(0), n_pages=2, n_lines_per_page=20
+        )
+        with open(Asset.get_path_document_index("asset"), "w") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+
+        # Lines of the document shown in the frame (moved by 40px)
+        self.lines = [
+            (
+                linebox.content,
+                [
+                    [linebox.position.get_left() + 40, linebox.position.get_top()],
+                    [linebox.position.get_right() + 40, linebox.position.get_bottom()],
+                ],
+            )
+            for linebox in document_index.concat_index_data
+            if len(linebox.content) >= 10
+        ][:4]
+
+        self.video_frame = VideoFrameImage(Image.new("L", (1280, 720)))
+
+    def tearDown(self):
+        DocumentIndexPool.get_instance().invalidate("asset")
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        Config().matching_ocr_scale_tiers = self.prev_scale_tiers
+        Config().matching_no_text_filter_enabled = self.prev_no_text_filter_enabled
+        Config().matching_ocr_cascade_min_score = self.prev_cascade_min_score
+        shutil.rmtree(self.dirpath_data_root)
+
+    def match(self, scale_tiers: list[float], readable_scale_min: float, ocr=None):
+        Config().matching_ocr_scale_tiers = scale_tiers
+        ocr = ocr or FakeOCR(self.lines, readable_scale_min)
+
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ):
+            result = sequence_analyzer.SequenceAnalyzer("").match_content_sequence(
+                "asset", self.video_frame
+            )
+
+        return result, ocr.scales
+
+    def test_positions_are_scaled_back(self):
+        ocr_result = OCRResult(
+            [create_pyocr_linebox("scaled line content", [[10, 20], [110, 35]])],
+            scale=0.5,
+        )
+        self.assertEqual(ocr_result.data[0].position.bbox[:2], ((20, 40), (220, 70)))
+
+    def test_stops_at_confident_tier(self):
+        expected, scales = self.match([1.0], readable_scale_min=1.0)
+        self.assertTrue(expected.content_sequence_matched)
+        self.assertEqual(scales, [1.0])
+
+        result, scales = self.match([0.5, 1.0], readable_scale_min=0.5)
+        self.assertEqual(scales, [0.5])
+        self.assertEqual(
+            result.viewport_estimation_result, expected.viewport_estimation_result
+        )
+
+        stats = sequence_analyzer.SequenceAnalyzer.get_ocr_cascade_stats()
+        self.assertEqual(stats[0]["n_attempts"], 1)
+        self.assertEqual(stats[0]["hit_rate"], 1.0)
+        self.assertEqual(stats[1]["n_attempts"], 1)  # by the first match with [1.0]
+
+    def test_falls_back_to_full_resolution(self):
+        result, scales = self.match([0.5, 1.0], readable_scale_min=1.0)
+        self.assertTrue(result.content_sequence_matched)
+        self.assertEqual(scales, [0.5, 1.0])
+
+        stats = sequence_analyzer.SequenceAnalyzer.get_ocr_cascade_stats()
+        self.assertEqual(stats[0]["hit_rate"], 0.0)
+        self.assertEqual(stats[1]["hit_rate"], 1.0)
+
+    def test_keeps_match_of_smaller_scale(self):
+        expected, _ = self.match([0.5], readable_scale_min=0.5)
+        self.assertTrue(expected.content_sequence_matched)
+
+        class FakeOCRReadingOnlySmallerScales(FakeOCR):
+            def extract(self, pil_image, language, scale=1.0, timeout_sec=None):
+                ocr_result = super().extract(pil_image, language, scale, timeout_sec)
+                return ocr_result if scale < 1.0 else OCRResult([], scale=scale)
+
+        # The match of the first tier is not confident, and the next tier finds nothing.
+        Config().matching_ocr_cascade_min_score = 1.1
+        result, scales = self.match(
+            [0.5, 1.0],
+            readable_scale_min=0.5,
+            ocr=FakeOCRReadingOnlySmallerScales(self.lines, 0.5),
+        )
+        self.assertEqual(scales, [0.5, 1.0])
+        self.assertTrue(result.content_sequence_matched)
+        self.assertEqual(
+            result.viewport_estimation_result, expected.viewport_estimation_result
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
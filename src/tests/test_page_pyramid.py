@@ -0,0 +1,178 @@
+import os
+import math
+import random
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from document_index import PageMetadata
+from page_pyramid import PagePyramidWriter, get_dirpath_tiles, get_n_levels
+
+WIDTH = 600
+MARGIN = 13
+
+
+def create_pages(rng: random.Random, n_pages: int):
+    pages = []
+    metadata_pages = []
+    offset_top = 0
+
+    for i_page in range(n_pages):
+        width = rng.choice([WIDTH, WIDTH, WIDTH - 100])
+        height = rng.randint(300, 900)
+        page = Image.new("RGB", (width, height), (rng.randrange(256),) * 3)
+        draw = ImageDraw.Draw(page)
+
+        for _ in range(30):
+            left, top = rng.randrange(width), rng.randrange(height)
+            draw.rectangle(
+                (left, top, left + rng.randrange(99), top + rng.randrange(99)),
+                fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)),
+            )
+
+        pages.append(page)
+        metadata_pages.append(PageMetadata(width, height, offset_top, i_page))
+        offset_top += height + MARGIN
+
+    return pages, metadata_pages, offset_top
+
+
+class TestPagePyramidWriter(unittest.TestCase):
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        self.path_dzi = os.path.join(self.dirpath, "asset.dzi")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def write(
+        self,
+        pages,
+        metadata_pages,
+        height,
+        tile_size=254,
+        overlap=1,
+        height_on_close=False,
+    ):
+        writer = PagePyramidWriter(
+            self.path_dzi,
+            WIDTH,
+            None if height_on_close else height,
+            tile_size=tile_size,
+            overlap=overlap,
+            tile_format="png",
+        )
+        for page, page_metadata in zip(pages, metadata_pages):
+            writer.add_page(page, page_metadata)
+        writer.close(height=height if height_on_close else None)
+
+    def read_tiles(self):
+        """Returns the contents of the files of the pyramid: relative path -> bytes."""
+        tiles = {}
+        dirpath_tiles = get_dirpath_tiles(self.path_dzi)
+
+        for dirpath, _, filenames in os.walk(dirpath_tiles):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as fp:
+                    tiles[os.path.relpath(path, dirpath_tiles)] = fp.read()
+
+        with open(self.path_dzi, "rb") as fp:
+            tiles[self.path_dzi] = fp.read()
+
+        return tiles
+
+    def read_level(self, level: int, width: int, height: int, tile_size: int, overlap):
+        """Assembles the image of the level from its tiles, checking their sizes."""
+        dirpath_level = os.path.join(get_dirpath_tiles(self.path_dzi), str(level))
+        n_cols = math.ceil(width / tile_size)
+        n_rows = math.ceil(height / tile_size)
+        self.assertEqual(len(os.listdir(dirpath_level)), n_cols * n_rows)
+
+        image = Image.new("RGB", (width, height))
+
+        for i_col in range(n_cols):
+            for i_row in range(n_rows):
+                left = max(0, i_col * tile_size - overlap)
+                top = max(0, i_row * tile_size - overlap)
+                tile = Image.open(os.path.join(dirpath_level, f"{i_col}_{i_row}.png"))
+
+                self.assertEqual(
+                    tile.size,
+                    (
+                        min(width, (i_col + 1) * tile_size + overlap) - left,
+                        min(height, (i_row + 1) * tile_size + overlap) - top,
+                    ),
+                )
+                image.paste(tile, (left, top))
+
+        return image
+
+    def test_levels(self):
+        pages, metadata_pages, height = create_pages(random.Random(0), n_pages=7)
+        self.write(pages, metadata_pages, height)
+
+        dzi = ET.parse(self.path_dzi).getroot()
+        self.assertEqual(dzi.attrib["TileSize"], "254")
+        self.assertEqual(dzi[0].attrib, {"Width": str(WIDTH), "Height": str(height)})
+
+        expected = Image.new("RGB", (WIDTH, height), (255, 255, 255))
+        for page, page_metadata in zip(pages, metadata_pages):
+            expected.paste(page, (0, page_metadata.offset_top))
+
+        n_levels = get_n_levels(WIDTH, height)
+        self.assertEqual(n_levels, 14)
+
+        for level in range(n_levels):
+            scale = 2 ** (n_levels - 1 - level)
+            image = self.read_level(
+                level, math.ceil(WIDTH / scale), math.ceil(height / scale), 254, 1
+            )
+
+            if level == n_levels - 1:
+                self.assertEqual(image.tobytes(), expected.tobytes())
+            elif level == n_levels - 2:
+                # Each pixel is the average of 2x2 pixels of the full size.
+                n_rows = height // 2
+                pixels = np.asarray(expected, dtype=float)[: n_rows * 2]
+                pixels = pixels.reshape(n_rows, 2, WIDTH // 2, 2, 3).mean(axis=(1, 3))
+                np.testing.assert_allclose(np.asarray(image)[:n_rows], pixels, atol=1)
+
+    def test_tile_size_and_overlap(self):
+        pages, metadata_pages, height = create_pages(random.Random(1), n_pages=3)
+        self.write(pages, metadata_pages, height, tile_size=100, overlap=3)
+
+        n_levels = get_n_levels(WIDTH, height)
+        self.read_level(n_levels - 1, WIDTH, height, 100, 3)
+
+    def test_height_given_on_close(self):
+        pages, metadata_pages, height = create_pages(random.Random(3), n_pages=4)
+        self.write(pages, metadata_pages, height)
+        expected = self.read_tiles()
+
+        self.write(pages, metadata_pages, height, height_on_close=True)
+        self.assertEqual(self.read_tiles(), expected)
+        self.assertEqual(
+            len(os.listdir(get_dirpath_tiles(self.path_dzi))),
+            get_n_levels(WIDTH, height),
+        )
+
+    def test_replaces_previous_pyramid(self):
+        pages, metadata_pages, height = create_pages(random.Random(2), n_pages=5)
+        self.write(pages, metadata_pages, height)
+        self.write(pages[:1], metadata_pages[:1], metadata_pages[0].height)
+
+        n_levels = get_n_levels(WIDTH, metadata_pages[0].height)
+        self.assertEqual(
+            sorted(os.listdir(get_dirpath_tiles(self.path_dzi)), key=int),
+            [str(level) for level in range(n_levels)],
+        )
+        self.assertFalse(os.path.exists(get_dirpath_tiles(self.path_dzi) + ".tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageDraw
+
+from pdf import PDFLoader, get_ranges
+from page_render_cache import PageRenderCache
+
+SHA256 = "ab" * 32
+
+
+def create_page(i_page: int, mode="L"):
+    image = Image.new(mode, (200, 300), "white")
+    ImageDraw.Draw(image).text((20, 20 + i_page * 10), f"Page {i_page}", fill="black")
+    return image
+
+
+class TestPageRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def test_get_and_put(self):
+        cache = PageRenderCache(self.dirpath, max_bytes=1 << 20)
+        self.assertIsNone(cache.get(SHA256, 1, 200, "L"))
+
+        cache.put(SHA256, 1, 200, "L", create_page(1, mode="RGB"))
+        image = cache.get(SHA256, 1, 200, "L")
+        self.assertEqual(image.mode, "L")
+        self.assertEqual(image.tobytes(), create_page(1).tobytes())
+
+        # Pages of other render settings are not shared.
+        self.assertIsNone(cache.get(SHA256, 1, 300, "L"))
+        self.assertIsNone(cache.get(SHA256, 1, 200, "RGB"))
+        self.assertEqual((cache.n_hits, cache.n_misses), (1, 3))
+
+        # Pages are found by another instance (e.g. after a restart).
+        cache = PageRenderCache(self.dirpath, max_bytes=1 << 20)
+        self.assertIsNotNone(cache.get(SHA256, 1, 200, "L"))
+        self.assertGreater(cache.get_total_bytes(), 0)
+
+    def test_evicts_least_recently_used(self):
+        cache = PageRenderCache(self.dirpath, max_bytes=1 << 20)
+        cache.put(SHA256, 1, 200, "L", create_page(1))
+        page_size = cache.get_total_bytes()
+
+        cache = PageRenderCache(self.dirpath, max_bytes=int(page_size * 3.5))
+        cache.put(SHA256, 2, 200, "L", create_page(2))
+        cache.put(SHA256, 3, 200, "L", create_page(3))
+        self.assertIsNotNone(cache.get(SHA256, 1, 200, "L"))
+
+        cache.put(SHA256, 4, 200, "L", create_page(4))
+        self.assertIsNone(cache.get(SHA256, 2, 200, "L"))
+        for i_page in [1, 3, 4]:
+            self.assertIsNotNone(cache.get(SHA256, i_page, 200, "L"))
+
+        self.assertLessEqual(cache.get_total_bytes(), page_size * 3.5)
+        self.assertFalse(os.path.exists(cache.get_path(SHA256, 2, 200, "L")))
+
+    def test_removes_only_stale_tmp_files(self):
+        path_stale = os.path.join(self.dirpath, "stale.png.1.tmp")
+        path_writing = os.path.join(self.dirpath, "writing.png.2.tmp")
+        for path in [path_stale, path_writing]:
+            with open(path, "wb") as fp:
+                fp.write(b"partial")
+        os.utime(path_stale, (0, 0))
+
+        cache = PageRenderCache(self.dirpath, max_bytes=1 << 20)
+        self.assertFalse(os.path.exists(path_stale))
+        self.assertTrue(os.path.exists(path_writing))
+        self.assertEqual(cache.get_total_bytes(), 0)
+
+    def test_size_is_kept_for_caches_of_processes(self):
+        cache = PageRenderCache(self.dirpath, max_bytes=1 << 20)
+        cache.put(SHA256, 1, 200, "L", create_page(1))
+        page_size = cache.get_total_bytes()
+        shutil.rmtree(self.dirpath)
+
+        # Caches of two processes sharing the directory
+        caches = [
+            PageRenderCache(
+                self.dirpath, max_bytes=int(page_size * 3.5), rescan_interval_sec=0
+            )
+            for _ in range(2)
+        ]
+        for i_page in range(1, 5):
+            caches[i_page % 2].put(SHA256, i_page, 200, "L", create_page(i_page))
+
+        total_bytes = sum(
+            os.path.getsize(os.path.join(dirpath, filename))
+            for dirpath, _, filenames in os.walk(self.dirpath)
+            for filename in filenames
+        )
+        self.assertLessEqual(total_bytes, page_size * 3.5)
+        self.assertEqual(caches[0].get_total_bytes(), total_bytes)
+        self.assertIsNone(caches[1].get(SHA256, 1, 200, "L"))
+        # Pages stored by the other process are found.
+        self.assertIsNotNone(caches[1].get(SHA256, 4, 200, "L"))
+
+
+class TestPDFLoaderWithPageRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        self.path_pdf = os.path.join(self.dirpath, "test.pdf")
+        with open(self.path_pdf, "wb") as fp:
+            fp.write(b"%PDF-1.4 test")
+
+        self.prev_path = os.environ["PATH"]
+        self.cache = PageRenderCache(
+            os.path.join(self.dirpath, "cache"), max_bytes=1 << 20
+        )
+        self.loader = PDFLoader("", page_render_cache=self.cache, color_mode="L")
+
+    def tearDown(self):
+        os.environ["PATH"] = self.prev_path
+        shutil.rmtree(self.dirpath)
+
+    def convert(self, i_start=None, i_end=None):
+        """Converts the PDF of 5 pages, and returns the ranges of pages rendered by poppler."""
+        rendered_ranges = []
+
+        def convert_from_path(path, dpi, first_page, last_page, grayscale):
+            rendered_ranges.append((first_page, last_page))
+            return [create_page(i) for i in range(first_page, last_page + 1)]
+
+        with mock.patch(
+            "pdf2image.convert_from_path", side_effect=convert_from_path
+        ), mock.patch("pdf2image.pdfinfo_from_path", return_value={"Pages": 5}):
+            result = self.loader.convert_pdf_to_img(self.path_pdf, i_start, i_end)
+
+        self.assertEqual(
+            [image.tobytes() for image in result.image_pages],
+            [create_page(i).tobytes() for i in range(i_start or 1, (i_end or 5) + 1)],
+        )
+        return rendered_ranges
+
+    def test_renders_only_pages_not_cached(self):
+        self.assertEqual(self.convert(2, 3), [(2, 3)])
+        self.assertEqual(self.convert(), [(1, 1), (4, 5)])
+        self.assertEqual(self.convert(), [])
+
+    def test_renders_pages_by_ranges(self):
+        loader = PDFLoader("", n_pages_per_range=2)
+        rendered_ranges = []
+
+        def convert_from_path(path, dpi, first_page, last_page, grayscale):
+            rendered_ranges.append((first_page, last_page))
+            return [create_page(i) for i in range(first_page, last_page + 1)]
+
+        with mock.patch(
+            "pdf2image.convert_from_path", side_effect=convert_from_path
+        ), mock.patch("pdf2image.pdfinfo_from_path", return_value={"Pages": 5}):
+            offset_top = 0
+
+            for i, (image, page_metadata) in enumerate(
+                loader.iter_pages(self.path_pdf)
+            ):
+                # The next range is rendered after the pages of the range are used.
+                self.assertEqual(rendered_ranges[-1][0], i // 2 * 2 + 1)
+                self.assertEqual(image.tobytes(), create_page(i + 1).tobytes())
+                self.assertEqual(page_metadata.offset_top, offset_top)
+                offset_top += image.height
+
+        self.assertEqual(rendered_ranges, [(1, 2), (3, 4), (5, 5)])
+
+    def test_get_ranges(self):
+        self.assertEqual(get_ranges([]), [])
+        self.assertEqual(get_ranges([1, 2, 3, 5, 7, 8]), [(1, 3), (5, 5), (7, 8)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import random
+import unittest
+from unittest import mock
+
+import page_signature
+from ocr import OCRResult
+from document_index import DocumentType
+from page_signature import PageSignatureIndex, get_shingles
+from tests.test_line_alignment import create_document_index
+from tests.test_ocr_cascade import create_pyocr_linebox
+
+
+PAGE_TEXTS = [
+    "Integrating Video Viewing and Document Exploration\nSwapVid interface overview",
+    "Related work on lecture video navigation\nDocument-based video navigation",
+    "User study with twelve participants\nTasks and measurements",
+    "",
+]
+
+
+class TestPageSignatureIndex(unittest.TestCase):
+    def test_shingles_are_normalized(self):
+        self.assertEqual(get_shingles("AB  c", 3), {"ab ", "b c"})
+        self.assertEqual(get_shingles("ab", 3), {"ab"})
+        self.assertEqual(get_shingles("  ", 3), set())
+
+    def test_same_text_is_the_first_candidate(self):
+        page_signature_index = PageSignatureIndex(PAGE_TEXTS)
+
+        for i_page, page_text in enumerate(PAGE_TEXTS[:3]):
+            self.assertEqual(
+                page_signature_index.get_candidate_pages(page_text)[0], i_page
+            )
+
+    def test_partial_text_finds_the_page(self):
+        page_signature_index = PageSignatureIndex(PAGE_TEXTS)
+
+        self.assertIn(
+            2, page_signature_index.get_candidate_pages("User study with twelve")
+        )
+
+    def test_empty_text_has_no_candidates(self):
+        page_signature_index = PageSignatureIndex(PAGE_TEXTS)
+
+        self.assertEqual(page_signature_index.get_candidate_pages(""), [])
+
+
+class TestDocumentIndexCandidatePages(unittest.TestCase):
+    def create_ocr_result(self, contents: list[str]):
+        return OCRResult(
+            [
+                create_pyocr_linebox(content, [[0, 40 * i], [600, 40 * i + 30]])
+                for i, content in enumerate(contents)
+            ]
+        )
+
+    def test_page_signatures_are_built_on_first_use(self):
+        with mock.patch.object(
+            page_signature, "PageSignatureIndex", wraps=PageSignatureIndex
+        ) as page_signature_index_class:
+            document_index = create_document_index(random.Random(0), 4, 10)
+            document_index.metadata.doc_type = DocumentType.SLIDE
+            self.assertEqual(page_signature_index_class.call_count, 0)
+
+            contents = [linebox.content for linebox in document_index.index_data[2][:4]]
+            for _ in range(2):
+                candidate_pages = document_index.get_candidate_pages(
+                    self.create_ocr_result(contents)
+                )
+                self.assertEqual(candidate_pages[0], 2)
+
+            self.assertEqual(page_signature_index_class.call_count, 1)
+
+    def test_all_pages_are_searched_without_candidates(self):
+        document_index = create_document_index(random.Random(0), 4, 10)
+        ocr_result = self.create_ocr_result(["zzzz qqqq xxxx"])
+        self.assertIsNone(document_index.get_candidate_pages(ocr_result))
+
+        # No page is similar to the frame.
+        document_index.metadata.doc_type = DocumentType.SLIDE
+        self.assertIsNone(document_index.get_candidate_pages(ocr_result))
+
+
+if __name__ == "__main__":
+    unittest.main()
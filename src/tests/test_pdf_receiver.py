@@ -0,0 +1,77 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import serve_pdf_receiver
+from asset_catalog import AssetCatalog, IndexStatus
+from document_index_pool import DocumentIndexPool
+from util.asset import Asset
+from util.config import Config
+from util.pdf_hash_registry import calc_file_sha256
+from tests.test_line_alignment import create_document_index
+
+
+class TestPdfReceiverDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        Config().dirpath_data_root = self.dirpath_data_root
+        os.makedirs(Asset.get_dirpath_pdf_src())
+        os.makedirs(Asset.get_dirpath_document_index())
+
+    def tearDown(self):
+        DocumentIndexPool.get_instance().invalidate("dst")
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        shutil.rmtree(self.dirpath_data_root)
+
+    def write_pdf(self, asset_id: str, mtime: int):
+        path = Asset.get_path_pdf_src(asset_id)
+        with open(path, "wb") as fp:
+            fp.write(b"%PDF-same content")
+        os.utime(path, (mtime, mtime))
+
+    def test_same_pdf_gets_a_fresh_index_of_its_own(self):
+        document_index = create_document_index(random.Random(0), 2, 10)
+        document_index.metadata.asset_id = "src"
+        path_src_index = Asset.get_path_document_index("src")
+
+        self.write_pdf("src", 100)
+        with open(path_src_index, "w", encoding="utf-8") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+        os.utime(path_src_index, (200, 200))
+
+        # The same PDF is received later as another asset.
+        self.write_pdf("dst", 300)
+        registry = mock.Mock()
+        registry.get_hash.return_value = None
+        registry.find_indexed_asset.return_value = "src"
+
+        with mock.patch.object(
+            serve_pdf_receiver.PdfHashRegistry, "get_instance", return_value=registry
+        ):
+            index_status = serve_pdf_receiver.update_document_index(
+                "dst", calc_file_sha256(Asset.get_path_pdf_src("dst")), False
+            )
+
+        self.assertEqual(index_status, "linked")
+
+        with open(Asset.get_path_document_index("dst"), encoding="utf-8") as fp:
+            self.assertEqual(json.load(fp)["metadata"]["asset_id"], "dst")
+
+        with open(path_src_index, encoding="utf-8") as fp:
+            self.assertEqual(json.load(fp)["metadata"]["asset_id"], "src")
+
+        catalog = AssetCatalog(min_refresh_interval_sec=0)
+        catalog.get_snapshot()
+        catalog.wait_for_details()
+        assets = {asset.asset_id: asset for asset in catalog.get_snapshot().assets}
+        self.assertEqual(assets["dst"].index_status, IndexStatus.FRESH)
+        self.assertEqual(assets["dst"].doc_type, "document")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import json
+import asyncio
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import document_pdf
+from ocr import OCRResult
+from util.asset import Asset
+from util.config import Config
+from util.profiling import Profiler, HEADER_PROFILE_REQUEST
+from tests.test_page_render_cache import create_page
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = Profiler.get_instance()
+        self.prev_settings = (
+            self.profiler.enabled,
+            self.profiler.sample_every_n,
+            self.profiler.allow_request_header,
+            self.profiler.dirpath_profiles,
+        )
+        self.dirpath_profiles = tempfile.mkdtemp()
+        self.profiler.dirpath_profiles = self.dirpath_profiles
+
+    def tearDown(self):
+        (
+            self.profiler.enabled,
+            self.profiler.sample_every_n,
+            self.profiler.allow_request_header,
+            self.profiler.dirpath_profiles,
+        ) = self.prev_settings
+        shutil.rmtree(self.dirpath_profiles)
+
+    def test_should_profile_samples_1_in_n_jobs(self):
+        self.profiler.enabled = True
+        self.profiler.sample_every_n = 3
+
+        self.assertEqual(
+            [self.profiler.should_profile("test_sampling") for _ in range(7)],
+            [True, False, False, True, False, False, True],
+        )
+        # Jobs are counted per job name.
+        self.assertTrue(self.profiler.should_profile("test_sampling_other"))
+
+    def test_should_profile_when_disabled(self):
+        self.profiler.enabled = False
+        self.profiler.sample_every_n = 1
+
+        self.assertFalse(self.profiler.should_profile("test_disabled"))
+        self.assertTrue(self.profiler.should_profile("test_disabled", force=True))
+
+    def test_is_requested_by_header(self):
+        self.profiler.allow_request_header = True
+
+        for value, expected in [
+            ("1", True),
+            ("True", True),
+            ("yes", True),
+            ("0", False),
+        ]:
+            with self.subTest(value=value):
+                self.assertEqual(
+                    self.profiler.is_requested_by_header(
+                        {HEADER_PROFILE_REQUEST: value}
+                    ),
+                    expected,
+                )
+
+        self.assertFalse(self.profiler.is_requested_by_header({}))
+        self.assertFalse(self.profiler.is_requested_by_header(None))
+
+        self.profiler.allow_request_header = False
+        self.assertFalse(
+            self.profiler.is_requested_by_header({HEADER_PROFILE_REQUEST: "1"})
+        )
+
+    def test_profile_writes_stats_and_summary(self):
+        self.profiler.enabled = False
+
+        with self.profiler.profile("test_write", "asset", force=True):
+            sum(range(1000))
+
+        filenames = sorted(os.listdir(self.dirpath_profiles))
+        self.assertEqual(
+            [os.path.splitext(name)[1] for name in filenames], [".json", ".prof"]
+        )
+
+        with open(os.path.join(self.dirpath_profiles, filenames[0])) as fp:
+            summary = json.load(fp)
+        self.assertEqual(
+            (summary["job_name"], summary["asset_id"]), ("test_write", "asset")
+        )
+
+        # Jobs which are not selected are not profiled.
+        with self.profiler.profile("test_write", "asset"):
+            pass
+        self.assertEqual(len(os.listdir(self.dirpath_profiles)), 2)
+
+
+class TestDocumentIndexProfiling(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        self.prev_page_render_cache_enabled = Config().page_render_cache_enabled
+        Config().dirpath_data_root = self.dirpath_data_root
+        Config().page_render_cache_enabled = False
+        os.makedirs(Asset.get_dirpath_pdf_src())
+        with open(Asset.get_path_pdf_src("asset"), "wb") as fp:
+            fp.write(b"%PDF-1.4 test")
+
+        self.profiler = Profiler.get_instance()
+        self.prev_dirpath_profiles = self.profiler.dirpath_profiles
+        self.profiler.dirpath_profiles = os.path.join(self.dirpath_data_root, "prof")
+
+    def tearDown(self):
+        self.profiler.dirpath_profiles = self.prev_dirpath_profiles
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        Config().page_render_cache_enabled = self.prev_page_render_cache_enabled
+        shutil.rmtree(self.dirpath_data_root)
+
+    def test_job_is_profiled_off_the_event_loop(self):
+        ocr_threads = []
+        progress = []
+
+        def extract(*args, **kwargs):
+            ocr_threads.append(threading.current_thread())
+            return OCRResult([])
+
+        async def progress_handler(value: float):
+            progress.append((value, threading.current_thread()))
+
+        async def generate():
+            return await document_pdf.DocumentPDF(
+                "asset", self.dirpath_data_root
+            ).generate_document_index_data(
+                None,
+                Asset.get_dirpath_document_index(),
+                "",
+                save_file=False,
+                progress_callback_async=progress_handler,
+                force_profiling=True,
+            )
+
+        ocr = mock.Mock()
+        ocr.extract.side_effect = extract
+        with mock.patch.object(
+            document_pdf, "get_shared_tesseract_ocr", return_value=ocr
+        ), mock.patch(
+            "pdf2image.convert_from_path",
+            side_effect=lambda path, dpi, first_page, last_page, grayscale: [
+                create_page(i) for i in range(first_page, last_page + 1)
+            ],
+        ), mock.patch(
+            "pdf2image.pdfinfo_from_path", return_value={"Pages": 3}
+        ):
+            document_index = asyncio.run(generate())
+
+        self.assertEqual(document_index.metadata.n_pages, 3)
+        # Pages are OCRed in a worker thread, and the progress is sent on the event loop.
+        self.assertEqual(len(ocr_threads), 3)
+        self.assertTrue(
+            all(thread is not threading.main_thread() for thread in ocr_threads)
+        )
+        self.assertEqual([value for value, _ in progress], [0, 1 / 3, 2 / 3])
+        self.assertTrue(
+            all(thread is threading.main_thread() for _, thread in progress)
+        )
+        self.assertEqual(len(os.listdir(self.profiler.dirpath_profiles)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from PIL import Image
+
+import sequence_analyzer
+from ocr import OCRResult
+from progressive_ocr import BandOCR, get_bands
+from document_index import DocumentType
+from document_index_pool import DocumentIndexPool
+from video_frame import VideoFrameImage
+from util.asset import Asset
+from util.config import Config
+from util.metrics import Metrics
+from tests.test_line_alignment import create_document_index
+
+
+class FakeBandOCR:
+    """
+    OCR returning the lines of the frame inside the given band.
+    Lines cut by the band are read as garbage, as Tesseract would.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines  # (content, top, bottom) in the frame
+        self.bands = []
+
+    def extract(self, pil_image, language, scale=1.0, timeout_sec=None, crop_top=0):
+        self.bands.append((crop_top, crop_top + pil_image.height))
+        lineboxes = []
+
+        for content, top, bottom in self.lines:
+            top, bottom = (
+                round(top * scale) - crop_top,
+                round(bottom * scale) - crop_top,
+            )
+
+            if bottom <= 0 or top >= pil_image.height:
+                continue
+
+            if top < 0 or bottom > pil_image.height:
+                content = "garbage of a cut line"
+
+            lineboxes.append(
+                SimpleNamespace(
+                    word_boxes=[SimpleNamespace(content=w) for w in content.split()],
+                    position=[[10, top], [500, bottom]],
+                )
+            )
+
+        return OCRResult(lineboxes, scale=scale, crop_top=crop_top)
+
+
+class TestBands(unittest.TestCase):
+    def test_each_line_is_taken_whole_from_one_band(self):
+        height, band_height, overlap = 720, 240, 40
+        bands = get_bands(height, band_height, overlap)
+
+        self.assertEqual(bands[0][0], 0)
+        self.assertEqual(bands[-1][1:], (height, height))
+
+        for line_height in range(1, 2 * overlap + 1):
+            for top in range(0, height - line_height + 1):
+                bottom = top + line_height
+                center = (top + bottom) / 2
+                prev_limits = [0] + [limit for _, _, limit in bands]
+
+                taking_bands = [
+                    (band_top, band_bottom)
+                    for (band_top, band_bottom, limit), prev_limit in zip(
+                        bands, prev_limits
+                    )
+                    if prev_limit <= center < limit
+                ]
+
+                self.assertEqual(len(taking_bands), 1)
+                self.assertLessEqual(taking_bands[0][0], top)
+                self.assertGreaterEqual(taking_bands[0][1], bottom)
+
+        with self.assertRaises(ValueError):
+            get_bands(720, 80, 40)
+
+    def test_lines_are_read_once_in_order(self):
+        rng = random.Random(0)
+        lines = []
+        top = 5
+        while top < 680:
+            height = rng.randint(10, 60)
+            lines.append((f"line number {len(lines):02d}", top, top + height))
+            top += height + rng.randint(2, 20)
+
+        for scale in [1.0, 0.5]:
+            with self.subTest(scale=scale):
+                image = Image.new("L", (640, round(720 * scale)))
+                band_ocr = BandOCR(
+                    FakeBandOCR(lines),
+                    image,
+                    scale,
+                    round(240 * scale),
+                    round(40 * scale),
+                )
+
+                lineboxes = list(band_ocr)
+                self.assertEqual(
+                    [linebox.content for linebox in lineboxes],
+                    [content for content, _, _ in lines],
+                )
+                for linebox, (_, top, bottom) in zip(lineboxes, lines):
+                    self.assertAlmostEqual(linebox.position.get_top(), top, delta=2)
+                    self.assertAlmostEqual(
+                        linebox.position.get_bottom(), bottom, delta=2
+                    )
+
+                self.assertEqual(band_ocr.n_bands_ocred, len(band_ocr.bands))
+
+
+class TestProgressiveMatching(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        self.prev_no_text_filter_enabled = Config().matching_no_text_filter_enabled
+        self.prev_progressive_ocr_enabled = Config().matching_progressive_ocr_enabled
+        Config().dirpath_data_root = self.dirpath_data_root
+        # Frames of the tests are blank.
+        Config().matching_no_text_filter_enabled = False
+        os.makedirs(Asset.get_dirpath_document_index())
+        Metrics.get_instance().reset()
+
+        self.video_frame = VideoFrameImage(Image.new("L", (1280, 720)))
+
+    def tearDown(self):
+        DocumentIndexPool.get_instance().invalidate("asset")
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        Config().matching_no_text_filter_enabled = self.prev_no_text_filter_enabled
+        Config().matching_progressive_ocr_enabled = self.prev_progressive_ocr_enabled
+        shutil.rmtree(self.dirpath_data_root)
+
+    def write_document_index(self, doc_type: DocumentType):
+        document_index = create_document_index(
+            random.Random(0), n_pages=4, n_lines_per_page=20
+        )
+        document_index.metadata.doc_type = doc_type
+
+        with open(Asset.get_path_document_index("asset"), "w") as fp:
+            json.dump(document_index.to_json_serializable(), fp)
+
+        # Lines of the page 2 shown in the frame, at the same size.
+        return [
+            (
+                linebox.content,
+                linebox.position.get_top(),
+                linebox.position.get_bottom(),
+            )
+            for linebox in document_index.index_data[2]
+        ]
+
+    def match(self, lines, progressive: bool):
+        Config().matching_progressive_ocr_enabled = progressive
+        ocr = FakeBandOCR(lines)
+
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ):
+            result = sequence_analyzer.SequenceAnalyzer("").match_content_sequence(
+                "asset", self.video_frame
+            )
+
+        return result, ocr.bands
+
+    def test_same_match_with_fewer_bands(self):
+        lines = self.write_document_index(DocumentType.SLIDE)
+
+        expected, bands = self.match(lines, progressive=False)
+        self.assertEqual(bands, [(0, 720)])
+        self.assertTrue(expected.content_sequence_matched)
+
+        result, bands = self.match(lines, progressive=True)
+        self.assertEqual(
+            result.content_matching_result, expected.content_matching_result
+        )
+        self.assertEqual(bands, [(0, 240)])
+
+        metrics = Metrics.get_instance()
+        self.assertEqual(metrics.get("progressive_ocr.frames"), 1)
+        self.assertEqual(metrics.get("progressive_ocr.bands_skipped"), 3)
+
+    def test_documents_are_ocred_at_once(self):
+        lines = self.write_document_index(DocumentType.DOCUMENT)
+
+        result, bands = self.match(lines, progressive=True)
+        self.assertTrue(result.content_sequence_matched)
+        self.assertEqual(bands, [(0, 720)])
+        self.assertEqual(Metrics.get_instance().get("progressive_ocr.frames"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import sequence_analyzer
+from result_cache import ResultCache
+from document_index_pool import DocumentIndexPool
+from video_frame import VideoFrameImage
+from util.asset import Asset
+from util.config import Config
+from util.metrics import Metrics
+from tests.test_line_alignment import create_document_index
+from tests.test_ocr_cascade import FakeOCR
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.dirpath = tempfile.mkdtemp()
+        self.path_db = os.path.join(self.dirpath, "result_cache.sqlite3")
+        Metrics.get_instance().reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirpath)
+
+    def test_results_are_kept_across_restarts(self):
+        cache = ResultCache(self.path_db, max_size_bytes=1 << 20)
+        self.assertIsNone(cache.get("asset", "1", "frame"))
+
+        cache.put("asset", "1", "frame", {"i_page": 2})
+        self.assertEqual(cache.get("asset", "1", "frame"), {"i_page": 2})
+        # Another version of the document index
+        self.assertIsNone(cache.get("asset", "2", "frame"))
+        cache.close()
+
+        cache = ResultCache(self.path_db, max_size_bytes=1 << 20)
+        self.assertEqual(cache.get("asset", "1", "frame"), {"i_page": 2})
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["n_hits"], stats["n_misses"]), (2, 2))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+        self.assertEqual(stats["n_results"], 1)
+        self.assertEqual(stats["size_bytes"], len(json.dumps({"i_page": 2})))
+        cache.close()
+
+    def test_least_recently_used_results_are_evicted(self):
+        result = {"content": "x" * 80}
+        size = len(json.dumps(result))
+        cache = ResultCache(self.path_db, max_size_bytes=size * 4)
+
+        for i in range(4):
+            cache.put("asset", "1", f"frame{i}", result)
+
+        # The frame 0 is used again, and the frame 1 is the least recently used one.
+        self.assertIsNotNone(cache.get("asset", "1", "frame0"))
+        cache.put("asset", "1", "frame4", result)
+
+        self.assertIsNone(cache.get("asset", "1", "frame1"))
+        for i in [0, 4]:
+            self.assertIsNotNone(cache.get("asset", "1", f"frame{i}"))
+
+        self.assertLessEqual(cache.get_stats()["size_bytes"], size * 4)
+        self.assertGreater(Metrics.get_instance().get("result_cache.evictions"), 0)
+        cache.close()
+
+
+class TestSequenceAnalyzerResultCache(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_dirpath_data_root = Config().dirpath_data_root
+        self.prev_no_text_filter_enabled = Config().matching_no_text_filter_enabled
+        Config().dirpath_data_root = self.dirpath_data_root
+        # Frames of the tests are blank.
+        Config().matching_no_text_filter_enabled = False
+        os.makedirs(Asset.get_dirpath_document_index())
+
+        self.document_index = create_document_index(
+            random.Random(0), n_pages=2, n_lines_per_page=20
+        )
+        self.write_document_index()
+
+        self.lines = [
+            (
+                linebox.content,
+                [
+                    [linebox.position.get_left(), linebox.position.get_top()],
+                    [linebox.position.get_right(), linebox.position.get_bottom()],
+                ],
+            )
+            for linebox in self.document_index.concat_index_data
+            if len(linebox.content) >= 10
+        ][:4]
+
+        self.cache = ResultCache(Asset.get_path_result_cache(), 1 << 20)
+
+    def tearDown(self):
+        self.cache.close()
+        DocumentIndexPool.get_instance().invalidate("asset")
+        Config().dirpath_data_root = self.prev_dirpath_data_root
+        Config().matching_no_text_filter_enabled = self.prev_no_text_filter_enabled
+        shutil.rmtree(self.dirpath_data_root)
+
+    def write_document_index(self, mtime_ns=None):
+        path_index = Asset.get_path_document_index("asset")
+
+        with open(path_index, "w") as fp:
+            json.dump(self.document_index.to_json_serializable(), fp)
+
+        if mtime_ns is not None:
+            os.utime(path_index, ns=(mtime_ns, mtime_ns))
+
+    def match(self, ocr, video_frame: VideoFrameImage):
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ):
+            sqa = sequence_analyzer.SequenceAnalyzer("", result_cache=self.cache)
+            return sqa.match_content_sequence("asset", video_frame)
+
+    def test_same_frame_is_not_ocred_again(self):
+        video_frame = VideoFrameImage(Image.new("L", (1280, 720)))
+        ocr = FakeOCR(self.lines, 1.0)
+
+        result = self.match(ocr, video_frame)
+        self.assertTrue(result.content_sequence_matched)
+        self.assertFalse(result.from_cache)
+        n_ocr_calls = len(ocr.scales)
+
+        # By another SequenceAnalyzer (e.g. after a restart)
+        cached_result = self.match(ocr, video_frame)
+        self.assertTrue(cached_result.from_cache)
+        self.assertEqual(len(ocr.scales), n_ocr_calls)
+        self.assertEqual(
+            json.dumps(cached_result.to_json_serializable()),
+            json.dumps(result.to_json_serializable()),
+        )
+
+        # The document index is regenerated.
+        self.write_document_index(mtime_ns=1_000_000_000)
+        self.assertFalse(self.match(ocr, video_frame).from_cache)
+        self.assertGreater(len(ocr.scales), n_ocr_calls)
+
+    def test_results_are_not_reused_after_matching_settings_change(self):
+        video_frame = VideoFrameImage(Image.new("L", (1280, 720)))
+        ocr = FakeOCR(self.lines, 1.0)
+        prev_min_score = Config().matching_ocr_cascade_min_score
+
+        try:
+            self.match(ocr, video_frame)
+            self.assertTrue(self.match(ocr, video_frame).from_cache)
+
+            Config().matching_ocr_cascade_min_score = prev_min_score / 2
+            self.assertFalse(self.match(ocr, video_frame).from_cache)
+            self.assertTrue(self.match(ocr, video_frame).from_cache)
+        finally:
+            Config().matching_ocr_cascade_min_score = prev_min_score
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+import io
+import json
+import math
+import asyncio
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from PIL import Image, ImageDraw
+from websockets.client import connect
+from websockets.server import serve
+
+import serve_sequence_analyzer_stream
+from serve_sequence_analyzer_stream import (
+    FRAME_HEADER,
+    StreamSession,
+    parse_frame_message,
+)
+from util.admission import AdmissionController
+from util.metrics import Metrics
+
+
+def create_frame_message(i_frame: int, playback_time_sec=math.nan) -> bytes:
+    """Frame message of an image, which is different for each i_frame."""
+    image = Image.new("L", (640, 360), 255)
+    ImageDraw.Draw(image).rectangle(
+        (20 * i_frame, 10 * i_frame, 20 * i_frame + 200, 10 * i_frame + 100), fill=0
+    )
+
+    fp = io.BytesIO()
+    image.save(fp, "PNG")
+    return FRAME_HEADER.pack(playback_time_sec) + fp.getvalue()
+
+
+def create_result(bbox, partial=False):
+    if bbox is None:
+        return SimpleNamespace(
+            content_matching_result=None,
+            viewport_estimation_result=None,
+            partial=partial,
+        )
+
+    left, top, right, bottom = bbox
+    return SimpleNamespace(
+        content_matching_result=object(),
+        viewport_estimation_result=SimpleNamespace(
+            get_relative_bbox_tuple=lambda: ((left, top), (right, bottom))
+        ),
+        partial=partial,
+    )
+
+
+class FakeSequenceAnalyzer:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def match_content_sequence(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.results.pop(0)
+
+
+class BlockingSequenceAnalyzer(FakeSequenceAnalyzer):
+    """Matches the first frame only after released."""
+
+    def __init__(self, results):
+        super().__init__(results)
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def match_content_sequence(self, **kwargs):
+        if len(self.calls) == 0:
+            self.started.set()
+            self.released.wait(10)
+
+        return super().match_content_sequence(**kwargs)
+
+
+class TestStreamSession(unittest.TestCase):
+    def test_parse_frame_message(self):
+        playback_time_sec, video_frame = parse_frame_message(
+            create_frame_message(0, 12.5)
+        )
+        self.assertEqual(playback_time_sec, 12.5)
+        self.assertEqual(video_frame.data.size, (1280, 720))
+
+        self.assertIsNone(parse_frame_message(create_frame_message(0))[0])
+
+        with self.assertRaises(ValueError):
+            parse_frame_message(FRAME_HEADER.pack(0.0))
+
+    def test_unchanged_messages(self):
+        sqa = FakeSequenceAnalyzer(
+            [
+                create_result((0.1, 0.2, 0.9, 0.5)),
+                # Moved less than the tolerance
+                create_result((0.1001, 0.2, 0.9, 0.5)),
+                create_result((0.1, 0.3, 0.9, 0.6), partial=True),
+                create_result((0.1, 0.3, 0.9, 0.6)),
+                create_result(None),
+                create_result(None),
+            ]
+        )
+        session = StreamSession(sqa, "asset", "video", unchanged_tolerance=0.001)
+
+        messages = [
+            session.process_frame(
+                session.new_frame_index(), create_frame_message(i_frame, i_frame)
+            )
+            for i_frame in [0, 0, 1, 2, 3, 4, 5]
+        ] + [session.process_frame(session.new_frame_index(), b"broken")]
+
+        self.assertEqual(
+            messages,
+            [
+                {"i": 0, "viewport": [0.1, 0.2, 0.9, 0.5]},
+                # The same frame is not matched again.
+                {"i": 1, "unchanged": True},
+                {"i": 2, "unchanged": True},
+                {"i": 3, "viewport": [0.1, 0.3, 0.9, 0.6], "partial": True},
+                {"i": 4, "unchanged": True},
+                {"i": 5, "viewport": None},
+                {"i": 6, "unchanged": True},
+                {"i": 7, "error": mock.ANY},
+            ],
+        )
+        self.assertEqual(len(sqa.calls), 6)
+        self.assertEqual(
+            [(call["video_id"], call["playback_time_sec"]) for call in sqa.calls],
+            [("video", i_frame) for i_frame in [0, 1, 2, 3, 4, 5]],
+        )
+
+
+class TestStreamService(unittest.TestCase):
+    def serve_session(self, sqa, admission, communicate):
+        """Runs communicate(websocket) in a session of the stream service, and returns its result."""
+
+        async def run():
+            async with serve(
+                serve_sequence_analyzer_stream.run_sequence_analyzer_stream,
+                "localhost",
+                0,
+            ) as server:
+                port = server.sockets[0].getsockname()[1]
+
+                async with connect(
+                    f"ws://localhost:{port}/asset?video_id=video"
+                ) as websocket:
+                    return await communicate(websocket)
+
+        HttpPostHandler = serve_sequence_analyzer_stream.HttpPostHandler
+
+        with mock.patch.object(
+            HttpPostHandler, "get_shared_sequence_analyzer", return_value=sqa
+        ), mock.patch.object(
+            HttpPostHandler, "get_shared_admission_controller", return_value=admission
+        ):
+            return asyncio.run(run())
+
+    def test_session(self):
+        for admission in [None, AdmissionController(4)]:
+            with self.subTest(admission=admission):
+                sqa = FakeSequenceAnalyzer(
+                    [create_result((0.1, 0.2, 0.9, 0.5)), create_result(None)]
+                )
+
+                async def communicate(websocket):
+                    responses = []
+                    for i_frame in [0, 0, 1]:
+                        await websocket.send(create_frame_message(i_frame))
+                        responses.append(json.loads(await websocket.recv()))
+
+                    await websocket.send("not a frame")
+                    responses.append(json.loads(await websocket.recv()))
+
+                    return responses
+
+                self.assertEqual(
+                    self.serve_session(sqa, admission, communicate),
+                    [
+                        {"i": 0, "viewport": [0.1, 0.2, 0.9, 0.5]},
+                        {"i": 1, "unchanged": True},
+                        {"i": 2, "viewport": None},
+                        {"error": mock.ANY},
+                    ],
+                )
+                self.assertEqual(sqa.calls[0]["asset_id"], "asset")
+                self.assertEqual(sqa.calls[0]["video_id"], "video")
+
+    def test_latest_frame_wins(self):
+        Metrics.get_instance().reset()
+        admission = AdmissionController(4)
+        sqa = BlockingSequenceAnalyzer(
+            [create_result((0.1, 0.2, 0.9, 0.5)), create_result(None)]
+        )
+
+        async def communicate(websocket):
+            await websocket.send(create_frame_message(0))
+            await asyncio.to_thread(sqa.started.wait, 10)
+
+            # While the frame 0 is analyzed, the frame 2 supersedes the frame 1.
+            await websocket.send(create_frame_message(1))
+            while admission.get_queue_depth() < 2:
+                await asyncio.sleep(0.01)
+            await websocket.send(create_frame_message(2))
+            while Metrics.get_instance().get("admission.superseded") < 1:
+                await asyncio.sleep(0.01)
+
+            # The answer of the frame 1 waits for the one of the frame 0.
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(websocket.recv(), 0.1)
+
+            sqa.released.set()
+            return [json.loads(await websocket.recv()) for _ in range(3)]
+
+        self.assertEqual(
+            self.serve_session(sqa, admission, communicate),
+            [
+                {"i": 0, "viewport": [0.1, 0.2, 0.9, 0.5]},
+                {"i": 1, "superseded": True},
+                {"i": 2, "viewport": None},
+            ],
+        )
+        self.assertEqual(len(sqa.calls), 2)
+
+    def test_failed_frame_is_answered_with_error(self):
+        sqa = FakeSequenceAnalyzer([RuntimeError("failed"), create_result(None)])
+        match_content_sequence = sqa.match_content_sequence
+
+        def match_or_raise(**kwargs):
+            result = match_content_sequence(**kwargs)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        sqa.match_content_sequence = match_or_raise
+
+        async def communicate(websocket):
+            for i_frame in [0, 1]:
+                await websocket.send(create_frame_message(i_frame))
+            return [json.loads(await websocket.recv()) for _ in range(2)]
+
+        self.assertEqual(
+            self.serve_session(sqa, AdmissionController(4), communicate),
+            [{"i": 0, "error": "failed"}, {"i": 1, "viewport": None}],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+import sequence_analyzer
+from document_index_pool import DocumentIndexPool
+from line_alignment import LineAlignment
+from video_frame import VideoFrameImage
+from util.asset import Asset
+from util.config import Config
+from sharded_matching import (
+    ShardedLineMatcher,
+    SharedLineContents,
+    create_shared_line_contents,
+    merge_shard_alignments,
+    split_into_shards,
+)
+from test_line_alignment import (
+    create_document_index,
+    create_ocr_result,
+    create_video_frame_contents,
+)
+from tests.test_multi_document import get_frame_lines
+from tests.test_ocr_cascade import FakeOCR
+
+
+class TestSplitIntoShards(unittest.TestCase):
+    def test_contiguous_shards(self):
+        self.assertEqual(split_into_shards(10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(split_into_shards(2, 4), [(0, 1), (1, 2)])
+
+
+class TestMergeShardAlignments(unittest.TestCase):
+    def test_longest_run_then_scan_order(self):
+        alignments = [
+            None,
+            LineAlignment(2, 50, 2, 0.9, 0.9),
+            LineAlignment(1, 90, 3, 0.8, 0.8),
+            LineAlignment(0, 120, 2, 1.0, 1.0),
+            LineAlignment(1, 10, 3, 0.8, 0.8),
+        ]
+
+        self.assertEqual(merge_shard_alignments(alignments), alignments[4])
+        self.assertIsNone(merge_shard_alignments([None, None]))
+
+
+class TestSharedLineContents(unittest.TestCase):
+    def test_lines_are_read_from_shared_memory(self):
+        for contents in [[], ["", "Line 1", "Überschrift – 日本語", ""]]:
+            with self.subTest(contents=contents):
+                shm = create_shared_line_contents(contents)
+                try:
+                    shared = SharedLineContents(shm, len(contents))
+                    self.assertEqual(list(shared), contents)
+                    if len(contents) > 0:
+                        self.assertEqual(shared[-2], contents[-2])
+                    with self.assertRaises(IndexError):
+                        shared[len(contents)]
+                    del shared
+                finally:
+                    shm.close()
+                    shm.unlink()
+
+
+class TestShardedLineMatcher(unittest.TestCase):
+    """Sharded search must return the same result as the unsharded one."""
+
+    def test_same_result_as_unsharded_search(self):
+        rng = random.Random(0)
+        document_index = create_document_index(rng, n_pages=4, n_lines_per_page=25)
+
+        matcher = ShardedLineMatcher(
+            [line.content for line in document_index.concat_index_data], n_shards=3
+        )
+
+        try:
+            for _ in range(30):
+                ocr_result = create_ocr_result(
+                    create_video_frame_contents(rng, document_index)
+                )
+
+                self.assertEqual(
+                    document_index.search_most_matching_line(
+                        ocr_result, line_aligner=matcher
+                    ),
+                    document_index.search_most_matching_line(ocr_result),
+                )
+        finally:
+            matcher.shutdown()
+
+    def test_closed_while_acquired(self):
+        rng = random.Random(0)
+        document_index = create_document_index(rng, n_pages=2, n_lines_per_page=25)
+        ocr_result = create_ocr_result(create_video_frame_contents(rng, document_index))
+
+        matcher = ShardedLineMatcher(
+            [line.content for line in document_index.concat_index_data], n_shards=2
+        )
+
+        try:
+            matcher.acquire()
+            matcher.close()
+
+            # Workers are kept for the search holding the matcher.
+            self.assertEqual(
+                document_index.search_most_matching_line(
+                    ocr_result, line_aligner=matcher
+                ),
+                document_index.search_most_matching_line(ocr_result),
+            )
+
+            matcher.release()
+            with self.assertRaises(RuntimeError):
+                matcher.search(["content"])
+        finally:
+            matcher.shutdown()
+
+
+class TestSequenceAnalyzerShards(unittest.TestCase):
+    def setUp(self):
+        self.dirpath_data_root = tempfile.mkdtemp()
+        self.prev_config = (
+            Config().dirpath_data_root,
+            Config().matching_no_text_filter_enabled,
+            Config().matching_n_shards,
+            Config().matching_min_lines_for_sharding,
+        )
+        Config().dirpath_data_root = self.dirpath_data_root
+        # Frames of the tests are blank.
+        Config().matching_no_text_filter_enabled = False
+        Config().matching_n_shards = 2
+        Config().matching_min_lines_for_sharding = 1
+        os.makedirs(Asset.get_dirpath_document_index())
+
+        rng = random.Random(0)
+        self.asset_ids = ["asset_a", "asset_b", "asset_c"]
+        self.document_indexes = {}
+
+        for asset_id in self.asset_ids:
+            document_index = create_document_index(rng, n_pages=2, n_lines_per_page=20)
+            self.document_indexes[asset_id] = document_index
+
+            with open(Asset.get_path_document_index(asset_id), "w") as fp:
+                json.dump(document_index.to_json_serializable(), fp)
+
+    def tearDown(self):
+        for asset_id in self.asset_ids:
+            DocumentIndexPool.get_instance().invalidate(asset_id)
+        (
+            Config().dirpath_data_root,
+            Config().matching_no_text_filter_enabled,
+            Config().matching_n_shards,
+            Config().matching_min_lines_for_sharding,
+        ) = self.prev_config
+        shutil.rmtree(self.dirpath_data_root)
+
+    def test_shards_of_least_recently_used_assets_are_stopped(self):
+        matchers = []
+
+        def create_matcher(*args):
+            matchers.append(ShardedLineMatcher(*args))
+            return matchers[-1]
+
+        ocr = FakeOCR([], 1.0)
+
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ):
+            sqa = sequence_analyzer.SequenceAnalyzer("")
+
+        try:
+            with mock.patch.object(
+                sequence_analyzer, "ShardedLineMatcher", side_effect=create_matcher
+            ), mock.patch.object(sequence_analyzer, "MAX_N_SHARDED_LINE_MATCHERS", 2):
+                for asset_id in self.asset_ids:
+                    ocr.lines = get_frame_lines(self.document_indexes[asset_id], 1)
+                    result = sqa.match_content_sequence(
+                        asset_id, VideoFrameImage(Image.new("L", (1280, 720)))
+                    )
+                    self.assertTrue(result.content_sequence_matched)
+
+            self.assertEqual(len(matchers), 3)
+
+            # The shards of the first asset are stopped, and the others are kept.
+            with self.assertRaises(RuntimeError):
+                matchers[0].search(["content"])
+            matchers[2].search(["content"])
+        finally:
+            sqa.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
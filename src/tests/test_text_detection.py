@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageDraw, ImageFont
+
+import sequence_analyzer
+from video_frame import VideoFrameImage
+from util.config import Config
+from util.metrics import Metrics
+from util.text_detection import count_text_line_bands, has_text
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def create_slide_frame(font_size: int, n_lines: int, background=255, foreground=0):
+    image = Image.new("L", (WIDTH, HEIGHT), background)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+
+    for i_line in range(n_lines):
+        draw.text(
+            (60, 60 + i_line * font_size * 1.6),
+            f"Integrating Video Viewing and Document Exploration ({i_line})",
+            fill=foreground,
+            font=font,
+        )
+
+    return VideoFrameImage(image)
+
+
+def create_document_frame(font_size: int):
+    # A page of a paper shown full-width: lines of dense text across the frame
+    image = Image.new("L", (WIDTH, HEIGHT), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=font_size)
+    text = "the video frames are matched with the lines of the document index " * 4
+
+    for i_line in range(int((HEIGHT - 40) / (font_size * 1.4))):
+        draw.text((10, 20 + i_line * font_size * 1.4), text, fill=0, font=font)
+
+    return VideoFrameImage(image)
+
+
+def create_camera_frame():
+    # Large smooth shapes like a person in front of a wall
+    image = Image.new("L", (WIDTH, HEIGHT), 90)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((500, 100, 800, 500), fill=200)
+    draw.rectangle((350, 450, 950, 720), fill=40)
+    draw.ellipse((560, 200, 600, 240), fill=30)
+    draw.ellipse((700, 200, 740, 240), fill=30)
+    return VideoFrameImage(image)
+
+
+class TestTextDetection(unittest.TestCase):
+    def test_frames_with_text(self):
+        for frame in [
+            create_slide_frame(font_size=28, n_lines=6),
+            create_slide_frame(font_size=60, n_lines=1),
+            create_slide_frame(font_size=14, n_lines=10),
+            create_slide_frame(font_size=28, n_lines=6, background=20, foreground=230),
+            create_document_frame(font_size=12),
+            create_document_frame(font_size=16),
+        ]:
+            self.assertTrue(has_text(frame.get_binary()))
+
+        self.assertEqual(
+            count_text_line_bands(
+                create_slide_frame(font_size=28, n_lines=6).get_binary()
+            ),
+            6,
+        )
+
+    def test_frames_without_text(self):
+        for frame in [
+            VideoFrameImage(Image.new("L", (WIDTH, HEIGHT), 0)),
+            VideoFrameImage(Image.linear_gradient("L").resize((WIDTH, HEIGHT))),
+            VideoFrameImage(Image.effect_noise((WIDTH, HEIGHT), 60)),
+            create_camera_frame(),
+        ]:
+            self.assertFalse(has_text(frame.get_binary()))
+
+    def test_sensitivity(self):
+        frame = create_slide_frame(font_size=60, n_lines=1)
+        self.assertTrue(has_text(frame.get_binary(), min_text_lines=1))
+        self.assertFalse(has_text(frame.get_binary(), min_text_lines=2))
+
+
+class TestSequenceAnalyzerNoTextFilter(unittest.TestCase):
+    def setUp(self):
+        self.prev_enabled = Config().matching_no_text_filter_enabled
+        Config().matching_no_text_filter_enabled = True
+        Metrics.get_instance().reset()
+
+    def tearDown(self):
+        Config().matching_no_text_filter_enabled = self.prev_enabled
+
+    def test_skips_ocr_of_frames_without_text(self):
+        ocr = mock.Mock()
+        document_index = mock.Mock()
+
+        with mock.patch.object(
+            sequence_analyzer, "get_shared_tesseract_ocr", return_value=ocr
+        ), mock.patch.object(
+            sequence_analyzer.DocumentIndexPool,
+            "get",
+            return_value=document_index,
+        ):
+            result = sequence_analyzer.SequenceAnalyzer("").match_content_sequence(
+                "asset", create_camera_frame()
+            )
+
+        self.assertFalse(result.content_sequence_matched)
+        self.assertTrue(result.document_available)
+        ocr.extract.assert_not_called()
+        self.assertEqual(Metrics.get_instance().get("no_text_filter.checked"), 1)
+        self.assertEqual(Metrics.get_instance().get("no_text_filter.skipped"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
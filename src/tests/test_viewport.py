@@ -0,0 +1,162 @@
+import random
+import unittest
+
+import numpy as np
+
+from ocr import ShapedLineBox, LinePositionWithPageOffset
+from document_index import (
+    DocumentMetadata,
+    DocumentType,
+    FoundRelatedLine,
+    FoundRelatedPage,
+    PageMetadata,
+)
+from video_frame import VideoFrameMetadata
+from viewport import (
+    estimate_viewport_from_line,
+    estimate_viewport_from_page,
+    estimate_viewports,
+)
+
+
+def create_random_line(rng: random.Random, offset_top=0):
+    top = rng.randint(0, 600)
+    left = rng.randint(0, 1000)
+
+    return ShapedLineBox(
+        content="line",
+        position=LinePositionWithPageOffset.from_positions(
+            top=top,
+            left=left,
+            right=left + rng.randint(20, 400),
+            bottom=top + rng.randint(10, 60),
+            page_offset_left=0,
+            page_offset_top=offset_top,
+        ),
+    )
+
+
+class TestEstimateViewports(unittest.TestCase):
+    """estimate_viewports() must return the same viewports as the estimation of each match result."""
+
+    def setUp(self):
+        self.rng = random.Random(0)
+        self.n_pages = 10
+        self.doc_metadata = DocumentMetadata(
+            asset_id="test",
+            width=1280,
+            height=720 * self.n_pages,
+            n_pages=self.n_pages,
+            doc_type=DocumentType.SLIDE,
+            metadata_pages=[
+                PageMetadata(1280, 720, 720 * i, i) for i in range(self.n_pages)
+            ],
+        )
+
+    def assert_viewports_equal(self, viewports, expected_viewports):
+        self.assertEqual(viewports.shape, (len(expected_viewports), 4))
+
+        for viewport, expected in zip(viewports, expected_viewports):
+            if expected is None:
+                self.assertTrue(np.isnan(viewport).all())
+            else:
+                np.testing.assert_allclose(
+                    viewport,
+                    [expected.left, expected.top, expected.right, expected.bottom],
+                )
+
+    def test_pages(self):
+        match_results = []
+        video_metadata = []
+
+        for _ in range(200):
+            video_metadata.append(VideoFrameMetadata(1280, 720, 1))
+
+            if self.rng.random() < 0.2:
+                match_results.append(None)
+                continue
+
+            i_page = self.rng.randrange(self.n_pages)
+            line_doc = create_random_line(self.rng, offset_top=i_page * 720)
+            line_vf = create_random_line(self.rng)
+
+            # Lines of the same height in the frame give a viewport of the page size.
+            if self.rng.random() < 0.5:
+                line_vf = ShapedLineBox(
+                    content="line",
+                    position=LinePositionWithPageOffset.from_positions(
+                        top=line_vf.position.get_top(),
+                        left=line_vf.position.get_left(),
+                        right=line_vf.position.get_right(),
+                        bottom=line_vf.position.get_top()
+                        + line_doc.position.get_height(),
+                        page_offset_left=0,
+                        page_offset_top=0,
+                    ),
+                )
+
+            match_results.append(FoundRelatedPage(i_page, line_doc, line_vf, 1.0, 1.0))
+
+        viewports = estimate_viewports(match_results, self.doc_metadata, video_metadata)
+        self.assert_viewports_equal(
+            viewports,
+            [
+                (
+                    estimate_viewport_from_page(
+                        match_result, self.doc_metadata, video_metadata[i]
+                    )
+                    if match_result is not None
+                    else None
+                )
+                for i, match_result in enumerate(match_results)
+            ],
+        )
+
+    def test_lines(self):
+        self.doc_metadata.doc_type = DocumentType.DOCUMENT
+        match_results = []
+        video_metadata = []
+
+        for i_line in range(200):
+            video_metadata.append(
+                VideoFrameMetadata(
+                    self.rng.choice([1280, 1920]), self.rng.choice([720, 1080]), 1
+                )
+            )
+
+            if self.rng.random() < 0.2:
+                match_results.append(None)
+                continue
+
+            match_results.append(
+                FoundRelatedLine(
+                    0,
+                    i_line,
+                    create_random_line(self.rng, offset_top=self.rng.randint(0, 7000)),
+                    create_random_line(self.rng),
+                    1.0,
+                    1.0,
+                )
+            )
+
+        viewports = estimate_viewports(match_results, self.doc_metadata, video_metadata)
+        self.assert_viewports_equal(
+            viewports,
+            [
+                (
+                    estimate_viewport_from_line(
+                        match_result, self.doc_metadata, video_metadata[i]
+                    )
+                    if match_result is not None
+                    else None
+                )
+                for i, match_result in enumerate(match_results)
+            ],
+        )
+
+    def test_empty(self):
+        self.assertEqual(estimate_viewports([], self.doc_metadata, []).shape, (0, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import threading
+from typing import Hashable
+from contextlib import contextmanager
+
+from util.metrics import Metrics
+
+
+class Superseded(Exception):
+    """Raised for a frame waiting for its turn when a newer frame of the same client arrives."""
+
+
+class Overloaded(Exception):
+    """Raised when too many frames are in progress or waiting, and a new one is not accepted."""
+
+    def __init__(self, retry_after_sec: float):
+        super().__init__(f"Server is overloaded. Retry after {retry_after_sec} sec.")
+        self.retry_after_sec = retry_after_sec
+
+
+class _Ticket:
+    """Represents a frame waiting for its turn."""
+
+    def __init__(self):
+        self.superseded = False
+
+
+class _ClientState:
+    def __init__(self):
+        self.in_progress = False
+        self.pending: _Ticket | None = None
+
+
+class AdmissionController:
+    """
+    Admits the frames of each client one by one, the latest frame first.
+
+    Each client has at most one frame in progress and one pending.
+    A new frame replaces the pending one, whose request is answered at once with Superseded,
+    so that a client which sends frames faster than they are analyzed gets its latest frame analyzed,
+    instead of a queue of stale ones.
+    Frames in progress and pending of all clients are limited to max_queue_depth,
+    and a frame beyond it is rejected with Overloaded.
+    Frames of unknown clients (client_key None) are only limited by max_queue_depth,
+    as their frames cannot be told apart from the ones of other clients.
+    """
+
+    def __init__(self, max_queue_depth: int, retry_after_sec: float = 1.0):
+        self.max_queue_depth = max_queue_depth
+        self.__retry_after_sec = retry_after_sec
+        self.__cond = threading.Condition()
+        self.__clients: dict[Hashable, _ClientState] = {}
+        self.__n_admitted = 0
+
+    def get_queue_depth(self) -> int:
+        """Returns the number of frames in progress and pending."""
+        return self.__n_admitted
+
+    def __reject_if_full(self):
+        if self.__n_admitted >= self.max_queue_depth:
+            Metrics.get_instance().increment("admission.rejected")
+            raise Overloaded(self.__retry_after_sec)
+
+    def __acquire(self, client_key: Hashable | None):
+        with self.__cond:
+            if client_key is None:
+                self.__reject_if_full()
+                self.__n_admitted += 1
+                return
+
+            client = self.__clients.setdefault(client_key, _ClientState())
+
+            if not client.in_progress:
+                self.__reject_if_full()
+                self.__n_admitted += 1
+                client.in_progress = True
+                return
+
+            if client.pending is not None:
+                # The new frame takes over the place of the pending one.
+                client.pending.superseded = True
+                Metrics.get_instance().increment("admission.superseded")
+                self.__cond.notify_all()
+            else:
+                self.__reject_if_full()
+                self.__n_admitted += 1
+
+            ticket = _Ticket()
+            client.pending = ticket
+
+            while client.in_progress and not ticket.superseded:
+                self.__cond.wait()
+
+            if ticket.superseded:
+                raise Superseded()
+
+            client.pending = None
+            client.in_progress = True
+
+    def __release(self, client_key: Hashable | None):
+        with self.__cond:
+            if client_key is None:
+                self.__n_admitted -= 1
+                self.__cond.notify_all()
+                return
+
+            client = self.__clients[client_key]
+            client.in_progress = False
+            self.__n_admitted -= 1
+
+            if client.pending is None:
+                del self.__clients[client_key]
+
+            self.__cond.notify_all()
+
+    @contextmanager
+    def admit(self, client_key: Hashable | None):
+        """
+        Waits for the turn of a frame of the client, and holds it within the context.
+        Raises Superseded if a newer frame of the client arrives meanwhile,
+        and Overloaded if the frame is not accepted.
+        A frame of an unknown client (client_key None) is admitted at once if the queue is not full.
+        """
+        self.__acquire(client_key)
+
+        try:
+            yield
+        finally:
+            self.__release(client_key)
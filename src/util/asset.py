@@ -1,5 +1,6 @@
 import os
 from enum import Enum
+from urllib.parse import quote
 from util.config import Config
 
 
@@ -30,8 +31,6 @@ class Asset:
     @staticmethod
     def get_dirpath_pdf_src():
         """Returns a directory path where PDF files are stored."""
-        print("\npdf dirpath:")
-        print(Config.get_instance().dirpath_data_root)
         return os.path.join(Config.get_instance().dirpath_data_root, "pdf")
 
     @staticmethod
@@ -39,11 +38,54 @@ class Asset:
         """Returns a directory path where concat images of PDF files are stored."""
         return os.path.join(Config.get_instance().dirpath_data_root, "pdf_concat_img")
 
+    @staticmethod
+    def get_dirpath_pdf_pyramid():
+        """Returns a directory path where tiled image pyramids (DZI) of PDF files are stored."""
+        return os.path.join(Config.get_instance().dirpath_data_root, "pdf_pyramid")
+
+    @staticmethod
+    def get_dirpath_page_render_cache():
+        """Returns a directory path where rasterized pages of PDF files are cached."""
+        return os.path.join(
+            Config.get_instance().dirpath_data_root, "page_render_cache"
+        )
+
     @staticmethod
     def get_dirpath_document_index():
         """Returns a directory path where document index output files are stored."""
         return os.path.join(Config.get_instance().dirpath_data_root, "document_index")
 
+    @staticmethod
+    def get_path_document_index_store():
+        """Returns a path of the database of document indexes of all assets."""
+        return os.path.join(
+            Config.get_instance().dirpath_data_root, "document_index.sqlite3"
+        )
+
+    @staticmethod
+    def get_path_result_cache():
+        """Returns a path of the database of cached results of Sequence Analyzer."""
+        return os.path.join(
+            Config.get_instance().dirpath_data_root, "result_cache.sqlite3"
+        )
+
+    @staticmethod
+    def get_path_recent_assets():
+        """Returns a path of the list of recently used assets."""
+        return os.path.join(
+            Config.get_instance().dirpath_data_root, "recent_assets.json"
+        )
+
+    @staticmethod
+    def get_dirpath_match_history():
+        """Returns a directory path where match histories of videos are stored."""
+        return os.path.join(Config.get_instance().dirpath_data_root, "match_history")
+
+    @staticmethod
+    def get_path_pdf_hash_registry():
+        """Returns a path of the registry file of PDF content hashes."""
+        return os.path.join(Config.get_instance().dirpath_data_root, "pdf_hashes.json")
+
     @staticmethod
     def get_path_pdf_src(asset_id: str):
         """Returns a path of a PDF file."""
@@ -57,6 +99,11 @@ class Asset:
             f"{asset_id}.concat.png",
         )
 
+    @staticmethod
+    def get_path_pdf_pyramid(asset_id: str):
+        """Returns a path of a .dzi file of the tiled image pyramid of a PDF file."""
+        return os.path.join(Asset.get_dirpath_pdf_pyramid(), f"{asset_id}.dzi")
+
     @staticmethod
     def get_path_document_index(asset_id: str):
         """Returns a path of a document index output file."""
@@ -64,3 +111,11 @@ class Asset:
             Asset.get_dirpath_document_index(),
             f"{asset_id}.index.json",
         )
+
+    @staticmethod
+    def get_path_match_history(video_id: str, asset_id: str):
+        """Returns a path of a match history file of a video and an asset."""
+        return os.path.join(
+            Asset.get_dirpath_match_history(),
+            f"{quote(video_id, safe='')}.{quote(asset_id, safe='')}.history.json",
+        )
@@ -0,0 +1,98 @@
+import time
+import threading
+from typing import Any, Callable, Hashable
+
+
+class _InFlightCall:
+    """Represents a call which is running, and waited by the other identical requests."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class RequestCoalescer:
+    """
+    Coalesces identical requests which are processed at the same time.
+
+    While a call for a key is running, identical requests wait for its result
+    instead of starting their own call. The result is kept for ttl_sec seconds afterwards.
+    Errors are passed to the waiting requests, but not cached.
+    """
+
+    def __init__(self, ttl_sec: float = 2.0):
+        self.__ttl_sec = ttl_sec
+        self.__lock = threading.Lock()
+        self.__in_flight: dict[Hashable, _InFlightCall] = {}
+        self.__cache: dict[Hashable, tuple[float, Any]] = {}
+
+        self.n_calls = 0
+        self.n_coalesced = 0
+        self.n_cache_hits = 0
+
+    def __purge_expired(self, now: float):
+        expired_keys = [
+            key for key, (expires_at, _) in self.__cache.items() if expires_at <= now
+        ]
+        for key in expired_keys:
+            del self.__cache[key]
+
+    def run(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        is_cacheable: Callable[[Any], bool] | None = None,
+    ):
+        """
+        Returns the result of fn(), shared by the identical requests of the same key.
+        If is_cacheable is given, the result is kept after the call only if it returns True for it.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            self.__purge_expired(now)
+
+            if key in self.__cache:
+                self.n_cache_hits += 1
+                return self.__cache[key][1]
+
+            call = self.__in_flight.get(key)
+            is_leader = call is None
+
+            if is_leader:
+                call = _InFlightCall()
+                self.__in_flight[key] = call
+                self.n_calls += 1
+            else:
+                self.n_coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self.__lock:
+                del self.__in_flight[key]
+
+                if (
+                    call.error is None
+                    and self.__ttl_sec > 0
+                    and (is_cacheable is None or is_cacheable(call.result))
+                ):
+                    self.__cache[key] = (
+                        time.monotonic() + self.__ttl_sec,
+                        call.result,
+                    )
+
+            call.done.set()
+
+        return call.result
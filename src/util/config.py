@@ -1,6 +1,4 @@
 import os
-import yaml
-from pprint import pprint
 from pathlib import Path
 from dataclasses import dataclass, field
 
@@ -23,9 +21,74 @@ class Config(Singleton):
     port_sequence_analyzer: int = field(init=False)
     port_pdf_receiver: int = field(init=False)
     port_pdf_analyzer: int = field(init=False)
+    port_sequence_analyzer_stream: int = field(init=False)
 
     frontend_url: str = field(init=False)
 
+    sequence_analyzer_threaded: bool = field(init=False)
+    sequence_analyzer_coalescing_enabled: bool = field(init=False)
+    sequence_analyzer_coalescing_ttl_sec: float = field(init=False)
+    sequence_analyzer_match_history_enabled: bool = field(init=False)
+    sequence_analyzer_match_history_max_gap_sec: float = field(init=False)
+    sequence_analyzer_match_history_save_interval_sec: float = field(init=False)
+    sequence_analyzer_match_history_max_histories: int = field(init=False)
+    sequence_analyzer_prewarm_n_recent_assets: int = field(init=False)
+    sequence_analyzer_batch_n_workers: int = field(init=False)
+    sequence_analyzer_batch_max_frames: int = field(init=False)
+    sequence_analyzer_deadline_ms: float = field(init=False)
+    sequence_analyzer_stream_unchanged_tolerance: float = field(init=False)
+    sequence_analyzer_admission_enabled: bool = field(init=False)
+    sequence_analyzer_admission_max_queue_depth: int = field(init=False)
+    sequence_analyzer_admission_retry_after_sec: float = field(init=False)
+
+    pdf_receiver_auto_index: bool = field(init=False)
+    pdf_receiver_chunk_size: int = field(init=False)
+
+    batch_indexer_n_workers: int = field(init=False)
+
+    file_explorer_catalog_refresh_interval_sec: float = field(init=False)
+
+    matching_n_shards: int = field(init=False)
+    matching_min_lines_for_sharding: int = field(init=False)
+    matching_page_lsh_enabled: bool = field(init=False)
+    matching_page_lsh_min_pages: int = field(init=False)
+    matching_page_lsh_n_candidates: int = field(init=False)
+    matching_ocr_scale_tiers: list[float] = field(init=False)
+    matching_ocr_cascade_min_score: float = field(init=False)
+    matching_no_text_filter_enabled: bool = field(init=False)
+    matching_no_text_filter_min_text_lines: int = field(init=False)
+    matching_no_text_filter_min_row_transitions: int = field(init=False)
+    matching_progressive_ocr_enabled: bool = field(init=False)
+    matching_progressive_ocr_band_height: int = field(init=False)
+    matching_progressive_ocr_band_overlap: int = field(init=False)
+    matching_multi_document_n_candidates: int = field(init=False)
+
+    index_store_backend: str = field(init=False)
+    index_store_n_candidate_lines: int = field(init=False)
+
+    result_cache_enabled: bool = field(init=False)
+    result_cache_max_size_mb: float = field(init=False)
+
+    page_pyramid_enabled: bool = field(init=False)
+    page_pyramid_tile_size: int = field(init=False)
+    page_pyramid_overlap: int = field(init=False)
+    page_pyramid_tile_format: str = field(init=False)
+    page_pyramid_quality: int = field(init=False)
+
+    page_render_dpi: int = field(init=False)
+    page_render_color_mode: str = field(init=False)
+    page_render_cache_enabled: bool = field(init=False)
+    page_render_cache_max_size_mb: int = field(init=False)
+    page_render_n_pages_per_range: int = field(init=False)
+
+    profiling_enabled: bool = field(init=False)
+    profiling_sample_every_n: int = field(init=False)
+    profiling_allow_request_header: bool = field(init=False)
+    dirpath_profiles: str = field(init=False)
+
+    log_level: str = field(init=False)
+    log_format: str = field(init=False)
+
     __initialized: bool = field(init=False, default=False)
 
     def __init__(self):
@@ -36,11 +99,15 @@ class Config(Singleton):
         self.dirpath_config = Path(__file__).parent.parent
         self.path_config = os.path.join(self.dirpath_config, "config.yml")
 
+        import yaml
+
         with open(self.path_config, encoding="utf-8") as fp:
-            self.__data = yaml.safe_load(fp)
+            # The C loader (if libyaml is available) is much faster.
+            self.__data = yaml.load(
+                fp, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            )
 
             print(f"\nConfig file loaded from {self.path_config}")
-            pprint(self.__data)
 
             self.path_tesseract_ocr_exe = self.__data["paths"]["3rd_party"][
                 "tesseract_ocr"
@@ -60,6 +127,142 @@ class Config(Singleton):
 
             self.port_file_explorer = self.__data["ports"]["file_explorer"]
 
+            self.port_sequence_analyzer_stream = self.__data["ports"].get(
+                "sequence_analyzer_stream", 8885
+            )
+
             self.frontend_url = self.__data["frontend"]["url"]
 
+            sequence_analyzer = self.__data.get("sequence_analyzer", {})
+            self.sequence_analyzer_threaded = sequence_analyzer.get("threaded", False)
+            self.sequence_analyzer_coalescing_enabled = sequence_analyzer.get(
+                "coalescing_enabled", False
+            )
+            self.sequence_analyzer_coalescing_ttl_sec = sequence_analyzer.get(
+                "coalescing_ttl_sec", 2.0
+            )
+            self.sequence_analyzer_match_history_enabled = sequence_analyzer.get(
+                "match_history_enabled", False
+            )
+            self.sequence_analyzer_match_history_max_gap_sec = sequence_analyzer.get(
+                "match_history_max_gap_sec", 5.0
+            )
+            self.sequence_analyzer_match_history_save_interval_sec = (
+                sequence_analyzer.get("match_history_save_interval_sec", 5.0)
+            )
+            self.sequence_analyzer_match_history_max_histories = sequence_analyzer.get(
+                "match_history_max_histories", 256
+            )
+            self.sequence_analyzer_prewarm_n_recent_assets = sequence_analyzer.get(
+                "prewarm_n_recent_assets", 0
+            )
+            self.sequence_analyzer_batch_n_workers = sequence_analyzer.get(
+                "batch_n_workers", 4
+            )
+            self.sequence_analyzer_batch_max_frames = sequence_analyzer.get(
+                "batch_max_frames", 300
+            )
+            self.sequence_analyzer_deadline_ms = sequence_analyzer.get("deadline_ms", 0)
+            self.sequence_analyzer_stream_unchanged_tolerance = sequence_analyzer.get(
+                "stream_unchanged_tolerance", 0.0
+            )
+            self.sequence_analyzer_admission_enabled = sequence_analyzer.get(
+                "admission_enabled", False
+            )
+            self.sequence_analyzer_admission_max_queue_depth = sequence_analyzer.get(
+                "admission_max_queue_depth", 16
+            )
+            self.sequence_analyzer_admission_retry_after_sec = sequence_analyzer.get(
+                "admission_retry_after_sec", 1.0
+            )
+
+            pdf_receiver = self.__data.get("pdf_receiver", {})
+            self.pdf_receiver_auto_index = pdf_receiver.get("auto_index", False)
+            self.pdf_receiver_chunk_size = pdf_receiver.get("chunk_size", 1 << 20)
+
+            batch_indexer = self.__data.get("batch_indexer", {})
+            self.batch_indexer_n_workers = batch_indexer.get("n_workers", 0)
+
+            file_explorer = self.__data.get("file_explorer", {})
+            self.file_explorer_catalog_refresh_interval_sec = file_explorer.get(
+                "catalog_refresh_interval_sec", 1.0
+            )
+
+            matching = self.__data.get("matching", {})
+            self.matching_n_shards = matching.get("n_shards", 1)
+            self.matching_min_lines_for_sharding = matching.get(
+                "min_lines_for_sharding", 5000
+            )
+            self.matching_page_lsh_enabled = matching.get("page_lsh_enabled", False)
+            self.matching_page_lsh_min_pages = matching.get("page_lsh_min_pages", 50)
+            self.matching_page_lsh_n_candidates = matching.get(
+                "page_lsh_n_candidates", 8
+            )
+            self.matching_ocr_scale_tiers = matching.get("ocr_scale_tiers", [1.0])
+            self.matching_ocr_cascade_min_score = matching.get(
+                "ocr_cascade_min_score", 0.85
+            )
+            self.matching_no_text_filter_enabled = matching.get(
+                "no_text_filter_enabled", False
+            )
+            self.matching_no_text_filter_min_text_lines = matching.get(
+                "no_text_filter_min_text_lines", 1
+            )
+            self.matching_no_text_filter_min_row_transitions = matching.get(
+                "no_text_filter_min_row_transitions", 8
+            )
+            self.matching_progressive_ocr_enabled = matching.get(
+                "progressive_ocr_enabled", False
+            )
+            self.matching_progressive_ocr_band_height = matching.get(
+                "progressive_ocr_band_height", 240
+            )
+            self.matching_progressive_ocr_band_overlap = matching.get(
+                "progressive_ocr_band_overlap", 40
+            )
+            self.matching_multi_document_n_candidates = matching.get(
+                "multi_document_n_candidates", 2
+            )
+
+            index_store = self.__data.get("index_store", {})
+            self.index_store_backend = index_store.get("backend", "json")
+            self.index_store_n_candidate_lines = index_store.get(
+                "n_candidate_lines", 32
+            )
+
+            result_cache = self.__data.get("result_cache", {})
+            self.result_cache_enabled = result_cache.get("enabled", False)
+            self.result_cache_max_size_mb = result_cache.get("max_size_mb", 256)
+
+            page_pyramid = self.__data.get("page_pyramid", {})
+            self.page_pyramid_enabled = page_pyramid.get("enabled", False)
+            self.page_pyramid_tile_size = page_pyramid.get("tile_size", 254)
+            self.page_pyramid_overlap = page_pyramid.get("overlap", 1)
+            self.page_pyramid_tile_format = page_pyramid.get("tile_format", "jpg")
+            self.page_pyramid_quality = page_pyramid.get("quality", 85)
+
+            page_render = self.__data.get("page_render", {})
+            self.page_render_dpi = page_render.get("dpi", 200)
+            self.page_render_color_mode = page_render.get("color_mode", "RGB")
+            self.page_render_cache_enabled = page_render.get("cache_enabled", False)
+            self.page_render_cache_max_size_mb = page_render.get(
+                "cache_max_size_mb", 2048
+            )
+            self.page_render_n_pages_per_range = page_render.get("n_pages_per_range", 8)
+
+            profiling = self.__data.get("profiling", {})
+            self.profiling_enabled = profiling.get("enabled", False)
+            self.profiling_sample_every_n = profiling.get("sample_every_n", 1)
+            self.profiling_allow_request_header = profiling.get(
+                "allow_request_header", True
+            )
+            self.dirpath_profiles = profiling.get(
+                "dirpath_profiles",
+                os.path.join(self.dirpath_data_root, "profiles"),
+            )
+
+            logging = self.__data.get("logging", {})
+            self.log_level = logging.get("level", "INFO")
+            self.log_format = logging.get("format", "text")
+
             self.__initialized = True
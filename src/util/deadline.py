@@ -0,0 +1,56 @@
+import math
+import time
+
+# Request header to set the deadline of a single request, in milliseconds from its arrival.
+HEADER_DEADLINE_MS = "X-SwapVid-Deadline-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a job (e.g. OCR) is aborted because the deadline has passed."""
+
+
+class Deadline:
+    """
+    Time (by time.monotonic()) by which a request should be answered.
+
+    Long-running steps check it and stop early, returning the best result found so far.
+    Deadline(None) never expires.
+    """
+
+    __slots__ = ("at",)
+
+    def __init__(self, budget_sec: float | None = None):
+        self.at = math.inf if budget_sec is None else time.monotonic() + budget_sec
+
+    @staticmethod
+    def from_ms(budget_ms: float | None):
+        """A factory method to create from a budget in milliseconds (no deadline if it is None or <= 0)."""
+        if budget_ms is None or budget_ms <= 0:
+            return Deadline(None)
+
+        return Deadline(budget_ms / 1000)
+
+    @staticmethod
+    def from_request_headers(headers, default_budget_ms: float | None):
+        """
+        A factory method to create from the request headers,
+        or from default_budget_ms if the request does not set the deadline.
+        """
+        value = headers.get(HEADER_DEADLINE_MS) if headers is not None else None
+
+        try:
+            return Deadline.from_ms(
+                float(value) if value is not None else default_budget_ms
+            )
+        except ValueError:
+            return Deadline.from_ms(default_budget_ms)
+
+    def is_set(self) -> bool:
+        return self.at != math.inf
+
+    def get_remaining_sec(self) -> float:
+        """Returns the time left (0 if the deadline has passed, inf if it is not set)."""
+        return max(0.0, self.at - time.monotonic())
+
+    def is_expired(self) -> bool:
+        return time.monotonic() >= self.at
@@ -1,10 +1,13 @@
 import io
 import base64
+from typing import TYPE_CHECKING
 
-from PIL import Image, ImageOps
+# PIL is imported when it is used, not to slow down the startup of services.
+if TYPE_CHECKING:
+    from PIL import Image
 
 
-def binarize_pilimg(pilimg: Image, bin_thresh=100, maxval=255) -> Image:
+def binarize_pilimg(pilimg: "Image", bin_thresh=100, maxval=255) -> "Image":
     """Binarizes PIL image.""" ""
     pilimg = pilimg.convert("L")
     return pilimg.point(lambda p: maxval if p > bin_thresh else 0)
@@ -18,6 +21,8 @@ def cvt_dataurl_to_decoded_base64url(dataurl: str):
 
 def cvt_dataurl_to_pil_grayscale(dataurl: str):
     """Converts dataurl to PIL grayscale image."""
+    from PIL import Image, ImageOps
+
     return ImageOps.grayscale(
         Image.open(io.BytesIO(cvt_dataurl_to_decoded_base64url(dataurl)))
     )
@@ -25,4 +30,34 @@ def cvt_dataurl_to_pil_grayscale(dataurl: str):
 
 def cvt_dataurl_to_pil_rgb(dataurl: str):
     """Converts dataurl to PIL RGB image."""
+    from PIL import Image
+
     return Image.open(io.BytesIO(cvt_dataurl_to_decoded_base64url(dataurl)))
+
+
+def calc_dhash(pilimg: "Image", hash_size=16) -> str:
+    """
+    Returns difference hash (dHash) of PIL image as a hex string.
+    Near-identical images (e.g. re-encoded video frames) have the same dHash.
+    """
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.asarray(
+        pilimg.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    )
+
+    # Bits of the rows from the top, each from the left, and the first bit is the most significant.
+    n_bits = hash_size * hash_size
+    bits = int.from_bytes(
+        np.packbits(pixels[:, :-1] > pixels[:, 1:]).tobytes(), "big"
+    ) >> (-n_bits % 8)
+
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def cvt_bytes_to_pil_grayscale(data: bytes):
+    """Converts encoded image data (e.g. JPEG or PNG) to PIL grayscale image."""
+    from PIL import Image, ImageOps
+
+    return ImageOps.grayscale(Image.open(io.BytesIO(data)))
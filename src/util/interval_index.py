@@ -0,0 +1,75 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class Interval:
+    """Represents a closed interval [start, end] with a value."""
+
+    start: float
+    end: float
+    value: Any
+
+    def contains(self, t: float):
+        """Returns True if t is in the interval."""
+        return self.start <= t <= self.end
+
+
+class IntervalIndex:
+    """
+    Index of non-overlapping intervals, for stabbing queries ("which interval contains t?").
+
+    Since the intervals never overlap, they are kept sorted by start,
+    and each query or update is a binary search on the starts.
+    """
+
+    def __init__(self, intervals: list[Interval] | None = None):
+        self.__intervals: list[Interval] = sorted(
+            intervals or [], key=lambda interval: interval.start
+        )
+        self.__starts: list[float] = [interval.start for interval in self.__intervals]
+
+    def __len__(self):
+        return len(self.__intervals)
+
+    def __iter__(self):
+        return iter(self.__intervals)
+
+    def find(self, t: float) -> Interval | None:
+        """Returns the interval which contains t, or None."""
+        i = bisect_right(self.__starts, t) - 1
+
+        if i >= 0 and self.__intervals[i].contains(t):
+            return self.__intervals[i]
+
+        return None
+
+    def find_prev(self, t: float) -> Interval | None:
+        """Returns the last interval which starts at or before t, or None."""
+        i = bisect_right(self.__starts, t) - 1
+        return self.__intervals[i] if i >= 0 else None
+
+    def find_next(self, t: float) -> Interval | None:
+        """Returns the first interval which starts after t, or None."""
+        i = bisect_right(self.__starts, t)
+        return self.__intervals[i] if i < len(self.__intervals) else None
+
+    def add(self, interval: Interval):
+        """Adds an interval which does not overlap with the others."""
+        i = bisect_right(self.__starts, interval.start)
+        self.__intervals.insert(i, interval)
+        self.__starts.insert(i, interval.start)
+
+    def remove(self, interval: Interval):
+        """Removes the interval."""
+        i = bisect_right(self.__starts, interval.start) - 1
+
+        while i >= 0 and self.__intervals[i] is not interval:
+            i -= 1
+
+        if i < 0:
+            raise ValueError("Interval not found in IntervalIndex.")
+
+        del self.__intervals[i]
+        del self.__starts[i]
@@ -0,0 +1,171 @@
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from util.config import Config
+
+# Environment variable overriding "logging.level" of config.yml (e.g. SWAPVID_LOG_LEVEL=DEBUG).
+ENV_LOG_LEVEL = "SWAPVID_LOG_LEVEL"
+
+# Loggers of the services are children of this logger, which has the queue handler.
+ROOT_LOGGER_NAME = "swapvid"
+
+_listener: QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+class Logger:
+    """
+    Logger of structured records: an event message with key/value fields.
+
+        logger.info("Request received", path=self.path, client=client_address)
+
+    A record below the level is dropped before anything is formatted,
+    so debug records cost a level check when they are disabled.
+    Records are formatted and written by a background thread (see setup_logging()),
+    so field values must not be modified after they are logged.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__logger = logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+    def is_enabled_for(self, level: int) -> bool:
+        """Returns True if records of the level are logged (e.g. to skip computing debug fields)."""
+        return self.__logger.isEnabledFor(level)
+
+    def debug(self, event: str, **fields):
+        self.__log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self.__log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self.__log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self.__log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        """Logs an error record with the exception being handled."""
+        self.__log(logging.ERROR, event, fields, exc_info=True)
+
+    def __log(self, level: int, event: str, fields: dict, exc_info=False):
+        if not self.__logger.isEnabledFor(level):
+            return
+
+        self.__logger.log(
+            level, event, exc_info=exc_info, extra={"fields": fields}, stacklevel=3
+        )
+
+
+def get_logger(name: str) -> Logger:
+    """Returns the logger of the service or the module (e.g. "SequenceAnalyzer")."""
+    return Logger(name)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Formats a record as "TIME LEVEL [NAME] EVENT key=value ..."."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        name = record.name.removeprefix(f"{ROOT_LOGGER_NAME}.")
+        fields = " ".join(
+            f"{key}={format_value(value)}"
+            for key, value in getattr(record, "fields", {}).items()
+        )
+        text = f"{self.formatTime(record)} {record.levelname} [{name}] {record.getMessage()}"
+
+        if fields:
+            text = f"{text} {fields}"
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            text = f"{text}\n{record.exc_text}"
+
+        return text
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as a JSON object per line, for log collectors."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name.removeprefix(f"{ROOT_LOGGER_NAME}."),
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data, default=str)
+
+
+def format_value(value) -> str:
+    """Formats a field value of a key/value record, quoting strings with spaces."""
+    if isinstance(value, str):
+        return json.dumps(value) if value == "" or " " in value else value
+
+    return str(value)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler which leaves formatting of records to the listener thread
+    (QueueHandler.prepare() formats them in the thread logging them).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+
+        # The traceback refers to the frames of the logging thread, and is rendered here.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+def setup_logging(level: str | None = None):
+    """
+    Starts writing records of the loggers to stdout by a background thread, at the level
+    given, or by SWAPVID_LOG_LEVEL, or by "logging.level" of config.yml.
+    It is called once by the entry points of services, and does nothing after the first call.
+    """
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        config = Config.get_instance()
+        level = level or os.environ.get(ENV_LOG_LEVEL) or config.log_level
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(
+            JSONFormatter() if config.log_format == "json" else KeyValueFormatter()
+        )
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, stream_handler)
+        _listener.start()
+        # Records in the queue are written before the process exits.
+        atexit.register(_listener.stop)
+
+        root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+        root_logger.setLevel(level.upper())
+        root_logger.addHandler(_DeferredQueueHandler(log_queue))
+        root_logger.propagate = False
@@ -0,0 +1,39 @@
+import threading
+
+from util.base_class import Singleton
+
+
+class Metrics(Singleton):
+    """
+    Counters of events in the process (e.g. hits of OCR resolution tiers): name -> count.
+    They are reported by GET /metrics of Sequence Analyzer.
+    """
+
+    __initialized = False
+
+    def __init__(self):
+        if self.__initialized:
+            return
+
+        self.__lock = threading.Lock()
+        self.__counters: dict[str, int] = {}
+
+        self.__initialized = True
+
+    def increment(self, name: str, n=1):
+        """Adds n to the counter."""
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + n
+
+    def get(self, name: str) -> int:
+        """Returns the count of the counter (0 if it has never been incremented)."""
+        return self.__counters.get(name, 0)
+
+    def reset(self):
+        """Resets all counters."""
+        with self.__lock:
+            self.__counters = {}
+
+    def to_json_serializable(self):
+        with self.__lock:
+            return dict(sorted(self.__counters.items()))
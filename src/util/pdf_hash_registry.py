@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import threading
+
+from util.asset import Asset
+from util.base_class import Singleton
+
+
+def calc_file_sha256(path: str, chunk_size=1 << 20) -> str:
+    """Returns SHA-256 hex digest of the file content."""
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as fp:
+        while chunk := fp.read(chunk_size):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+class PdfHashRegistry(Singleton):
+    """
+    Registry of content hashes (SHA-256) of received PDF files: asset_id -> sha256.
+    It is used to find an asset which has the same PDF content as another one.
+    """
+
+    __initialized = False
+
+    def __init__(self):
+        if self.__initialized:
+            return
+
+        self.__lock = threading.Lock()
+        self.__path_registry = Asset.get_path_pdf_hash_registry()
+        self.__hashes: dict[str, str] = {}
+
+        if os.path.exists(self.__path_registry):
+            with open(self.__path_registry, "r", encoding="utf-8") as fp:
+                self.__hashes = json.load(fp)
+
+        self.__initialized = True
+
+    def get_hash(self, asset_id: str) -> str | None:
+        """Returns the registered hash of the asset."""
+        with self.__lock:
+            return self.__hashes.get(asset_id)
+
+    def find_indexed_asset(self, sha256: str, exclude_asset_id: str | None = None):
+        """Returns id of an asset which has the same PDF content and its document index, or None."""
+        with self.__lock:
+            asset_ids = [
+                asset_id
+                for asset_id, asset_sha256 in self.__hashes.items()
+                if asset_sha256 == sha256 and asset_id != exclude_asset_id
+            ]
+
+        for asset_id in asset_ids:
+            if os.path.exists(Asset.get_path_document_index(asset_id)):
+                return asset_id
+
+        return None
+
+    def register(self, asset_id: str, sha256: str):
+        """Registers the hash of the asset and saves the registry."""
+        with self.__lock:
+            self.__hashes[asset_id] = sha256
+
+            os.makedirs(os.path.dirname(self.__path_registry), exist_ok=True)
+            path_tmp = f"{self.__path_registry}.tmp"
+            with open(path_tmp, "w", encoding="utf-8") as fp:
+                json.dump(self.__hashes, fp, indent=2)
+            os.replace(path_tmp, self.__path_registry)
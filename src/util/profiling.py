@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from contextlib import contextmanager
+
+from util.config import Config
+from util.base_class import Singleton
+from util.log import get_logger
+
+# Environment variables override the "profiling" section of config.yml,
+# so that profiling can be turned on for a running deployment without editing files.
+ENV_PROFILING_ENABLED = "SWAPVID_PROFILING"
+ENV_PROFILING_SAMPLE_EVERY_N = "SWAPVID_PROFILING_SAMPLE_EVERY_N"
+
+# Request header to force profiling of a single request.
+HEADER_PROFILE_REQUEST = "X-SwapVid-Profile"
+
+logger = get_logger("Profiler")
+
+
+class Profiler(Singleton):
+    """
+    Opt-in profiler for service requests and indexing jobs.
+
+    Captures cProfile stats and a tracemalloc snapshot for the selected jobs,
+    and writes them to the profiles directory as "<timestamp>_<job>_<asset_id>.prof"
+    (loadable with pstats) and a "<...>.json" summary with timings and memory peak.
+    """
+
+    __initialized = False
+
+    def __init__(self):
+        if self.__initialized:
+            return
+
+        config = Config.get_instance()
+
+        self.enabled = os.environ.get(
+            ENV_PROFILING_ENABLED, str(config.profiling_enabled)
+        ).lower() in ("1", "true", "yes")
+        self.sample_every_n = max(
+            1,
+            int(
+                os.environ.get(
+                    ENV_PROFILING_SAMPLE_EVERY_N, config.profiling_sample_every_n
+                )
+            ),
+        )
+        self.allow_request_header = config.profiling_allow_request_header
+        self.dirpath_profiles = config.dirpath_profiles
+
+        self.__counters: dict[str, int] = {}
+        self.__counters_lock = threading.Lock()
+
+        # cProfile and tracemalloc are process-global, so only one job is profiled at a time.
+        self.__profiling_lock = threading.Lock()
+
+        self.__initialized = True
+
+    def is_requested_by_header(self, headers) -> bool:
+        """Returns True if the request headers ask for profiling of the request."""
+        if not self.allow_request_header or headers is None:
+            return False
+
+        value = headers.get(HEADER_PROFILE_REQUEST)
+        return value is not None and value.lower() in ("1", "true", "yes")
+
+    def should_profile(self, job_name: str, force=False) -> bool:
+        """Decides whether the next job should be profiled (1 in N sampling per job name)."""
+        if force:
+            return True
+
+        if not self.enabled:
+            return False
+
+        with self.__counters_lock:
+            count = self.__counters.get(job_name, 0)
+            self.__counters[job_name] = count + 1
+
+        return count % self.sample_every_n == 0
+
+    @contextmanager
+    def profile(self, job_name: str, asset_id: str | None = None, force=False):
+        """
+        Profiles the enclosed block if it is selected by sampling or forced.
+        The block runs unprofiled if another job is being profiled at the same time.
+        """
+        selected = self.should_profile(job_name, force)
+
+        if not selected or not self.__profiling_lock.acquire(blocking=False):
+            yield
+            return
+
+        try:
+            tracemalloc_started_here = not tracemalloc.is_tracing()
+            if tracemalloc_started_here:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+            started_at = datetime.now()
+            t_wall_start = time.perf_counter()
+            t_cpu_start = time.process_time()
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+            try:
+                yield
+            finally:
+                profiler.disable()
+
+                t_wall = time.perf_counter() - t_wall_start
+                t_cpu = time.process_time() - t_cpu_start
+                _, memory_peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+
+                if tracemalloc_started_here:
+                    tracemalloc.stop()
+
+                self.__write_profile(
+                    job_name,
+                    asset_id,
+                    started_at,
+                    profiler,
+                    snapshot,
+                    t_wall,
+                    t_cpu,
+                    memory_peak,
+                )
+        finally:
+            self.__profiling_lock.release()
+
+    def __write_profile(
+        self,
+        job_name: str,
+        asset_id: str | None,
+        started_at: datetime,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        t_wall: float,
+        t_cpu: float,
+        memory_peak: int,
+    ):
+        os.makedirs(self.dirpath_profiles, exist_ok=True)
+
+        basename = "_".join(
+            [started_at.strftime("%Y%m%d-%H%M%S-%f"), job_name, asset_id or "none"]
+        )
+        path_stats = os.path.join(self.dirpath_profiles, f"{basename}.prof")
+        path_summary = os.path.join(self.dirpath_profiles, f"{basename}.json")
+
+        profiler.dump_stats(path_stats)
+
+        top_allocations = [
+            {
+                "location": str(stat.traceback),
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:20]
+        ]
+
+        with open(path_summary, "w", encoding="utf-8") as fp:
+            json.dump(
+                {
+                    "job_name": job_name,
+                    "asset_id": asset_id,
+                    "started_at": started_at.isoformat(),
+                    "wall_time_sec": t_wall,
+                    "cpu_time_sec": t_cpu,
+                    "tracemalloc_peak_bytes": memory_peak,
+                    "tracemalloc_top_allocations": top_allocations,
+                    "path_stats": path_stats,
+                },
+                fp,
+                indent=2,
+            )
+
+        logger.info(
+            "Profiled a job",
+            job_name=job_name,
+            asset_id=asset_id,
+            wall_time_sec=round(t_wall, 3),
+            peak_memory_bytes=memory_peak,
+            path=path_summary,
+        )
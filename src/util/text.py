@@ -84,3 +84,31 @@ def calc_text_similarity(
     similarity_sqmatch = SequenceMatcher(None, text1, text2).ratio()
 
     return similarity_ngram, similarity_sqmatch
+
+
+def calc_line_match_scores(
+    index_content: str,
+    video_frame_content: str,
+    th_valid_similarity_ngram: float,
+    th_valid_similarity_sqmatch: float,
+    th_valid_str_length: int,
+    th_valid_strlen_rate_min: float,
+):
+    """
+    Returns (n-gram score, text sequence similarity) if a line from document index
+    matches a line from video frame under the given thresholds, otherwise None.
+    """
+    if len(index_content) < th_valid_str_length:
+        return None
+
+    r_len_1, r_len_2 = calc_text_length_rate(index_content, video_frame_content)
+
+    if r_len_1 < th_valid_strlen_rate_min or r_len_2 < th_valid_strlen_rate_min:
+        return None
+
+    sm_ngram, sm_sqmatch = calc_text_similarity(index_content, video_frame_content)
+
+    if sm_ngram < th_valid_similarity_ngram or sm_sqmatch < th_valid_similarity_sqmatch:
+        return None
+
+    return sm_ngram, sm_sqmatch
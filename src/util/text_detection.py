@@ -0,0 +1,47 @@
+from typing import TYPE_CHECKING
+
+# numpy and PIL are imported when a frame is checked, not to slow down the startup of services.
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
+
+def count_text_line_bands(
+    binary_image: "Image",
+    min_row_transitions=8,
+    min_line_height=4,
+    max_band_height_rate=0.25,
+) -> int:
+    """
+    Counts horizontal bands of rows which look like lines of text in a binarized image.
+
+    A row looks like a part of a text line if it has many black/white transitions (strokes of characters).
+    Rows of dense text spanning the frame have as many transitions as noise or textures,
+    so they are told apart by the height of the bands: consecutive such rows form a band, which is counted
+    if it is as high as a line of text, but not as high as a textured area (e.g. a camera image).
+    """
+    import numpy as np
+
+    pixels = np.asarray(binary_image.convert("L")) > 127
+    height = pixels.shape[0]
+
+    n_transitions = np.count_nonzero(pixels[:, 1:] != pixels[:, :-1], axis=1)
+    is_text_row = n_transitions >= min_row_transitions
+
+    # Starts and ends of the runs of text rows
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], is_text_row, [0]))))
+    band_heights = edges[1::2] - edges[0::2]
+
+    return int(
+        np.count_nonzero(
+            (band_heights >= min_line_height)
+            & (band_heights <= height * max_band_height_rate)
+        )
+    )
+
+
+def has_text(binary_image: "Image", min_text_lines=1, min_row_transitions=8) -> bool:
+    """Returns False if the binarized image (e.g. a speaker camera, a black transition) has no lines of text."""
+    return (
+        count_text_line_bands(binary_image, min_row_transitions=min_row_transitions)
+        >= min_text_lines
+    )
@@ -1,7 +1,14 @@
+from typing import TYPE_CHECKING
 from dataclasses import dataclass, field
-from PIL.Image import Image
 
-from util.image import cvt_dataurl_to_pil_grayscale
+from util.image import (
+    cvt_dataurl_to_pil_grayscale,
+    cvt_bytes_to_pil_grayscale,
+    calc_dhash,
+)
+
+if TYPE_CHECKING:
+    from PIL.Image import Image
 
 
 @dataclass
@@ -24,7 +31,7 @@ class VideoFrameMetadata:
 class VideoFrameImage:
     """Represents a video frame image."""
 
-    data: Image
+    data: "Image"
     metadata: VideoFrameMetadata = field(init=False)
 
     def __post_init__(self):
@@ -41,6 +48,11 @@ class VideoFrameImage:
         pil_video_frame = cvt_dataurl_to_pil_grayscale(dataurl)
         return VideoFrameImage(data=pil_video_frame)
 
+    @staticmethod
+    def from_bytes(data: bytes):
+        """A factory method to create from encoded image data (e.g. JPEG or PNG)."""
+        return VideoFrameImage(data=cvt_bytes_to_pil_grayscale(data))
+
     def get_grayscale(self):
         """Get grayscale image."""
         return self.data.convert("L")
@@ -49,6 +61,10 @@ class VideoFrameImage:
         """Get binary image."""
         return self.get_grayscale().point(lambda p: maxval if p > bin_thresh else 0)
 
+    def get_fingerprint(self):
+        """Get perceptual hash of the image, which is the same for near-identical frames."""
+        return calc_dhash(self.data)
+
     def resize(self, width_px: int, height_px: int):
         """Get the VideoFrameImage instance of resized one."""
         resized_pil = self.data.resize((width_px, height_px))
@@ -1,3 +1,4 @@
+from typing import TYPE_CHECKING
 from dataclasses import dataclass, field
 
 from document_index import (
@@ -8,6 +9,10 @@ from document_index import (
 from ocr import LinePositionWithPageOffset
 from video_frame import VideoFrameMetadata
 
+# numpy is imported when viewports are estimated in batch.
+if TYPE_CHECKING:
+    import numpy as np
+
 
 @dataclass
 class DocumentScaleViewport:
@@ -66,6 +71,25 @@ class DocumentScaleViewport:
         """Get the size of the viewport."""
         return self.viewport_width * self.viewport_height
 
+    def to_json_serializable(self):
+        return {
+            "top": self.top,
+            "left": self.left,
+            "right": self.right,
+            "bottom": self.bottom,
+        }
+
+    @staticmethod
+    def from_json_serializable(data: dict, document_metadata: DocumentMetadata):
+        """A factory method to create from the output of to_json_serializable()."""
+        return DocumentScaleViewport(
+            document_metadata=document_metadata,
+            top=data["top"],
+            left=data["left"],
+            right=data["right"],
+            bottom=data["bottom"],
+        )
+
 
 def __estimate_viewport(
     line_position_video_frame: LinePositionWithPageOffset,  # [[left, top], [right, bottom]]
@@ -160,3 +184,92 @@ def estimate_viewport_from_page(
         bottom=(match_result.i_page + 1) * slide_height * doc_metadata.height,
         right=1.0 * doc_metadata.width,
     )
+
+
+def estimate_viewports(
+    match_results: list[FoundRelatedPage | FoundRelatedLine | None],
+    doc_metadata: DocumentMetadata,
+    video_metadata: list[VideoFrameMetadata],
+) -> "np.ndarray":
+    """
+    Estimate viewports of a batch of match results at once,
+    as estimate_viewport_from_page() / estimate_viewport_from_line() do for each one.
+
+    Returns:
+        np.ndarray: (n, 4) array of [left, top, right, bottom] (px), NaN for match results of None.
+    """
+    import numpy as np
+
+    n = len(match_results)
+
+    # Columns: left, top, offset_left, offset_top, height of the lines in the document and the video frame
+    lines_doc = np.zeros((n, 5))
+    lines_vf = np.zeros((n, 5))
+    dsize_vf = np.zeros((n, 2))
+    i_pages = np.full(n, -1)
+    matched = np.zeros(n, dtype=bool)
+
+    for i, match_result in enumerate(match_results):
+        if match_result is None:
+            continue
+
+        for lines, position in (
+            (lines_doc, match_result.match_src_from_index.position),
+            (lines_vf, match_result.match_src_from_video_frame.position),
+        ):
+            lines[i] = (
+                position.get_left(),
+                position.get_top(),
+                position.get_offset_left(),
+                position.get_offset_top(),
+                position.get_height(),
+            )
+
+        dsize_vf[i] = (video_metadata[i].width, video_metadata[i].height)
+        matched[i] = True
+
+        if isinstance(match_result, FoundRelatedPage):
+            i_pages[i] = match_result.i_page
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_vtd = lines_doc[:, 4] / lines_vf[:, 4]
+
+    left = lines_doc[:, 2] + lines_doc[:, 0] - lines_vf[:, 0] * r_vtd
+    top = lines_doc[:, 3] + lines_doc[:, 1] - lines_vf[:, 1] * r_vtd
+    viewports = np.stack(
+        [
+            left,
+            top,
+            left + dsize_vf[:, 0] * r_vtd,
+            top + dsize_vf[:, 1] * r_vtd,
+        ],
+        axis=1,
+    )
+
+    # Viewports of pages whose size is not close to the size of a page
+    # are replaced by the bbox of the matched page.
+    slide_height_px = doc_metadata.height / doc_metadata.n_pages
+    slide_height = 1 / doc_metadata.n_pages
+    slide_page_area_size = doc_metadata.width * slide_height_px
+    detected_area_size = (viewports[:, 2] - viewports[:, 0]) * (
+        viewports[:, 3] - viewports[:, 1]
+    )
+
+    with np.errstate(invalid="ignore"):
+        is_detected_size_valid = (0.9 <= detected_area_size / slide_page_area_size) & (
+            detected_area_size / slide_page_area_size <= 1.2
+        )
+
+    is_page_fallback = (i_pages >= 0) & ~is_detected_size_valid
+    viewports[is_page_fallback] = np.stack(
+        [
+            np.zeros(n),
+            i_pages * slide_height * doc_metadata.height,
+            np.full(n, 1.0 * doc_metadata.width),
+            (i_pages + 1) * slide_height * doc_metadata.height,
+        ],
+        axis=1,
+    )[is_page_fallback]
+
+    viewports[~matched] = np.nan
+    return viewports